@@ -317,11 +317,11 @@ class age_histogram(Analyzer):
             date = self.dates[ind] # Find the date for this index
             self.hists[date] = sc.objdict() # Initialize the dictionary
             scale  = sim.rescale_vec[sim.t] # Determine current scale factor
-            age    = sim.people.age # Get the age distribution,since used heavily
+            codes  = sim.people.age_bins(self.edges) # Get the age bin of each person, since used heavily
             self.hists[date]['bins'] = self.bins # Copy here for convenience
             for state in self.states: # Loop over each state
                 inds = sim.people.defined(f'date_{state}') # Pull out people for which this state is defined
-                self.hists[date][state] = np.histogram(age[inds], bins=self.edges)[0]*scale # Actually count the people
+                self.hists[date][state] = np.bincount(codes[inds], minlength=len(self.edges))[:-1]*scale # Actually count the people, discarding anyone outside the bins
 
 
     def finalize(self, sim):
@@ -476,9 +476,10 @@ class daily_age_stats(Analyzer):
 
     def apply(self, sim):
         df_entry = {}
+        codes = sim.people.age_bins(self.edges)
         for state in self.states:
-            inds = sc.findinds(sim.people[f'date_{state}'], sim.t)
-            b, _ = np.histogram(sim.people.age[inds], self.edges)
+            inds = (sim.people[f'date_{state}'] == sim.t).nonzero()[0]
+            b = np.bincount(codes[inds], minlength=len(self.edges))[:-1] # Discard anyone outside the bins
             df_entry.update({state: b * sim.rescale_vec[sim.t]})
         df_entry.update({'day':sim.t, 'age': self.bins})
         self.results.update({sim.date(sim.t): df_entry})
@@ -681,8 +682,9 @@ class daily_stats(Analyzer):
 
             # Source stats
             inflog = sim.people.infection_log
-            infloginds = [i for i,e in enumerate(inflog) if (e['date']==sim.t and e['source'] is not None)] # Person was infected today and was not a seed infection
-            sourceinds = list(set([inflog[i]['source'] for i in infloginds]))
+            infloginds = inflog.by_date(sim.t) # Person was infected today...
+            infloginds = infloginds[inflog.has_source[infloginds]] # ...and was not a seed infection
+            sourceinds = np.unique(inflog.source[infloginds])
             stats.source.new_sources = len(sourceinds)
             for key in self.keys:
                 stats.source[key] = len(self.intersect(sourceinds, key))
@@ -948,9 +950,9 @@ class nab_histogram(Analyzer):
 
 
     def apply(self, sim):
-        nonzero = sim.people.nab > 0
-        log_nabs = np.log10(sim.people.nab[nonzero])
         for ind in cvi.find_day(self.days, sim.t):
+            nonzero = sim.people.nab > 0 # Only calculated on the days recorded, since NAbs change every day
+            log_nabs = np.log10(sim.people.nab[nonzero])
             date = self.dates[ind]  # Find the date for this index
             self.hists[date] = sc.objdict()  # Initialize the dictionary
             scale = sim.rescale_vec[sim.t]  # Determine current scale factor
@@ -1824,15 +1826,13 @@ class TransTree(Analyzer):
         self.source_dates = [None for i in range(self.pop_size)]
         self.target_dates = [[]   for i in range(self.pop_size)]
 
-        for entry in self.infection_log:
-            source = entry['source']
-            target = entry['target']
-            date   = entry['date']
-            if source:
-                self.sources[target] = source # Each target has at most one source
-                self.targets[source].append(target) # Each source can have multiple targets
-                self.source_dates[target] = date # Each target has at most one source
-                self.target_dates[source].append(date) # Each source can have multiple targets
+        log = self.infection_log
+        has_source = log.has_source # Skip seed infections
+        for source,target,date in zip(log.source[has_source].tolist(), log.target[has_source].tolist(), log.date[has_source].tolist()):
+            self.sources[target] = source # Each target has at most one source
+            self.targets[source].append(target) # Each source can have multiple targets
+            self.source_dates[target] = date # Each target has at most one source
+            self.target_dates[source].append(date) # Each source can have multiple targets
 
         # Count the number of targets each person has, and the list of transmissions
         self.count_targets()
@@ -1856,9 +1856,11 @@ class TransTree(Analyzer):
                 self.graph.add_node(i, **d)
 
             # Next, add edges from linelist
-            for edge in people.infection_log:
-                if edge['source'] is not None: # Skip seed infections
-                    self.graph.add_edge(edge['source'],edge['target'],date=edge['date'],layer=edge['layer'])
+            log = self.infection_log
+            rows = sc.findinds(log.has_source) # Skip seed infections
+            layers = log.decode('layer', rows)
+            for source,target,date,layer in zip(log.source[rows].tolist(), log.target[rows].tolist(), log.date[rows].tolist(), layers):
+                self.graph.add_edge(source, target, date=date, layer=layer)
 
         return
 
@@ -1918,16 +1920,11 @@ class TransTree(Analyzer):
 
         This excludes edges corresponding to seeded infections without a source
         """
-        source_inds = []
-        target_inds = []
-        transmissions = []
-        for d in self.infection_log:
-            if d['source'] is not None:
-                src = d['source']
-                trg = d['target']
-                source_inds.append(src)
-                target_inds.append(trg)
-                transmissions.append([src, trg])
+        log = self.infection_log
+        has_source = log.has_source
+        source_inds = log.source[has_source].tolist()
+        target_inds = log.target[has_source].tolist()
+        transmissions = [[src, trg] for src,trg in zip(source_inds, target_inds)]
         self.transmissions = transmissions
         self.source_inds = source_inds
         self.target_inds = target_inds
@@ -1937,15 +1934,8 @@ class TransTree(Analyzer):
     def make_detailed(self, people, reset=False):
         ''' Construct a detailed transmission tree, with additional information for each person '''
 
-        def df_to_arrdict(df):
-            ''' Convert a dataframe to a dictionary of arrays '''
-            arrdict = {}
-            for col in df.columns:
-                arrdict[col] = df[col].values
-            return arrdict
-
-        # Convert infection log to a dataframe and from there to a dict of arrays
-        inflog = df_to_arrdict(sc.dcp(pd.DataFrame(self.infection_log)))
+        # Convert infection log to a dict of arrays
+        inflog = self.infection_log.to_dict()
 
         # Initialization
         n_people = len(people)
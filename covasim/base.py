@@ -8,6 +8,7 @@ import numpy as np
 import pandas as pd
 import sciris as sc
 import datetime as dt
+from time import perf_counter
 from . import version as cvv
 from . import utils as cvu
 from . import misc as cvm
@@ -15,7 +16,7 @@ from . import defaults as cvd
 from . import parameters as cvpar
 
 # Specify all externally visible classes this file defines
-__all__ = ['ParsObj', 'Result', 'BaseSim', 'BasePeople', 'Person', 'FlexDict', 'Contacts', 'Layer']
+__all__ = ['ParsObj', 'Result', 'BaseSim', 'BasePeople', 'Person', 'FlexDict', 'Contacts', 'Layer', 'InfectionLog', 'EventQueue', 'Timings']
 
 
 #%% Define simulation classes
@@ -874,6 +875,18 @@ class BaseSim(ParsObj):
 
 #%% Define people classes
 
+columnar_format = 'covasim-columnar-1' # Identifier for the format used by BasePeople.save(columnar=True)
+compact_nan = np.iinfo(np.int16).min # Value used in place of NaN for dates stored by BasePeople.compact()
+
+
+def is_columnar(filename):
+    ''' Check whether a path is a folder of people saved with ``people.save(columnar=True)`` '''
+    try:
+        return sc.path(filename).is_dir() and (sc.path(filename) / 'manifest.json').is_file()
+    except TypeError: # Not a path
+        return False
+
+
 class BasePeople(FlexPretty):
     '''
     A class to handle all the boilerplate for people -- note that as with the
@@ -1013,20 +1026,114 @@ class BasePeople(FlexPretty):
         except: # pragma: no cover
             if isinstance(key, int):
                 return self.person(key)
+            elif isinstance(key, str) and key in self.__dict__.get('_compact', {}):
+                return self._decode(key)
             else:
                 errormsg = f'Key "{key}" is not a valid attribute of people'
                 raise AttributeError(errormsg)
 
 
+    def __getattr__(self, key):
+        ''' Decode arrays stored by compact(), so e.g. people.date_dead works as usual; only called if the attribute is not found '''
+        if key in self.__dict__.get('_compact', {}):
+            return self._decode(key)
+        errormsg = f"'{self.__class__.__name__}' object has no attribute '{key}'"
+        raise AttributeError(errormsg)
+
+
     def __setitem__(self, key, value):
         ''' Ditto '''
-        if self._lock and key not in self.__dict__: # pragma: no cover
+        compact = self.__dict__.get('_compact', {})
+        if key in compact: # The new value replaces the compact one
+            del compact[key]
+        elif self._lock and key not in self.__dict__: # pragma: no cover
             errormsg = f'Key "{key}" is not a current attribute of people, and the people object is locked; see people.unlock()'
             raise AttributeError(errormsg)
         self.__dict__[key] = value
         return
 
 
+    @property
+    def is_compact(self):
+        ''' Whether any of the arrays are stored in compact form; see compact() '''
+        return bool(self.__dict__.get('_compact'))
+
+
+    def compact(self, imm_dtype=np.float16):
+        '''
+        Store the arrays in a compact form to save memory, e.g. to keep the people
+        of many sims after they have been run (see ``cv.options.compact_people``).
+        States are packed into bits; dates, durations, and variant states are
+        stored as int16 day numbers, with -32768 in place of NaN (unless they have
+        non-integer values or are out of range, in which case they are left as
+        is); and integers are stored in the smallest type that holds them. These
+        are lossless, but immunity levels are stored as imm_dtype, which loses
+        precision for float16.
+
+        The arrays can still be read in the usual way, e.g. ``people.date_dead``
+        or ``cvu.true(people.symptomatic)``, but they are decoded each time they
+        are accessed, so changes made to them in place are lost. Use ``people.expand()``
+        to restore the usual arrays before modifying the people; this is done
+        automatically when the people are initialized.
+
+        Args:
+            imm_dtype (dtype): the dtype to store immunity levels as (None to leave them as is)
+
+        **Example**::
+
+            sim = cv.Sim().run()
+            sim.people.compact()
+            sim.people.plot() # Arrays are decoded as needed
+        '''
+        meta = self.meta
+        compact = self.__dict__.setdefault('_compact', {})
+        for key in self.keys():
+            arr = self.__dict__.get(key)
+            if not isinstance(arr, np.ndarray):
+                continue
+            entry = None
+            if key in meta.states + meta.by_variant_states and arr.dtype == bool:
+                entry = ('bits', np.packbits(arr, axis=-1))
+            elif key in meta.dates + meta.durs + meta.variant_states and arr.dtype.kind == 'f':
+                defined = ~np.isnan(arr)
+                vals = arr[defined]
+                if not len(vals) or (np.all(vals == np.round(vals)) and vals.min() > compact_nan and vals.max() <= np.iinfo(np.int16).max):
+                    days = np.full(arr.shape, compact_nan, dtype=np.int16)
+                    days[defined] = vals
+                    entry = ('days', days)
+            elif key in meta.imm_states and imm_dtype is not None:
+                entry = ('float', arr.astype(imm_dtype))
+            elif arr.dtype.kind == 'i' and arr.size: # E.g. the number of infections, which only need one byte
+                narrow = np.result_type(np.min_scalar_type(arr.min()), np.min_scalar_type(arr.max()))
+                if narrow.itemsize < arr.dtype.itemsize:
+                    entry = ('int', arr.astype(narrow))
+            if entry is not None:
+                compact[key] = entry + (arr.dtype, arr.shape)
+                del self.__dict__[key]
+        return
+
+
+    def expand(self):
+        ''' Restore the arrays stored by compact() '''
+        for key in list(self.__dict__.get('_compact', {}).keys()):
+            self.__dict__[key] = self._decode(key)
+        self.__dict__.pop('_compact', None)
+        return
+
+
+    def _decode(self, key):
+        ''' Decode a single array stored by compact() '''
+        codec, data, dtype, shape = self.__dict__['_compact'][key]
+        if codec == 'bits':
+            arr = np.unpackbits(data, axis=-1, count=shape[-1]).view(bool)
+        elif codec == 'days':
+            arr = data.astype(dtype)
+            arr[data == compact_nan] = np.nan
+        else:
+            arr = data.astype(dtype)
+        return arr
+
+
     def __len__(self):
         ''' This is just a scalar, but validate() and _resize_arrays() make sure it's right '''
         return int(self.pars['pop_size'])
@@ -1145,6 +1252,39 @@ class BasePeople(FlexPretty):
         return len(self[key]) - self.count(key)
 
 
+    def age_bins(self, edges):
+        '''
+        Return the index of each person's age bin for the given bin edges, as for
+        ``np.histogram()``: each bin includes its lower edge, and the last bin also
+        includes its upper edge. Anyone outside the bins has the index len(edges)-1,
+        so e.g. ``np.bincount(codes, minlength=len(edges))[:-1]`` counts the people
+        in each bin. Since ages don't change during a sim, the indices are cached
+        for each set of edges, and only recalculated if the age array is replaced.
+
+        Args:
+            edges (array): the edges of the age bins, in increasing order
+
+        **Example**::
+
+            codes = sim.people.age_bins(np.arange(0, 101, 10))
+            counts = np.bincount(codes[sim.people.true('dead')], minlength=11)[:-1]
+        '''
+        edges = np.asarray(edges, dtype=float)
+        key = tuple(edges)
+        cache = self.__dict__.setdefault('_age_bins', {})
+        age = self.age
+        if key in cache and cache[key][0] is age:
+            return cache[key][1]
+
+        n_bins = len(edges) - 1
+        codes = np.searchsorted(edges, age, side='right') - 1
+        codes[age == edges[-1]] = n_bins - 1 # The last bin includes its upper edge
+        codes[(codes < 0) | (codes >= n_bins)] = n_bins # Outside the bins
+        codes = codes.astype(cvd.default_int)
+        cache[key] = (age, codes)
+        return codes
+
+
     def keys(self):
         ''' Returns keys for all properties of the people object '''
         return self.meta.all_states[:]
@@ -1282,27 +1422,37 @@ class BasePeople(FlexPretty):
         return G
 
 
-    def save(self, filename=None, force=False, **kwargs):
+    def save(self, filename=None, force=False, columnar=False, **kwargs):
         '''
-        Save to disk as a gzipped pickle.
+        Save to disk as a gzipped pickle, or optionally as a folder of columns
+        that can be loaded without unpickling (see ``columnar`` below).
 
         Note: by default this function raises an exception if trying to save a
         run or partially run People object, since the changes that happen during
         a run are usually irreversible.
 
         Args:
-            filename (str or None): the name or path of the file to save to; if None, uses stored
+            filename (str or None): the name or path of the file (or folder) to save to; if None, uses stored
             force (bool): whether to allow saving even of a run or partially-run People object
+            columnar (bool): if True, save each array (and each contact layer column) as a separate .npy file in a folder, along with a JSON manifest
             kwargs: passed to ``sc.makefilepath()``
 
         Returns:
             filename (str): the validated absolute path to the saved file
 
-        **Example**::
+        With ``columnar=True``, the arrays are memory-mapped when loaded, rather
+        than being read into memory, so large populations load almost instantly,
+        and arrays are only copied into memory (page by page) when they are
+        modified. This is especially useful when many sims use the same population.
+
+        **Examples**::
 
             sim = cv.Sim()
             sim.initialize()
             sim.people.save() # Saves to a .ppl file
+            sim.people.save('my-people', columnar=True) # Saves to a folder
+
+            sim2 = cv.Sim(popfile='my-people') # Load the folder as the population
         '''
 
         # Check if we're trying to save an already run People object
@@ -1324,18 +1474,80 @@ use sim.people.save(force=True). Otherwise, the correct approach is:
             filename = 'covasim.ppl'
         filename = sc.makefilepath(filename=filename, **kwargs)
         self.filename = filename # Store the actual saved filename
-        cvm.save(filename=filename, obj=self)
+        if columnar:
+            self._save_columnar(filename)
+        else:
+            cvm.save(filename=filename, obj=self)
 
         return filename
 
 
+    def _save_columnar(self, folder):
+        '''
+        Save the people as a folder of .npy files, one per array and per contact
+        layer column, plus a JSON manifest describing them, and the remaining
+        (small) attributes as a gzipped pickle. See save().
+        '''
+        folder = sc.path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        manifest = dict(format=columnar_format, version=cvv.__version__, pop_size=len(self), columns={}, layers={})
+
+        def save_col(arr, fname):
+            np.save(folder / fname, arr)
+            return dict(file=fname, dtype=arr.dtype.str, shape=list(arr.shape))
+
+        # Save the arrays, and a copy of the people without them
+        shell = sc.cp(self)
+        shell.__dict__.pop('_compact', None) # All arrays are saved in full
+        for key in self.keys():
+            manifest['columns'][key] = save_col(self[key], f'{key}.npy')
+            shell[key] = None
+        shell.contacts = sc.cp(self.contacts)
+        for lkey,layer in self.contacts.items():
+            manifest['layers'][lkey] = {}
+            shell.contacts[lkey] = sc.cp(layer)
+            for key in layer.keys():
+                manifest['layers'][lkey][key] = save_col(layer[key], f'contacts_{lkey}_{key}.npy')
+                shell.contacts[lkey][key] = np.empty(0, dtype=layer[key].dtype)
+        cvm.save(filename=folder / 'people.obj', obj=shell)
+        sc.savejson(folder / 'manifest.json', manifest)
+        return
+
+
     @staticmethod
-    def load(filename, *args, **kwargs):
+    def _load_columnar(folder, mmap=True, **kwargs):
+        ''' Load people saved with save(columnar=True); see load() '''
+        folder = sc.path(folder)
+        manifest = sc.loadjson(folder / 'manifest.json')
+        if manifest.get('format') != columnar_format:
+            errormsg = f'The manifest in {folder} has format "{manifest.get("format")}", which is not a Covasim columnar format ({columnar_format})'
+            raise ValueError(errormsg)
+
+        def load_col(spec):
+            arr = np.load(folder / spec['file'], mmap_mode='c' if mmap else None) # Copy-on-write: changes are never written to disk
+            if arr.dtype.str != spec['dtype'] or list(arr.shape) != spec['shape']:
+                errormsg = f'Column {spec["file"]} has dtype {arr.dtype.str} and shape {arr.shape}, but the manifest specifies {spec["dtype"]} and {tuple(spec["shape"])}'
+                raise ValueError(errormsg)
+            return np.asarray(arr) # Use a plain array that refers to the memory map
+
+        people = cvm.load(folder / 'people.obj', **kwargs)
+        for key,spec in manifest['columns'].items():
+            people[key] = load_col(spec)
+        for lkey,layer in manifest['layers'].items():
+            for key,spec in layer.items():
+                people.contacts[lkey][key] = load_col(spec)
+        return people
+
+
+    @staticmethod
+    def load(filename, *args, mmap=True, **kwargs):
         '''
-        Load from disk from a gzipped pickle.
+        Load from disk from a gzipped pickle, or from a folder saved with
+        ``people.save(columnar=True)``.
 
         Args:
-            filename (str): the name or path of the file to load from
+            filename (str): the name or path of the file or folder to load from
+            mmap (bool): for a folder, whether to memory-map the arrays rather than reading them into memory
             args (list): passed to ``cv.load()``
             kwargs (dict): passed to ``cv.load()``
 
@@ -1346,7 +1558,10 @@ use sim.people.save(force=True). Otherwise, the correct approach is:
 
             people = cv.people.load('my-people.ppl')
         '''
-        people = cvm.load(filename, *args, **kwargs)
+        if is_columnar(filename):
+            people = BasePeople._load_columnar(filename, mmap=mmap, **kwargs)
+        else:
+            people = cvm.load(filename, *args, **kwargs)
         if not isinstance(people, BasePeople): # pragma: no cover
             errormsg = f'Cannot load object of {type(people)} as a People object'
             raise TypeError(errormsg)
@@ -1629,6 +1844,12 @@ class Layer(FlexDict):
     although not all have to be supplied at the time of creation (they must all
     be the same at the time of initialization, though, or else validation will fail).
 
+    Contact lookups (``layer.find_contacts()`` and ``layer.neighbors()``) use an
+    adjacency index that is built when it is needed, and discarded when p1 or p2
+    are set or the layer is changed via ``layer.update()``, ``layer.pop_inds()``,
+    or ``layer.append()``. If p1 or p2 are modified in place some other way, call
+    ``layer.reset_index()``.
+
     **Examples**::
 
         # Generate an average of 10 contacts for 1000 people
@@ -1656,6 +1877,7 @@ class Layer(FlexDict):
         }
         self.basekey = 'p1' # Assign a base key for calculating lengths and performing other operations
         self.label = label
+        self.reset_index()
 
         # Handle args
         kwargs = sc.mergedicts(*args, kwargs)
@@ -1683,6 +1905,21 @@ class Layer(FlexDict):
             return 0
 
 
+    def __setitem__(self, key, value):
+        ''' Discard the adjacency index if the edges change '''
+        if key in ['p1', 'p2']:
+            self.reset_index()
+        return super().__setitem__(key, value)
+
+
+    def __getstate__(self):
+        ''' Don't save the adjacency index, since it can be rebuilt '''
+        state = self.__dict__.copy()
+        state['_csr'] = None
+        state['_n_lookups'] = 0
+        return state
+
+
     def __repr__(self):
         ''' Convert to a dataframe for printing '''
         namestr = self.__class__.__name__
@@ -1751,6 +1988,7 @@ class Layer(FlexDict):
         for key in self.meta_keys():
             output[key] = self[key][inds] # Copy to the output object
             self[key] = np.delete(self[key], inds) # Remove from the original
+        self.reset_index()
         return output
 
 
@@ -1768,6 +2006,7 @@ class Layer(FlexDict):
             n_total = n_curr + n_new # New size
             self[key] = np.resize(self[key], n_total) # Resize to make room, preserving dtype
             self[key][n_curr:] = new_arr # Copy contacts into the layer
+        self.reset_index()
         return
 
 
@@ -1831,19 +2070,110 @@ class Layer(FlexDict):
         Then find_contacts([1,3]) would return {1,2,3}
         """
 
-        # Check types
+        # Find the contacts. Building the adjacency index takes longer than checking
+        # every edge once, so it is only built if the layer is used for lookups more
+        # than once without changing (e.g. for static layers, but not dynamic ones).
+        if getattr(self, '_csr', None) is None and not getattr(self, '_n_lookups', 0):
+            self._n_lookups = 1
+            if not isinstance(inds, np.ndarray):
+                inds = sc.toarray(inds)
+            inds = inds[inds >= 0]
+            is_ind = np.zeros(inds.max()+1 if len(inds) else 0, dtype=bool)
+            is_ind[inds] = True
+            contact_inds = cvu.find_partners(self['p1'], self['p2'], is_ind)
+        else:
+            contact_inds = self.neighbors(inds, return_edges=False) # Only the edges of these people are checked
+        if as_array:
+            contact_inds = np.unique(contact_inds)  # Sorting ensures that the results are reproducible for a given seed as well as being identical to previous versions of Covasim
+        else:
+            contact_inds = set(contact_inds.tolist())
+
+        return contact_inds
+
+
+    def reset_index(self):
+        ''' Discard the adjacency index, e.g. after modifying p1 or p2 in place '''
+        self._csr = None
+        self._n_lookups = 0 # Number of lookups since the edges changed
+        return
+
+
+    def build_index(self, force=False):
+        '''
+        Build (or return the cached) compressed sparse row adjacency index of the
+        layer, which lists the neighbors of each person in both directions. This is
+        done automatically by ``layer.neighbors()`` and ``layer.find_contacts()``.
+
+        Args:
+            force (bool): rebuild the index even if it has already been built, e.g. if p1 or p2 have been modified in place
+
+        Returns:
+            A dict of arrays: offsets, neighbors, and edges, such that the neighbors
+            of person i are ``neighbors[offsets[i]:offsets[i+1]]``, connected by
+            the edges with those indices in ``edges``
+        '''
+        csr = getattr(self, '_csr', None)
+        if csr is None or force:
+            p1 = np.asarray(self['p1'], dtype=cvd.default_int)
+            p2 = np.asarray(self['p2'], dtype=cvd.default_int)
+            n = max(p1.max(), p2.max()) + 1 if len(p1) else 0
+            offsets, neighbors, edges = cvu.make_csr(p1, p2, n)
+            csr = dict(offsets=offsets, neighbors=neighbors, edges=edges)
+            self._csr = csr
+        return csr
+
+
+    def neighbors(self, inds, return_edges=True):
+        '''
+        Find the neighbors of the specified people, in both directions, including
+        duplicates if people are connected by more than one edge. Uses the layer's
+        adjacency index, so the cost depends only on the number of contacts of
+        these people rather than the size of the layer.
+
+        Args:
+            inds (int/array): indices of the people whose neighbors to return
+            return_edges (bool): whether to also return the index of each edge (e.g. to look up its beta)
+
+        Returns:
+            neighbors (array): the neighbors of each person in inds in turn
+            edges (array): if return_edges, the index of the edge to each neighbor
+
+        **Example**::
+
+            layer = sim.people.contacts['h']
+            neighbors, edges = layer.neighbors([3, 7])
+            sources = np.repeat([3, 7], layer.degree([3, 7])) # Who each neighbor is a neighbor of
+            betas = layer['beta'][edges]
+        '''
         if not isinstance(inds, np.ndarray):
             inds = sc.toarray(inds)
-        if inds.dtype != np.int64:  # pragma: no cover # This is int64 since indices often come from cv.true(), which returns int64
+        if inds.dtype != np.int64: # This is int64 since indices often come from cv.true(), which returns int64
             inds = np.array(inds, dtype=np.int64)
+        csr = self.build_index()
+        neighbors, edges = cvu.csr_neighbors(csr['offsets'], csr['neighbors'], csr['edges'], inds)
+        if return_edges:
+            return neighbors, edges
+        else:
+            return neighbors
 
-        # Find the contacts
-        contact_inds = cvu.find_contacts(self['p1'], self['p2'], inds)
-        if as_array:
-            contact_inds = np.fromiter(contact_inds, dtype=cvd.default_int)
-            contact_inds.sort()  # Sorting ensures that the results are reproducible for a given seed as well as being identical to previous versions of Covasim
 
-        return contact_inds
+    def degree(self, inds=None):
+        '''
+        Return the number of edges of each of the specified people (default: of
+        everyone in the index), counting both directions.
+
+        Args:
+            inds (int/array): indices of the people
+        '''
+        offsets = self.build_index()['offsets']
+        degrees = np.diff(offsets)
+        if inds is None:
+            return degrees
+        inds = np.array(inds, dtype=np.int64, ndmin=1)
+        output = np.zeros(len(inds), dtype=np.int64)
+        valid = (inds >= 0) & (inds < len(degrees))
+        output[valid] = degrees[inds[valid]]
+        return output
 
 
     def update(self, people, frac=1.0):
@@ -1873,5 +2203,400 @@ class Layer(FlexDict):
         self['p1'][inds]   = np.array(cvu.choose_r(max_n=pop_size, n=n_new), dtype=cvd.default_int) # Choose with replacement
         self['p2'][inds]   = np.array(cvu.choose_r(max_n=pop_size, n=n_new), dtype=cvd.default_int)
         self['beta'][inds] = np.ones(n_new, dtype=cvd.default_float)
+        self.reset_index() # The edges have changed in place
         return
 
+
+
+class InfectionLog(sc.prettyobj):
+    '''
+    A growable, array-backed record of who infected whom. Each infection is stored
+    as a row in a set of typed columns: source, target, date, and integer codes
+    for the layer and the variant (the labels are stored in ``log.labels``).
+    Storage is preallocated and doubled whenever it runs out, so appending is
+    amortized constant time per infection.
+
+    For backwards compatibility, the log also behaves like the list of dictionaries
+    it replaces: ``len(log)``, ``log[i]``, and ``for entry in log`` all work, with
+    each entry being a dict with keys source, target, date, layer, and variant
+    (source is None for seed infections and importations). However, analyses
+    should use the columns directly, e.g. ``log.source``, which are much faster.
+
+    This class is usually created automatically by the People object.
+
+    Args:
+        capacity (int): the initial number of rows to allocate
+
+    **Example**::
+
+        sim = cv.Sim().run()
+        log = sim.people.infection_log
+        df = log.to_df()
+        today = log.by_date(sim.t) # Rows for infections on the last day
+        sources = log.source[today]
+    '''
+
+    def __init__(self, capacity=0):
+        self.meta = {
+            'source':  cvd.default_int, # Index of the infecting person, or -1 if none
+            'target':  cvd.default_int, # Index of the infected person
+            'date':    cvd.default_int, # Timestep of infection
+            'layer':   np.int16,        # Code for the layer the infection occurred on
+            'variant': np.int16,        # Code for the variant
+        }
+        self.n = 0 # Number of rows in use
+        self.arrs = {key:np.empty(capacity, dtype=dtype) for key,dtype in self.meta.items()}
+        self.labels = {'layer':[], 'variant':[]} # Map from codes to labels
+        self._sorted = True # Whether dates are nondecreasing, which allows faster lookup
+        return
+
+
+    def __len__(self):
+        return self.n
+
+
+    def __getitem__(self, key):
+        ''' Return a column by name, a single entry as a dict by index, or a list of entries by slice or array of indices '''
+        if isinstance(key, str):
+            return self.arrs[key][:self.n]
+        elif isinstance(key, slice):
+            return [self.entry(i) for i in range(*key.indices(self.n))]
+        elif np.ndim(key):
+            return [self.entry(i) for i in key]
+        else:
+            return self.entry(key)
+
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self.entry(i)
+
+
+    def __eq__(self, other):
+        ''' Compare column by column; layers and variants are compared by label, since their codes depend on the order they were added '''
+        if isinstance(other, list): # Legacy format
+            return self.to_list() == other
+        elif not isinstance(other, InfectionLog):
+            return NotImplemented
+        if self.n != other.n:
+            return False
+        for key in self.meta.keys():
+            if key in self.labels:
+                equal = np.array_equal(self.decode(key), other.decode(key))
+            else:
+                equal = np.array_equal(self[key], other[key])
+            if not equal:
+                return False
+        return True
+
+
+    @property
+    def capacity(self):
+        return len(self.arrs['target'])
+
+    @property
+    def source(self):
+        return self['source']
+
+    @property
+    def target(self):
+        return self['target']
+
+    @property
+    def date(self):
+        return self['date']
+
+    @property
+    def has_source(self):
+        ''' Boolean array of which infections were transmitted, i.e. not seed infections or importations '''
+        return self['source'] >= 0
+
+
+    def encode(self, which, label):
+        ''' Convert a layer or variant label to its integer code, adding it if new '''
+        labels = self.labels[which]
+        try:
+            return labels.index(label)
+        except ValueError:
+            labels.append(label)
+            return len(labels) - 1
+
+
+    def decode(self, which, rows=None):
+        ''' Return an object array of layer or variant labels for the specified rows (default: all) '''
+        labels = np.empty(len(self.labels[which]), dtype=object)
+        labels[:] = self.labels[which]
+        codes = self[which] if rows is None else self[which][rows]
+        return labels[codes]
+
+
+    def _grow(self, n_new):
+        ''' Ensure there is room for n_new more rows, doubling the storage if not '''
+        n_total = self.n + n_new
+        if n_total > self.capacity:
+            new_capacity = max(n_total, 2*self.capacity)
+            for key,arr in self.arrs.items():
+                new_arr = np.empty(new_capacity, dtype=arr.dtype)
+                new_arr[:self.n] = arr[:self.n]
+                self.arrs[key] = new_arr
+        return
+
+
+    def append(self, target, source=None, date=0, layer=None, variant=None):
+        '''
+        Add a set of infections to the log, all occurring on the same date, layer,
+        and variant.
+
+        Args:
+            target (array): indices of the people infected
+            source (array): indices of the people who infected them (None for seed infections or importations)
+            date (int): the timestep on which the infections occurred
+            layer (str): the label of the layer the infections occurred on
+            variant (str): the label of the variant
+        '''
+        target = sc.toarray(target)
+        n_new = len(target)
+        if not n_new:
+            return
+
+        self._grow(n_new)
+        start, end = self.n, self.n + n_new
+        self.arrs['target'][start:end]  = target
+        self.arrs['source'][start:end]  = -1 if source is None else source
+        self.arrs['date'][start:end]    = date
+        self.arrs['layer'][start:end]   = self.encode('layer', layer)
+        self.arrs['variant'][start:end] = self.encode('variant', variant)
+        if start and date < self.arrs['date'][start-1]:
+            self._sorted = False
+        self.n = end
+        return
+
+
+    def by_date(self, date):
+        ''' Return the row indices of all infections that occurred on the specified date '''
+        dates = self['date']
+        if self._sorted:
+            start, end = np.searchsorted(dates, [date, date+1])
+            return np.arange(start, end)
+        else:
+            return sc.findinds(dates == date)
+
+
+    def entry(self, i):
+        ''' Return a single infection as a dict, in the same format as the legacy list-based log '''
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            errormsg = f'Infection log index {i} is out of range for a log with {self.n} entries'
+            raise IndexError(errormsg)
+        source = self.arrs['source'][i]
+        entry = dict(
+            source  = int(source) if source >= 0 else None,
+            target  = int(self.arrs['target'][i]),
+            date    = int(self.arrs['date'][i]),
+            layer   = self.labels['layer'][self.arrs['layer'][i]],
+            variant = self.labels['variant'][self.arrs['variant'][i]],
+        )
+        return entry
+
+
+    def to_list(self):
+        ''' Convert to a list of dicts, i.e. the legacy format of the log '''
+        return list(self)
+
+
+    def to_dict(self):
+        ''' Convert to a dict of arrays, with source as a float array with NaN for seed infections '''
+        source = np.array(self['source'], dtype=cvd.default_float)
+        source[~self.has_source] = np.nan
+        output = dict(
+            source  = source,
+            target  = self['target'].copy(),
+            date    = self['date'].copy(),
+            layer   = self.decode('layer'),
+            variant = self.decode('variant'),
+        )
+        return output
+
+
+    def to_df(self):
+        ''' Convert to a dataframe '''
+        return pd.DataFrame(self.to_dict())
+
+
+    @classmethod
+    def from_list(cls, entries):
+        ''' Create an infection log from a list of dicts, e.g. from a legacy People object '''
+        log = cls(capacity=len(entries))
+        for entry in entries:
+            source = entry['source']
+            log.append([entry['target']], source=None if source is None else [source], date=entry['date'], layer=entry['layer'], variant=entry.get('variant'))
+        return log
+
+
+
+class EventQueue(sc.prettyobj):
+    '''
+    A calendar queue of scheduled state transitions, used by the People object
+    if ``cv.options.event_queue`` is set. Each time a date (e.g. date_recovered)
+    is set for some people, they are added to the bucket for the first timestep
+    on or after that date. On each timestep, only the people in the buckets that
+    are due are checked, rather than everyone with that date defined.
+
+    Entries are never removed when a date changes; instead, everyone popped from
+    the queue is checked against their current date, so stale entries are simply
+    discarded. Popping timestep t removes all buckets up to and including t, so
+    people whose dates are already in the past when they are added are popped
+    next time, matching the "t >= date" check used otherwise.
+
+    This class is usually created automatically by the People object.
+
+    Args:
+        keys (list): the date keys to keep queues for, e.g. ['date_recovered']
+
+    **Example**::
+
+        queue = cv.EventQueue(['date_recovered'])
+        queue.push('date_recovered', inds=np.array([3,1,2]), dates=np.array([5.0, 2.0, np.nan]))
+        queue.pop('date_recovered', t=5) # Returns array([1,3])
+    '''
+
+    def __init__(self, keys):
+        self.buckets = {key:{} for key in keys} # For each key, a dict mapping timesteps to lists of arrays of indices
+        return
+
+
+    def __len__(self):
+        ''' Total number of entries, including stale ones '''
+        return sum(len(inds) for buckets in self.buckets.values() for bucket in buckets.values() for inds in bucket)
+
+
+    def push(self, key, inds, dates):
+        '''
+        Add people to the queue for the given date key
+
+        Args:
+            key (str): the date key, e.g. 'date_recovered'
+            inds (array): the indices of the people
+            dates (array): their dates (NaN dates are skipped)
+        '''
+        defined = ~np.isnan(dates)
+        inds = np.asarray(inds, dtype=np.int64)[defined]
+        if not len(inds):
+            return
+        days = np.ceil(dates[defined]).astype(np.int64) # The first timestep t for which t >= date
+        buckets = self.buckets[key]
+        first = days[0]
+        if (days == first).all(): # Shortcut for the common case of everyone on the same day
+            buckets.setdefault(first, []).append(inds)
+        else:
+            order = np.argsort(days, kind='stable')
+            days = days[order]
+            inds = inds[order]
+            unique_days, starts = np.unique(days, return_index=True)
+            for day,day_inds in zip(unique_days, np.split(inds, starts[1:])):
+                buckets.setdefault(day, []).append(day_inds)
+        return
+
+
+    def pop(self, key, t):
+        ''' Remove and return the sorted, unique indices of everyone in the buckets up to and including timestep t '''
+        buckets = self.buckets[key]
+        days = [day for day in buckets.keys() if day <= t]
+        if not days:
+            return np.empty(0, dtype=np.int64)
+        arrs = []
+        for day in days:
+            arrs.extend(buckets.pop(day))
+        return np.unique(np.concatenate(arrs))
+
+
+class Timings(sc.prettyobj):
+    '''
+    A record of how long each phase of each time step of a simulation took, in
+    seconds. Phases are named by what they do (e.g. "update_contacts"), with the
+    label after a colon for phases that are repeated, e.g. "intervention:test_prob"
+    or "transmission:h:wild" (layer, then variant). If transmission is calculated
+    for all layers and variants at once (see ``cv.options.fused_trans``), it is
+    timed as a single "transmission" phase instead. Phases are added the first time
+    they are timed, so custom interventions and analyzers are included automatically.
+
+    This class is usually created automatically by the sim, and is only filled in
+    if ``cv.options.timings`` is set.
+
+    Args:
+        npts (int): the number of time points in the simulation
+
+    **Example**::
+
+        with cv.options.context(timings=True):
+            sim = cv.Sim().run()
+        sim.timings.disp() # Print a summary table
+        df = sim.timings.to_df() # Time of each phase on each step
+    '''
+
+    def __init__(self, npts=0):
+        self.npts  = npts
+        self.data  = sc.odict() # Time taken by each phase on each step
+        self.timed = np.zeros(npts, dtype=bool) # Which steps have been timed
+        self.t     = None # The step currently being timed
+        self._last = None # The time the last phase ended
+        return
+
+
+    def start(self, t):
+        ''' Start timing step t '''
+        self.t = t
+        self.timed[t] = True
+        self._last = perf_counter()
+        return
+
+
+    def lap(self, phase):
+        ''' Record the time since the step started or the last phase ended as the time taken by this phase '''
+        now = perf_counter()
+        if phase not in self.data:
+            self.data[phase] = np.zeros(self.npts)
+        self.data[phase][self.t] += now - self._last
+        self._last = now
+        return
+
+
+    @property
+    def total(self):
+        ''' Total time taken by all phases on all steps '''
+        return sum(arr.sum() for arr in self.data.values())
+
+
+    def to_df(self):
+        ''' Convert to a dataframe, with one row for each step that was timed and one column for each phase '''
+        inds = sc.findinds(self.timed)
+        df = pd.DataFrame({phase:arr[inds] for phase,arr in self.data.items()}, columns=list(self.data.keys()))
+        df.insert(0, 't', inds)
+        return df
+
+
+    def summary(self):
+        ''' Summarize the time taken by each phase across all steps, sorted from slowest to fastest '''
+        n_steps = max(1, self.timed.sum())
+        total = max(self.total, np.finfo(float).tiny)
+        rows = []
+        for phase,arr in self.data.items():
+            rows.append(dict(phase=phase, total=arr.sum(), per_step=arr.sum()/n_steps, max=arr.max(), percent=arr.sum()/total*100))
+        df = pd.DataFrame(rows, columns=['phase', 'total', 'per_step', 'max', 'percent'])
+        df = df.sort_values('total', ascending=False).reset_index(drop=True)
+        return df
+
+
+    def disp(self, output=False):
+        ''' Print (or return) a table of the time taken by each phase '''
+        n_steps = self.timed.sum()
+        string = f'Timings for {n_steps} steps (total {self.total:0.3f} s):\n'
+        string += f'{"Phase":<40s} {"Total (s)":>10s} {"Per step (ms)":>14s} {"Max (ms)":>10s} {"%":>6s}\n'
+        for row in self.summary().itertuples():
+            string += f'{row.phase:<40s} {row.total:>10.3f} {row.per_step*1e3:>14.3f} {row.max*1e3:>10.3f} {row.percent:>6.1f}\n'
+        if output:
+            return string
+        else:
+            print(string)
+            return
@@ -156,17 +156,16 @@ def update_peak_nab(people, inds, nab_pars, symp=None):
 
     # Extract parameters and indices
     pars = people.pars
-    has_nabs = people.nab[inds] > 0
-    no_prior_nab_inds = inds[~has_nabs]
-    prior_nab_inds = inds[has_nabs]
-
-    # 1) Individuals that already have NAbs from a previous vaccination/infection have their NAb level boosted
-    if len(prior_nab_inds):
-        boost_factor = nab_pars['nab_boost']
-        people.peak_nab[prior_nab_inds] *= boost_factor
+    inds = np.asarray(inds, dtype=np.int64)
+    no_prior_nab_inds = inds[~(people.nab[inds] > 0)]
 
+    # 1) Individuals that already have NAbs from a previous vaccination/infection have their NAb level boosted by this factor
+    boost_factor = cvd.default_float(nab_pars['nab_boost'])
 
     # 2) Individuals without prior NAbs are assigned an initial level drawn from a distribution.
+    init_nab = np.empty(0)
+    scale = np.empty(0)
+    norm_factor = 1.0
     if len(no_prior_nab_inds):
 
         # Firstly, ensure that we don't try to apply a booster effect to people without NAbs
@@ -176,28 +175,24 @@ def update_peak_nab(people, inds, nab_pars, symp=None):
 
         # Now draw the initial NAb levels
         init_nab = cvu.sample(**nab_pars['nab_init'], size=len(no_prior_nab_inds))
-        no_prior_nab = (2 ** init_nab)
+        init_nab = np.asarray(2 ** init_nab, dtype=np.float64)
 
         # Next, these initial NAb levels are normalized to be equivalent to "vaccine NAbs".
         # This is done so that when we check immunity, we can calculate immune protection
         # using a single curve and account for multiple sources of immunity (vaccine and natural).
         if symp is not None:
-            # Setting up for symptom scaling
-            prior_symp = np.full(pars['pop_size'], np.nan)
-            prior_symp[symp['asymp']] = pars['rel_imm_symp']['asymp']
-            prior_symp[symp['mild']] = pars['rel_imm_symp']['mild']
-            prior_symp[symp['sev']] = pars['rel_imm_symp']['severe']
-            prior_symp[prior_nab_inds] = np.nan
-            prior_symp = prior_symp[~np.isnan(prior_symp)]
-            # Applying symptom scaling and a normalization factor to the NAbs
+            # Setting up for symptom scaling: the scale factors are matched to the initial levels in order of the people's indices
+            rel_imm_symp = pars['rel_imm_symp']
+            symp_inds = np.concatenate([symp['asymp'], symp['mild'], symp['sev']]).astype(np.int64)
+            symp_scale = np.concatenate([np.full(len(symp[k]), rel_imm_symp[rk], dtype=np.float64) for k,rk in [('asymp','asymp'), ('mild','mild'), ('sev','severe')]])
+            order = np.argsort(symp_inds)
+            symp_inds = symp_inds[order]
+            scale = symp_scale[order][~(people.nab[symp_inds] > 0)]
             norm_factor = 1 + nab_pars['nab_eff']['alpha_inf_diff']
-            no_prior_nab = no_prior_nab * prior_symp * norm_factor
-
-        # Update people's peak NAbs
-        people.peak_nab[no_prior_nab_inds] = no_prior_nab
 
-    # Update time of nab event
-    people.t_nab_event[inds] = people.t
+    # Update people's peak NAbs and the time of the NAb event, in place
+    cvu.update_peak_nab(people.t, inds, people.nab, people.peak_nab, people.t_nab_event, boost_factor, init_nab, scale, norm_factor)
+    mark_nab_changed(people, inds)
 
     return
 
@@ -206,10 +201,27 @@ def update_nab(people, inds):
     '''
     Step NAb levels forward in time
     '''
-    t_since_boost = people.t - people.t_nab_event[inds]
-    people.nab[inds] += people.pars['nab_kin'][t_since_boost]*people.peak_nab[inds]
-    people.nab[inds] = np.where(people.nab[inds]<0, 0, people.nab[inds]) # Make sure nabs don't drop below 0
-    people.nab[inds] = np.where([people.nab[inds] > people.peak_nab[inds]], people.peak_nab[inds], people.nab[inds]) # Make sure nabs don't exceed peak_nab
+    inds = np.asarray(inds, dtype=np.int64)
+    nab_kin = np.asarray(people.pars['nab_kin'], dtype=np.float64)
+    changed = cvu.update_nab(people.t, inds, people.nab, people.peak_nab, people.t_nab_event, nab_kin)
+    mark_nab_changed(people, inds[changed])
+    return
+
+
+def mark_nab_changed(people, inds):
+    '''
+    Record that the immunity of these people needs to be recalculated by the next
+    call to check_immunity(), e.g. because their NAbs, recovery or vaccination
+    status changed. Nothing is recorded until check_immunity() has first been
+    run for everyone.
+
+    Args:
+        people (People): the people object
+        inds (array): the indices of the people whose immunity has changed
+    '''
+    changed = getattr(people, '_nab_changed', None)
+    if changed is not None:
+        changed.append(np.asarray(inds, dtype=np.int64))
     return
 
 
@@ -247,6 +259,91 @@ def calc_VE(nab, ax, pars):
     return output
 
 
+def make_VE_table(nab_eff, tol, nab_range=(1e-6, 1e6)):
+    '''
+    Precompute the immunity protection factors for each axis of protection, for
+    use with calc_VE_table(). Each octave of NAb levels is divided into 2**m
+    equal-width bins, so the table entry for a given NAb level can be found from
+    its floating-point representation, without taking its logarithm. Since the
+    protection factors are logistic functions of log NAbs, the maximum error of
+    linear interpolation within a bin is bounded by 2**(-2m)/8*(beta**2/(6*sqrt(3))
+    + beta/4), where beta is the exponent for that axis; m is chosen to keep this
+    within the tolerance.
+
+    Args:
+        nab_eff   (dict)  : dictionary of parameters for the vaccine efficacy
+        tol       (float) : the maximum allowed error of the interpolated values
+        nab_range (tuple) : the smallest and largest nonzero NAb levels covered by the table; levels outside this range are calculated exactly
+
+    Returns:
+        A dict with the table of values and the information needed to look them up
+    '''
+    if not tol > 0:
+        errormsg = f'The lookup table tolerance must be a positive number, not {tol}'
+        raise ValueError(errormsg)
+
+    # Choose the number of bins per octave
+    max_curv = 1/(6*np.sqrt(3)) # Maximum absolute second derivative of the logistic function
+    max_err  = max(beta**2*max_curv + abs(beta)/4 for beta in [nab_eff['beta_inf'], nab_eff['beta_symp_inf'], nab_eff['beta_sev_symp']])/8
+    n_bits   = max(0, int(np.ceil(np.log2(max_err/tol)/2)))
+    shift    = 52 - n_bits # Number of bits in the mantissa of a float64, less the bits used for the table
+
+    # Construct the grid from the bits of the NAb levels, and evaluate the protection factors on it
+    k_min, k_max = np.array(nab_range, dtype=np.float64).view(np.int64) >> shift
+    grid   = (np.arange(k_min, k_max+2, dtype=np.int64) << shift).view(np.float64)
+    values = np.array([calc_VE(grid, ax, nab_eff) for ax in ['sus', 'symp', 'sev']])
+    slopes = np.diff(values, axis=1)/np.diff(grid)
+    return dict(shift=shift, k_min=int(k_min), grid=grid, values=values, slopes=slopes, tol=tol, nab_eff=sc.dcp(nab_eff))
+
+
+def get_VE_table(people):
+    '''
+    Return the lookup table for converting NAbs to immunity protection that was
+    constructed by init_immunity(), or None if ``pars['nab_eff_tol']`` is not set.
+    If the tolerance or the efficacy parameters have changed since then, the
+    table is constructed again.
+
+    Args:
+        people (People): the people object
+
+    Returns:
+        The lookup table, or None
+    '''
+    pars = people.pars
+    tol = pars['nab_eff_tol']
+    VE_table = getattr(people, '_nab_eff_table', None)
+    if not tol:
+        VE_table = None
+    elif VE_table is None or VE_table['tol'] != tol or VE_table['nab_eff'] != pars['nab_eff']:
+        VE_table = make_VE_table(pars['nab_eff'], tol)
+    people._nab_eff_table = VE_table
+    return VE_table
+
+
+def calc_VE_table(nab, VE_table, pars):
+    '''
+    Convert NAb levels to immunity protection factors for all three axes of
+    protection at once, using a lookup table constructed by make_VE_table().
+    Values outside the range of the table are calculated exactly.
+
+    Args:
+        nab      (arr)  : an array of effective NAb levels
+        VE_table (dict) : the lookup table, from make_VE_table()
+        pars     (dict) : dictionary of parameters for the vaccine efficacy
+
+    Returns:
+        an array of immunity protection factors with one row per axis ('sus', 'symp', and 'sev')
+    '''
+    nab = np.ascontiguousarray(nab, dtype=np.float64)
+    t = VE_table
+    output = cvu.interpolate_VE(nab, t['shift'], t['k_min'], t['grid'], t['values'], t['slopes'])
+    exact = cvu.true(np.isnan(output[0,:])) # Outside the range of the table
+    if len(exact):
+        for i,ax in enumerate(['sus', 'symp', 'sev']):
+            output[i, exact] = calc_VE(nab[exact], ax, pars)
+    return output
+
+
 def calc_VE_symp(nab, pars):
     '''
     Converts NAbs to marginal VE against symptomatic disease
@@ -297,10 +394,16 @@ def init_immunity(sim, create=False):
     # Next, precompute the NAb kinetics and store these for access during the sim
     sim['nab_kin'] = precompute_waning(length=sim.npts, pars=sim['nab_decay'])
 
+    # Optionally, precompute a lookup table for converting NAbs to immunity protection
+    tol = sim['nab_eff_tol']
+    sim._nab_eff_table = make_VE_table(sim['nab_eff'], tol) if tol else None
+    if sim.people:
+        sim.people._nab_eff_table = sim._nab_eff_table
+
     return
 
 
-def check_immunity(people, variants=None):
+def check_immunity(people, variants=None, full=False):
     '''
     Calculate people's immunity on this timestep from prior infections + vaccination. Calculates effective NAbs by
     weighting individuals NAbs by source and then calculating efficacy.
@@ -309,28 +412,57 @@ def check_immunity(people, variants=None):
 
         (1) prior exposure: degree of protection depends on variant, prior symptoms, and time since recovery
         (2) vaccination: degree of protection depends on variant, vaccine, and time since vaccination
+
+    By default, immunity is only recalculated for the people whose NAbs, recovery
+    or vaccination status changed since the last check, as recorded by
+    mark_nab_changed() (e.g. from update_peak_nab() and update_nab()). This gives
+    identical results to recalculating immunity for everyone, which can be done
+    with ``full=True``, and is needed if people's states or the NAb efficacy
+    parameters are modified directly.
+
+    Args:
+        people (People): the people object
+        variants (list): the indices of the variants to update (default: all)
+        full (bool): whether to recalculate immunity for everyone, rather than only for people whose immunity changed
     '''
 
     # Handle parameters and indices
     pars = people.pars
     nab_eff = pars['nab_eff']
+    reset = variants is None # Only mark everyone as up to date once all variants have been updated
     if variants is None:
         variants = range(pars['n_variants'])
 
+    # Find whose immunity needs to be updated
+    changed = getattr(people, '_nab_changed', None) # People whose immunity changed since the last check
+    if full or changed is None:
+        inds = np.arange(len(people))
+    elif len(changed):
+        inds = np.unique(np.concatenate(changed))
+    else:
+        inds = np.empty(0, dtype=np.int64)
+    if reset:
+        people._nab_changed = []
+
+    # Pull out the properties of these people
+    n = len(inds)
+    nab = people.nab[inds]
+    was_inf = cvu.true(people.t >= people.date_recovered[inds])  # Had a previous exposure, now recovered
+    recovered_variant = people.recovered_variant[inds[was_inf]]
+    is_vacc = cvu.true(people.vaccinated[inds])  # Vaccinated
+    vacc_source = people.vaccine_source[inds[is_vacc]]
+
     # Update immunity for each variant
+    VE_table = get_VE_table(people)
     for variant in variants:
-        natural_imm = np.zeros(len(people))
-        vaccine_imm = np.zeros(len(people))
+        natural_imm = np.zeros(n)
+        vaccine_imm = np.zeros(n)
 
         # Natural immunity weighting
-        was_inf = cvu.true(people.t >= people.date_recovered)  # Had a previous exposure, now recovered
-        recovered_variant = people.recovered_variant[was_inf]
         immunity = pars['immunity'][variant, :]  # retrieve cross immunity factors for natural infection
         natural_imm[was_inf] = immunity[recovered_variant.astype(int)]
 
         # Vaccine immunity weighting
-        is_vacc = cvu.true(people.vaccinated)  # Vaccinated
-        vacc_source = people.vaccine_source[is_vacc]
         if len(is_vacc) and len(pars['vaccine_pars']):  # if using simple_vaccine, do not apply
             vx_pars = pars['vaccine_pars']
             vx_map = pars['vaccine_map']
@@ -342,10 +474,13 @@ def check_immunity(people, variants=None):
 
         # Calculate overall immunity
         imm = np.maximum(natural_imm, vaccine_imm)  # Use the larger of natural immunity or vaccine immunity
-        effective_nabs = people.nab * imm
-        people.sus_imm[variant, :]  = calc_VE(effective_nabs, 'sus', nab_eff)
-        people.symp_imm[variant, :] = calc_VE(effective_nabs, 'symp', nab_eff)
-        people.sev_imm[variant, :]  = calc_VE(effective_nabs, 'sev', nab_eff)
+        effective_nabs = nab * imm
+        if VE_table is not None:
+            people.sus_imm[variant, inds], people.symp_imm[variant, inds], people.sev_imm[variant, inds] = calc_VE_table(effective_nabs, VE_table, nab_eff)
+        else:
+            people.sus_imm[variant, inds]  = calc_VE(effective_nabs, 'sus', nab_eff)
+            people.symp_imm[variant, inds] = calc_VE(effective_nabs, 'symp', nab_eff)
+            people.sev_imm[variant, inds]  = calc_VE(effective_nabs, 'sev', nab_eff)
 
     return
 
@@ -15,6 +15,7 @@ from . import base as cvb
 from . import defaults as cvd
 from . import parameters as cvpar
 from . import immunity as cvi
+from .settings import options as cvo
 
 
 #%% Helper functions
@@ -805,7 +806,9 @@ class test_num(Intervention):
         else:
             return
 
-        test_probs = np.ones(sim.n) # Begin by assigning equal testing weight (converted to a probability) to everyone
+        # Everyone starts with equal testing weight; only people whose weight differs are stored, as (inds, factor) pairs
+        weight_inds = []
+        weight_vals = []
 
         # Calculate test probabilities for people with symptoms
         symp_inds = cvu.true(sim.people.symptomatic)
@@ -817,7 +820,8 @@ class test_num(Intervention):
             count[inv_count != 0] = 1/inv_count[inv_count != 0] # Update the counts where defined
             symp_test *= self.pdf.pdf(symp_time) * count[symp_time] # Put it all together
 
-        test_probs[symp_inds] *= symp_test # Update the test probabilities
+        weight_inds.append(symp_inds) # Update the test probabilities
+        weight_vals.append(symp_test)
 
         # Handle symptomatic testing, taking into account prevalence of ILI symptoms
         if self.ili_prev is not None:
@@ -825,31 +829,50 @@ class test_num(Intervention):
                 n_ili = int(self.ili_prev[rel_t] * sim['pop_size'])  # Number with ILI symptoms on this day
                 ili_inds = cvu.choose(sim['pop_size'], n_ili) # Give some people some symptoms. Assuming that this is independent of COVID symptomaticity...
                 ili_inds = np.setdiff1d(ili_inds, symp_inds)
-                test_probs[ili_inds] *= self.symp_test
+                weight_inds.append(ili_inds)
+                weight_vals.append(self.symp_test)
 
         # Handle quarantine testing
         quar_test_inds = get_quar_inds(self.quar_policy, sim)
-        test_probs[quar_test_inds] *= self.quar_test
+        weight_inds.append(quar_test_inds)
+        weight_vals.append(self.quar_test)
 
         # Handle any other user-specified testing criteria
         if self.subtarget is not None:
             subtarget_inds, subtarget_vals = get_subtargets(self.subtarget, sim)
-            test_probs[subtarget_inds] = test_probs[subtarget_inds]*subtarget_vals
+            weight_inds.append(subtarget_inds)
+            weight_vals.append(subtarget_vals)
+
+        # Combine the factors for each person who has any; as with indexing, repeated indices within a criterion only count once, and the last value is used
+        all_inds = []
+        all_vals = []
+        for inds,vals in zip(weight_inds, weight_vals):
+            inds = np.asarray(inds, dtype=np.int64)
+            vals = np.broadcast_to(np.asarray(vals, dtype=np.float64), inds.shape)
+            inds, last = np.unique(inds[::-1], return_index=True)
+            all_inds.append(inds)
+            all_vals.append(vals[::-1][last])
+        diag_inds = cvu.true(sim.people.diagnosed)
+        all_inds.append(diag_inds)
+        all_vals.append(np.ones(len(diag_inds)))
+        test_inds, inverse = np.unique(np.concatenate(all_inds), return_inverse=True)
+        test_probs = np.ones(len(test_inds))
+        np.multiply.at(test_probs, inverse, np.concatenate(all_vals))
 
         # Don't re-diagnose people
-        diag_inds  = cvu.true(sim.people.diagnosed)
-        test_probs[diag_inds] = 0.0
+        test_probs[np.searchsorted(test_inds, diag_inds)] = 0.0
+        n_default = sim.n - len(test_inds) # Everyone else has a testing weight of 1
 
         # With dynamic rescaling, we have to correct for uninfected people outside of the population who would test
         if sim.rescale_vec[t]/sim['pop_scale'] < 1: # We still have rescaling to do
-            in_pop_tot_prob = test_probs.sum()*sim.rescale_vec[t] # Total "testing weight" of people in the subsampled population
+            in_pop_tot_prob = (test_probs.sum() + n_default)*sim.rescale_vec[t] # Total "testing weight" of people in the subsampled population
             out_pop_tot_prob = sim.scaled_pop_size - sim.rescale_vec[t]*sim['pop_size'] # Find out how many people are missing and assign them each weight 1
             in_frac = in_pop_tot_prob/(in_pop_tot_prob + out_pop_tot_prob) # Fraction of tests which should fall in the sample population
             n_tests = sc.randround(n_tests*in_frac) # Recompute the number of tests
 
         # Now choose who gets tested and test them
-        n_tests = min(n_tests, (test_probs!=0).sum()) # Don't try to test more people than have nonzero testing probability
-        test_inds = cvu.choose_w(probs=test_probs, n=n_tests, unique=True) # Choose who actually tests
+        n_tests = min(n_tests, (test_probs!=0).sum() + n_default) # Don't try to test more people than have nonzero testing probability
+        test_inds = cvu.choose_w_sparse(n_total=sim.n, n=n_tests, inds=test_inds, weights=test_probs) # Choose who actually tests
         sim.people.test(test_inds, test_sensitivity=self.sensitivity, loss_prob=self.loss_prob, test_delay=self.test_delay)
 
         return test_inds
@@ -1244,6 +1267,7 @@ class simple_vaccine(Intervention):
             # Update vaccine attributes in sim
             sim.people.vaccinated[vacc_inds] = True
             sim.people.doses[vacc_inds] += 1
+            cvi.mark_nab_changed(sim.people, vacc_inds)
 
         return
 
@@ -1411,6 +1435,7 @@ class BaseVaccination(Intervention):
         ''' Ensure variables with large memory footprints get erased '''
         super().finalize()
         self.subtarget = None # Reset to save memory
+        self._pool = None
         return
 
 
@@ -1610,6 +1635,7 @@ class vaccinate_prob(BaseVaccination):
         self.subtarget = subtarget
         self.booster   = booster
         self.second_dose_days = None  # Track scheduled second doses
+        self._pool = None # The people eligible for a first dose, if cv.options.vaccine_pool is set
         return
 
 
@@ -1630,22 +1656,25 @@ class vaccinate_prob(BaseVaccination):
             # Vaccinate people with their first dose
             for _ in find_day(self.days, sim.t, interv=self, sim=sim):
 
-                vacc_probs = np.zeros(sim['pop_size'])
+                if cvo.vaccine_pool:
+                    vacc_inds = self.select_from_pool(sim)
+                else:
+                    vacc_probs = np.zeros(sim['pop_size'])
 
-                # Find eligible people
-                vacc_probs[cvu.true(sim.people.dead)] *= 0.0  # Do not vaccinate dead people
-                # Eligibility depends on whether it's a booster or not
-                # If this is a booster, exclude unvaccinated people; otherwise, exclude vaccinated people
-                if self.booster:    eligible_inds = sc.findinds(sim.people.vaccinated)
-                else:               eligible_inds = sc.findinds(~sim.people.vaccinated)
-                vacc_probs[eligible_inds] = self.prob  # Assign equal vaccination probability to everyone
+                    # Find eligible people
+                    vacc_probs[cvu.true(sim.people.dead)] *= 0.0  # Do not vaccinate dead people
+                    # Eligibility depends on whether it's a booster or not
+                    # If this is a booster, exclude unvaccinated people; otherwise, exclude vaccinated people
+                    if self.booster:    eligible_inds = sc.findinds(sim.people.vaccinated)
+                    else:               eligible_inds = sc.findinds(~sim.people.vaccinated)
+                    vacc_probs[eligible_inds] = self.prob  # Assign equal vaccination probability to everyone
 
-                # Apply any subtargeting
-                if self.subtarget is not None:
-                    subtarget_inds, subtarget_vals = get_subtargets(self.subtarget, sim)
-                    vacc_probs[subtarget_inds] = subtarget_vals  # People being explicitly subtargeted
+                    # Apply any subtargeting
+                    if self.subtarget is not None:
+                        subtarget_inds, subtarget_vals = get_subtargets(self.subtarget, sim)
+                        vacc_probs[subtarget_inds] = subtarget_vals  # People being explicitly subtargeted
 
-                vacc_inds = cvu.true(cvu.binomial_arr(vacc_probs))  # Calculate who actually gets vaccinated
+                    vacc_inds = cvu.true(cvu.binomial_arr(vacc_probs))  # Calculate who actually gets vaccinated
 
                 if len(vacc_inds):
                     if self.p.interval is not None:
@@ -1662,6 +1691,71 @@ class vaccinate_prob(BaseVaccination):
         return vacc_inds
 
 
+    def select_from_pool(self, sim):
+        '''
+        Choose who gets their first dose today, used instead of checking everyone
+        if ``cv.options.vaccine_pool`` is set. The pool holds everyone who was
+        eligible (i.e. unvaccinated, or vaccinated if it's a booster) when it was
+        made; since no one becomes unvaccinated, it only needs to be remade for a
+        booster, when more people have been vaccinated. Each person in the pool is
+        chosen with probability ``prob`` by sampling from it, and anyone chosen who
+        is no longer eligible is removed from it, along with anyone being given
+        their first dose. Subtargeted people are chosen separately, with their own
+        probabilities, as in ``select_people()``.
+        '''
+        people = sim.people
+        pool = self._pool
+        n_vaccinated = np.count_nonzero(people.vaccinated) if self.booster else None
+        if pool is None or n_vaccinated != pool.n_vaccinated:
+            eligible = cvu.true(people.vaccinated) if self.booster else cvu.false(people.vaccinated)
+            pool = sc.objdict(inds=eligible, n_vaccinated=n_vaccinated, subtarget=None, subtargeted=None)
+            self._pool = pool
+
+        # Work out who is subtargeted, remaking the lookup only if they change
+        if self.subtarget is not None:
+            subtarget_inds, subtarget_vals = get_subtargets(self.subtarget, sim)
+            if pool.subtarget is None or not np.array_equal(subtarget_inds, pool.subtarget):
+                pool.subtarget = np.array(subtarget_inds)
+                pool.subtargeted = np.zeros(sim.n, dtype=bool)
+                pool.subtargeted[subtarget_inds] = True
+
+        # Choose people from the pool, then remove anyone who can't be chosen again
+        chosen_pos = cvu.n_binomial_sparse(self.prob, len(pool.inds))
+        chosen = pool.inds[chosen_pos]
+        if self.booster:
+            eligible = np.ones(len(chosen), dtype=bool) # No one becomes unvaccinated
+            remove   = people.dead[chosen] # Vaccinated people remain eligible for a booster
+        else:
+            eligible = ~people.vaccinated[chosen]
+            remove   = np.ones(len(chosen), dtype=bool) # Everyone chosen is either vaccinated today, or was already
+        if pool.subtargeted is not None:
+            subtargeted = pool.subtargeted[chosen]
+            remove &= ~subtargeted # Their eligibility is decided separately
+            eligible &= ~subtargeted
+        self._remove_from_pool(chosen_pos[remove])
+        vacc_inds = chosen[eligible]
+
+        # Apply any subtargeting
+        if self.subtarget is not None:
+            subtarget_inds = np.array(subtarget_inds, dtype=np.int64)
+            subtarget_probs = np.broadcast_to(np.asarray(subtarget_vals, dtype=float), subtarget_inds.shape)
+            vacc_inds = np.concatenate([vacc_inds, subtarget_inds[cvu.binomial_arr(subtarget_probs)]])
+
+        return np.unique(vacc_inds)
+
+
+    def _remove_from_pool(self, pos):
+        ''' Remove the people at the given positions from the pool, by moving people from the end into the gaps '''
+        inds = self._pool.inds
+        n = len(inds) - len(pos)
+        end = np.arange(n, len(inds))
+        end = end[~np.isin(end, pos)] # People at the end who are staying
+        gaps = pos[pos < n]
+        inds[gaps] = inds[end]
+        self._pool.inds = inds[:n]
+        return
+
+
 class vaccinate_num(BaseVaccination):
     '''
     This vaccine intervention allocates vaccines in a pre-computed order of
@@ -1703,6 +1797,7 @@ class vaccinate_num(BaseVaccination):
         self.booster    = booster
         self.subtarget  = subtarget
         self._scheduled_doses = sc.ddict(set)  # Track scheduled second doses, where applicable
+        self._pool = None # The sequence of people eligible for a first dose, if cv.options.vaccine_pool is set
         return
 
 
@@ -1746,21 +1841,24 @@ class vaccinate_num(BaseVaccination):
             scheduled = np.array([], dtype=cvd.default_int)
 
         # Next, work out who is eligible for their first dose
-        vacc_probs = np.ones(sim.n)  # Begin by assigning equal weight (converted to a probability) to everyone
-        vacc_probs[cvu.true(sim.people.dead)] = 0.0  # Dead people are not eligible
+        if cvo.vaccine_pool:
+            first_dose_eligible = self.select_from_pool(sim, num_agents)
+        else:
+            vacc_probs = np.ones(sim.n)  # Begin by assigning equal weight (converted to a probability) to everyone
+            vacc_probs[cvu.true(sim.people.dead)] = 0.0  # Dead people are not eligible
 
-        # Apply any subtargeting for this vaccination
-        if self.subtarget is not None:
-            subtarget_inds, subtarget_vals = get_subtargets(self.subtarget, sim)
-            vacc_probs[subtarget_inds] = vacc_probs[subtarget_inds]*subtarget_vals
+            # Apply any subtargeting for this vaccination
+            if self.subtarget is not None:
+                subtarget_inds, subtarget_vals = get_subtargets(self.subtarget, sim)
+                vacc_probs[subtarget_inds] = vacc_probs[subtarget_inds]*subtarget_vals
 
-        # If this is a booster, exclude unvaccinated people; otherwise, exclude vaccinated people
-        if self.booster: vacc_probs[cvu.false(sim.people.vaccinated)] = 0.0
-        else:            vacc_probs[cvu.true(sim.people.vaccinated)]  = 0.0 # Anyone who's received at least one dose is counted as vaccinated
+            # If this is a booster, exclude unvaccinated people; otherwise, exclude vaccinated people
+            if self.booster: vacc_probs[cvu.false(sim.people.vaccinated)] = 0.0
+            else:            vacc_probs[cvu.true(sim.people.vaccinated)]  = 0.0 # Anyone who's received at least one dose is counted as vaccinated
 
-        # All remaining people can be vaccinated, although anyone who has received half of a multi-dose
-        # vaccine would have had subsequent doses scheduled and therefore should not be selected here
-        first_dose_eligible = self.sequence[cvu.binomial_arr(vacc_probs[self.sequence])]
+            # All remaining people can be vaccinated, although anyone who has received half of a multi-dose
+            # vaccine would have had subsequent doses scheduled and therefore should not be selected here
+            first_dose_eligible = self.sequence[cvu.binomial_arr(vacc_probs[self.sequence])]
 
         if len(first_dose_eligible) == 0:
             return scheduled  # Just return anyone that is scheduled
@@ -1789,6 +1887,40 @@ class vaccinate_num(BaseVaccination):
         return vacc_inds
 
 
+    def select_from_pool(self, sim, num_agents):
+        '''
+        Find up to num_agents people eligible for their first dose, in order of the
+        sequence, used instead of checking everyone if ``cv.options.vaccine_pool``
+        is set. The pool is the sequence without anyone subtargeted with zero
+        probability, plus a position in it before which no one will be eligible
+        again (see ``cvu.select_sequence()``), so each day only needs to look at
+        the people after it. The pool is remade if the subtargeting changes.
+        '''
+        pool = self._pool
+        if self.subtarget is not None:
+            subtarget_inds, subtarget_vals = get_subtargets(self.subtarget, sim)
+            subtarget = (np.array(subtarget_inds), np.array(subtarget_vals))
+        else:
+            subtarget = None
+
+        if pool is None or (subtarget is not None and not all(np.array_equal(a, b) for a,b in zip(subtarget, pool.subtarget))):
+            vacc_probs = np.ones(sim.n)
+            if subtarget is not None:
+                vacc_probs[subtarget[0]] = vacc_probs[subtarget[0]]*subtarget[1]
+            sequence = np.asarray(self.sequence, dtype=np.int64)
+            probs = vacc_probs[sequence]
+            keep = probs > 0
+            sequence, probs = sequence[keep], probs[keep]
+            if (probs == 1).all():
+                probs = np.empty(0) # Everyone in the sequence is chosen if eligible, without drawing random numbers
+            pool = sc.objdict(sequence=sequence, probs=probs, start=0, subtarget=subtarget)
+            self._pool = pool
+
+        people = sim.people
+        inds, pool.start = cvu.select_sequence(pool.sequence, pool.probs, pool.start, num_agents, people.dead, people.vaccinated, bool(self.booster))
+        return inds
+
+
 
 #%% Prior/historical immunity interventions
 
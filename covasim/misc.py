@@ -338,6 +338,14 @@ def migrate(obj, update=True, verbose=True, die=False):
         if sc.compareversions(sim.version, '<3.1.1'):
             sim._legacy_trans = True
 
+        # Add the default stocks for sims initialized before they could be registered
+        if sim.initialized and not hasattr(sim, '_stocks'):
+            sim.init_stocks()
+
+        # Add missing attribute
+        if not hasattr(sim, '_nab_eff_table'):
+            sim._nab_eff_table = None
+
     # Migrations for People
     elif isinstance(obj, cvb.BasePeople): # pragma: no cover
         ppl = obj
@@ -355,6 +363,16 @@ def migrate(obj, update=True, verbose=True, die=False):
             if not hasattr(ppl, 'infected_initialized'):
                 ppl.infected_initialized = True
 
+        # Convert list-based infection logs to the columnar format
+        if isinstance(getattr(ppl, 'infection_log', None), list):
+            ppl.infection_log = cvb.InfectionLog.from_list(ppl.infection_log)
+
+        # Convert pending quarantines stored as (ind, end_day) tuples to arrays
+        for t,pending in getattr(ppl, '_pending_quarantine', {}).items():
+            if pending and np.ndim(pending[0][0]) == 0:
+                inds, end_days = np.array(pending, dtype=np.int64).reshape(-1, 2).T
+                ppl._pending_quarantine[t] = [(inds.copy(), end_days.copy())]
+
     # Migrations for MultiSims -- use recursion
     elif isinstance(obj, cvr.MultiSim):
         msim = obj
@@ -13,10 +13,16 @@ from . import defaults as cvd
 from . import base as cvb
 from . import plotting as cvplt
 from . import immunity as cvi
+from .settings import options as cvo
 
 
 __all__ = ['People']
 
+# Dates that trigger state transitions, which are scheduled in the event queue if cv.options.event_queue is set; the first group only apply to people who are exposed
+exposed_event_keys = ['date_infectious', 'date_symptomatic', 'date_severe', 'date_critical', 'date_recovered', 'date_dead']
+event_keys = exposed_event_keys + ['date_pos_test', 'date_diagnosed', 'date_end_quarantine', 'date_end_isolation']
+dur_keys = ['exp2inf', 'inf2sym', 'sym2sev', 'sev2crit', 'asym2rec', 'mild2rec', 'sev2rec', 'crit2rec', 'crit2die'] # The order used by cvu.compute_prognoses()
+
 class People(cvb.BasePeople):
     '''
     A class to perform all the operations on the people -- usually not invoked directly.
@@ -56,7 +62,7 @@ class People(cvb.BasePeople):
         self.meta = cvd.PeopleMeta() # Store list of keys and dtypes
         self.contacts = None
         self.init_contacts() # Initialize the contacts
-        self.infection_log = [] # Record of infections - keys for ['source','target','date','layer']
+        self.infection_log = cvb.InfectionLog() # Record of infections -- columns for source, target, date, layer, and variant
 
         # Set person properties -- all floats except for UID
         for key in self.meta.person:
@@ -113,7 +119,9 @@ class People(cvb.BasePeople):
             else:
                 self[key] = value
 
-        self._pending_quarantine = defaultdict(list)  # Internal cache to record people that need to be quarantined on each timestep {t:(person, quarantine_end_day)}
+        self._pending_quarantine = defaultdict(list)  # Internal cache to record people that need to be quarantined on each timestep {t:[(inds, quarantine_end_days), ...]}
+        self._nab_eff_table = None # Lookup table for converting NAbs to immunity protection, set by the sim; see immunity.get_VE_table()
+        self._samplers = {} # Samplers for the durations and beta_dist, with their parameters precomputed; see init_samplers()
 
         return
 
@@ -129,8 +137,10 @@ class People(cvb.BasePeople):
 
     def initialize(self, sim_pars=None):
         ''' Perform initializations '''
+        self.expand() # Restore the arrays if they were stored in compact form
         self.validate(sim_pars=sim_pars) # First, check that essential-to-match parameters match
         self.set_pars(sim_pars) # Replace the saved parameters with this simulation's
+        self.init_samplers()
         self.set_prognoses()
         self.initialized = True
         return
@@ -156,17 +166,52 @@ class People(cvb.BasePeople):
         self.crit_prob[:]   = progs['crit_probs'][inds] # Probability of developing critical disease
         self.death_prob[:]  = progs['death_probs'][inds] # Probability of death
         self.rel_sus[:]     = progs['sus_ORs'][inds]  # Default susceptibilities
-        self.rel_trans[:]   = progs['trans_ORs'][inds] * cvu.sample(**self.pars['beta_dist'], size=len(inds))  # Default transmissibilities, with viral load drawn from a distribution
+        self.rel_trans[:]   = progs['trans_ORs'][inds] * self.get_sampler('beta_dist').draw(len(inds))  # Default transmissibilities, with viral load drawn from a distribution
+
+        return
+
 
+    def init_samplers(self):
+        '''
+        Create a sampler for each of the duration distributions (``pars['dur']``)
+        and for ``pars['beta_dist']``, with their parameters precomputed; see
+        ``cv.make_sampler()``. Called on initialization; if the distributions are
+        changed afterwards, their samplers are recreated when they're next used.
+        '''
+        self._samplers = {key:cvu.make_sampler(**dist) for key,dist in self.pars.get('dur', {}).items()}
+        if 'beta_dist' in self.pars:
+            self._samplers['beta_dist'] = cvu.make_sampler(**self.pars['beta_dist'])
         return
 
 
+    def get_sampler(self, key):
+        '''
+        Get the sampler for a duration (e.g. 'exp2inf') or for 'beta_dist',
+        recreating it if the distribution has changed since it was created.
+        '''
+        dist = self.pars['beta_dist'] if key == 'beta_dist' else self.pars['dur'][key]
+        samplers = self.__dict__.setdefault('_samplers', {}) # For people created before samplers were added
+        sampler = samplers.get(key)
+        if sampler is None or not sampler.matches(dist):
+            sampler = cvu.make_sampler(**dist)
+            samplers[key] = sampler
+        return sampler
+
+
     def update_states_pre(self, t):
         ''' Perform all state updates at the current timestep '''
 
         # Initialize
         self.t = t
-        self.is_exp = self.true('exposed') # For storing the interim values since used in every subsequent calculation
+        self._due = {} # People popped from the event queue on this timestep, if it's in use
+        events = self.get_event_queue()
+        if events is None:
+            self.is_exp = self.true('exposed') # For storing the interim values since used in every subsequent calculation
+        else: # Only check people who are due a transition, and were exposed at the start of the timestep, as above
+            self.is_exp = None
+            for key in exposed_event_keys:
+                due = events.pop(key, t)
+                self._due[key] = due[self.exposed[due]]
 
         # Perform updates
         self.init_flows()
@@ -196,6 +241,85 @@ class People(cvb.BasePeople):
         return
 
 
+    def get_viral_load_buffer(self):
+        '''
+        Return the array used to store viral loads when ``cv.options.sparse_viral_load``
+        is set. Only the entries for people who are currently infectious are
+        updated on each timestep; the other entries are stale, but are never used
+        since those people have zero transmissibility.
+        '''
+        buffer = getattr(self, '_viral_load', None)
+        if buffer is None or len(buffer) != len(self):
+            buffer = np.zeros(len(self), dtype=cvd.default_float)
+            self._viral_load = buffer
+        return buffer
+
+
+    def get_stock_buffer(self, size):
+        '''
+        Return a scratch array with at least the given number of elements, used
+        by sim.calc_stocks() to calculate the population immunity results without
+        allocating new arrays on each timestep.
+        '''
+        buffer = getattr(self, '_stock_buffer', None)
+        if buffer is None or len(buffer) < size:
+            buffer = np.empty(size, dtype=cvd.default_float)
+            self._stock_buffer = buffer
+        return buffer
+
+
+    def get_event_queue(self):
+        '''
+        Return the event queue used to schedule state transitions if ``cv.options.event_queue``
+        is set, creating it from the current dates if needed; otherwise, return None.
+        '''
+        if not cvo.event_queue:
+            self._events = None # Discard the queue, since it won't be kept up to date
+            return None
+        events = getattr(self, '_events', None)
+        if events is None:
+            events = cvb.EventQueue(event_keys)
+            for key in event_keys:
+                inds = cvu.defined(self[key])
+                events.push(key, inds, self[key][inds])
+            self._events = events
+        return events
+
+
+    def schedule_events(self, inds, keys=None):
+        '''
+        Add people to the event queue, if it is in use, based on their current dates.
+        This is done automatically by the People methods that set dates (e.g. infect()
+        and test()), but must be called by custom code that changes the dates in
+        ``event_keys`` directly if ``cv.options.event_queue`` is set.
+
+        Args:
+            inds (array): the indices of the people whose dates have changed
+            keys (list): the dates that have changed (default: all of them)
+        '''
+        events = getattr(self, '_events', None)
+        if events is not None:
+            inds = np.asarray(inds, dtype=np.int64)
+            keys = event_keys if keys is None else sc.tolist(keys)
+            for key in keys:
+                events.push(key, inds, self[key][inds])
+        return
+
+
+    def due_inds(self, key, filter_inds=None):
+        '''
+        Return the indices of the people to check for the transition with the given
+        date key. If the event queue is in use, these are the people who are due,
+        popped from the queue the first time this is called on each timestep; otherwise,
+        filter_inds is returned unchanged (None means check everyone).
+        '''
+        if getattr(self, '_events', None) is None:
+            return filter_inds
+        if key not in self._due:
+            self._due[key] = self._events.pop(key, self.t)
+        return self._due[key]
+
+
     def update_contacts(self):
         ''' Refresh dynamic contacts, e.g. community '''
         # Figure out if anything needs to be done -- e.g. {'h':False, 'c':True}
@@ -208,12 +332,15 @@ class People(cvb.BasePeople):
 
     #%% Methods for updating state
 
-    def check_inds(self, current, date, filter_inds=None):
-        ''' Return indices for which the current state is false and which meet the date criterion '''
+    def check_inds(self, current, date, filter_inds=None, invert=False):
+        '''
+        Return indices for which the current state is false (or true, if invert is
+        True) and which meet the date criterion
+        '''
         if filter_inds is None:
-            not_current = cvu.false(current)
+            not_current = cvu.true(current) if invert else cvu.false(current)
         else:
-            not_current = cvu.ifalsei(current, filter_inds)
+            not_current = cvu.itruei(current, filter_inds) if invert else cvu.ifalsei(current, filter_inds)
         has_date = cvu.idefinedi(date, not_current)
         inds     = cvu.itrue(self.t >= date[has_date], has_date)
         return inds
@@ -221,7 +348,7 @@ class People(cvb.BasePeople):
 
     def check_infectious(self):
         ''' Check if they become infectious '''
-        inds = self.check_inds(self.infectious, self.date_infectious, filter_inds=self.is_exp)
+        inds = self.check_inds(self.infectious, self.date_infectious, filter_inds=self.due_inds('date_infectious', self.is_exp))
         self.infectious[inds] = True
         self.infectious_variant[inds] = self.exposed_variant[inds]
         for variant in range(self.pars['n_variants']):
@@ -234,21 +361,21 @@ class People(cvb.BasePeople):
 
     def check_symptomatic(self):
         ''' Check for new progressions to symptomatic '''
-        inds = self.check_inds(self.symptomatic, self.date_symptomatic, filter_inds=self.is_exp)
+        inds = self.check_inds(self.symptomatic, self.date_symptomatic, filter_inds=self.due_inds('date_symptomatic', self.is_exp))
         self.symptomatic[inds] = True
         return inds
 
 
     def check_severe(self):
         ''' Check for new progressions to severe '''
-        inds = self.check_inds(self.severe, self.date_severe, filter_inds=self.is_exp)
+        inds = self.check_inds(self.severe, self.date_severe, filter_inds=self.due_inds('date_severe', self.is_exp))
         self.severe[inds] = True
         return inds
 
 
     def check_critical(self):
         ''' Check for new progressions to critical '''
-        inds = self.check_inds(self.critical, self.date_critical, filter_inds=self.is_exp)
+        inds = self.check_inds(self.critical, self.date_critical, filter_inds=self.due_inds('date_critical', self.is_exp))
         self.critical[inds] = True
         return inds
 
@@ -263,7 +390,7 @@ class People(cvb.BasePeople):
 
         # Handle more flexible options for setting indices
         if filter_inds == 'is_exp':
-            filter_inds = self.is_exp
+            filter_inds = self.due_inds('date_recovered', self.is_exp)
         if inds is None:
             inds = self.check_inds(self.recovered, self.date_recovered, filter_inds=filter_inds)
 
@@ -285,15 +412,17 @@ class People(cvb.BasePeople):
         if self.pars['use_waning']:
 
             # Reset additional states
+            cvi.mark_nab_changed(self, inds) # Their natural immunity now applies
             self.susceptible[inds] = True
             self.diagnosed[inds]   = False # Reset their diagnosis state because they might be reinfected
+            self.schedule_events(inds, ['date_pos_test', 'date_diagnosed']) # Since they are no longer diagnosed, these dates apply again
 
         return inds
 
 
     def check_death(self):
         ''' Check whether or not this person died on this timestep  '''
-        inds = self.check_inds(self.dead, self.date_dead, filter_inds=self.is_exp)
+        inds = self.check_inds(self.dead, self.date_dead, filter_inds=self.due_inds('date_dead', self.is_exp))
         self.dead[inds]             = True
         diag_inds = inds[self.diagnosed[inds]] # Check whether the person was diagnosed before dying
         self.known_dead[diag_inds]  = True
@@ -322,11 +451,11 @@ class People(cvb.BasePeople):
         '''
 
         # Handle people who tested today who will be diagnosed in future
-        test_pos_inds = self.check_inds(self.diagnosed, self.date_pos_test, filter_inds=None) # Find people who will be diagnosed in future
+        test_pos_inds = self.check_inds(self.diagnosed, self.date_pos_test, filter_inds=self.due_inds('date_pos_test')) # Find people who will be diagnosed in future
         self.date_pos_test[test_pos_inds] = np.nan # Clear date of having will-be-positive test
 
         # Handle people who were actually diagnosed today
-        diag_inds  = self.check_inds(self.diagnosed, self.date_diagnosed, filter_inds=None) # Find who was actually diagnosed on this timestep
+        diag_inds  = self.check_inds(self.diagnosed, self.date_diagnosed, filter_inds=self.due_inds('date_diagnosed')) # Find who was actually diagnosed on this timestep
         self.diagnosed[diag_inds]   = True # Set these people to be diagnosed
 
         return test_pos_inds
@@ -336,23 +465,46 @@ class People(cvb.BasePeople):
         ''' Update quarantine state '''
 
         n_quarantined = 0 # Number of people entering quarantine
-        for ind,end_day in self._pending_quarantine[self.t]:
-            if self.quarantined[ind]:
-                self.date_end_quarantine[ind] = max(self.date_end_quarantine[ind], end_day) # Extend quarantine if required
-            elif not (self.dead[ind] or self.recovered[ind] or self.diagnosed[ind] or self.isolated[ind]): # Unclear whether recovered should be included here # elif not (self.dead[ind] or self.diagnosed[ind]):
-                self.quarantined[ind] = True
-                self.date_quarantined[ind] = self.t
-                self.date_end_quarantine[ind] = end_day
-                n_quarantined += 1
+        pending = self._pending_quarantine.pop(self.t, None)
+        if pending:
+
+            # If someone has been scheduled more than once, use the latest end day, as if each had been applied in turn
+            inds     = np.concatenate([chunk[0] for chunk in pending])
+            end_days = np.concatenate([chunk[1] for chunk in pending])
+            order    = np.lexsort((end_days, inds))
+            inds     = inds[order]
+            end_days = end_days[order]
+            last     = np.append(inds[1:] != inds[:-1], True) # The last entry for each person has the latest end day
+            inds     = inds[last]
+            end_days = end_days[last]
+
+            # Extend quarantine if required
+            is_quar = self.quarantined[inds]
+            quar_inds = inds[is_quar]
+            self.date_end_quarantine[quar_inds] = np.maximum(self.date_end_quarantine[quar_inds], end_days[is_quar])
+
+            # Otherwise, start quarantine if eligible
+            eligible = ~(is_quar | self.dead[inds] | self.recovered[inds] | self.diagnosed[inds] | self.isolated[inds]) # Unclear whether recovered should be included here
+            new_inds = inds[eligible]
+            self.quarantined[new_inds] = True
+            self.date_quarantined[new_inds] = self.t
+            self.date_end_quarantine[new_inds] = end_days[eligible]
+            n_quarantined = len(new_inds)
+            self.schedule_events(inds, 'date_end_quarantine')
 
         # If someone has been diagnosed today, end their quarantine
         # By definition, 'quarantine' only applies to people that are not yet diagnosed
         # After diagnosis, they are 'isolating'
-        diag_inds  = cvu.true(self.quarantined & (self.date_diagnosed == self.t))
+        due_diag = self.due_inds('date_diagnosed')
+        if due_diag is None:
+            diag_inds = cvu.true(self.quarantined & (self.date_diagnosed == self.t))
+        else: # Anyone diagnosed today is in the event queue bucket for today
+            diag_inds = due_diag[self.quarantined[due_diag] & (self.date_diagnosed[due_diag] == self.t)]
         self.date_end_quarantine[diag_inds] = self.t
+        self.schedule_events(diag_inds, 'date_end_quarantine')
 
         # If someone on quarantine has reached the end of their quarantine, release them
-        end_inds = self.check_inds(~self.quarantined, self.date_end_quarantine, filter_inds=None) # Note the double-negative here (~)
+        end_inds = self.check_inds(self.quarantined, self.date_end_quarantine, filter_inds=self.due_inds('date_end_quarantine'), invert=True)
         self.quarantined[end_inds] = False # Release from quarantine
 
         return n_quarantined
@@ -360,16 +512,21 @@ class People(cvb.BasePeople):
 
     def check_enter_iso(self):
         # Anyone diagnosed today enters isolation for the duration of their infection
-        iso_inds  = cvu.true(self.date_diagnosed == self.t)
+        due_diag = self.due_inds('date_diagnosed')
+        if due_diag is None:
+            iso_inds = cvu.true(self.date_diagnosed == self.t)
+        else:
+            iso_inds = due_diag[self.date_diagnosed[due_diag] == self.t]
         self.isolated[iso_inds] = True
         self.date_end_isolation[iso_inds] = self.date_recovered[iso_inds]
+        self.schedule_events(iso_inds, 'date_end_isolation')
         return iso_inds
 
     def check_exit_iso(self):
         '''
         End isolation for anyone due to exit isolation
         '''
-        end_inds = self.check_inds(~self.isolated, self.date_end_isolation, filter_inds=None) # Note the double-negative here (~)
+        end_inds = self.check_inds(self.isolated, self.date_end_isolation, filter_inds=self.due_inds('date_end_isolation'), invert=True)
         self.isolated[end_inds] = False # Release from isolation
         return end_inds
 
@@ -402,6 +559,7 @@ class People(cvb.BasePeople):
             self[key][:, non_vx_inds] = 0
         for key in self.meta.nab_states + self.meta.vacc_states:
             self[key][non_vx_inds] = 0
+        cvi.mark_nab_changed(self, inds)
 
         # Reset dates
         for key in self.meta.dates + self.meta.durs:
@@ -426,6 +584,7 @@ class People(cvb.BasePeople):
 
         if set_recovered:
             self.date_recovered[inds] = date_recovered # Reset date recovered
+            self.schedule_events(inds, 'date_recovered')
             self.check_recovery(inds=inds, filter_inds=None) # Set recovered
 
         return
@@ -443,7 +602,7 @@ class People(cvb.BasePeople):
             * If the simulation is being run with waning, this method also sets/updates agents' neutralizing antibody levels
 
         Method also deduplicates input arrays in case one agent is infected many times
-        and stores who infected whom in infection_log list.
+        and stores who infected whom in the infection log.
 
         Args:
             inds     (array): array of people to infect
@@ -480,9 +639,6 @@ class People(cvb.BasePeople):
             for k in variant_keys:
                 infect_pars[k] *= self.pars['variant_pars'][variant_label][k]
 
-
-        durpars      = self.pars['dur']
-
         # Retrieve those with a breakthrough infection (defined nabs)
         breakthrough_inds = inds[cvu.true(self.peak_nab[inds])]
         if len(breakthrough_inds):
@@ -506,13 +662,65 @@ class People(cvb.BasePeople):
         self.flows_variant['new_infections_by_variant'][variant] += n_infections
 
         # Record transmissions
-        for i, target in enumerate(inds):
-            entry = dict(source=source[i] if source is not None else None, target=target, date=self.t, layer=layer, variant=variant_label)
-            self.infection_log.append(entry)
+        self.infection_log.append(inds, source=source, date=self.t, layer=layer, variant=variant_label)
+
+        # Determine what happens to them, and when
+        self.date_exposed[inds] = self.t
+        asymp_inds, mild_inds, sev_inds = self.compute_outcomes(inds, variant=variant, infect_pars=infect_pars, hosp_max=hosp_max, icu_max=icu_max)
+        self.flows_variant['new_symptomatic_by_variant'][variant] += len(mild_inds) + len(sev_inds)
+        self.flows_variant['new_severe_by_variant'][variant] += len(sev_inds)
+
+        # Handle immunity aspects
+        if self.pars['use_waning']:
+            symp = dict(asymp=asymp_inds, mild=mild_inds, sev=sev_inds)
+            cvi.update_peak_nab(self, inds, nab_pars=self.pars, symp=symp)
+
+        # Schedule the transitions, including diagnosis, since diagnosed has been reset
+        self.schedule_events(inds, exposed_event_keys + ['date_pos_test', 'date_diagnosed'])
+
+        return inds # For incrementing counters
+
+
+    def compute_outcomes(self, inds, variant, infect_pars, hosp_max=None, icu_max=None):
+        '''
+        Determine the outcomes of newly infected people -- whether they develop
+        symptoms, become severe or critical, and die -- and when each of these
+        happens. Used by infect().
+
+        If ``cv.options.compiled_prognoses`` is set, this is done for each person
+        in a single Numba pass (see ``cvu.compute_prognoses()``), with the same
+        distributions but a different random number stream, unless any of the
+        duration distributions can't be sampled by Numba (e.g. negative binomial).
+
+        Args:
+            inds        (array): the people infected
+            variant     (int):   the variant they are infected by
+            infect_pars (dict):  the relative probabilities of symptoms, severe disease, critical disease, and death for the variant
+            hosp_max    (bool):  whether or not there is an acute bed available for this person
+            icu_max     (bool):  whether or not there is an ICU bed available for this person
+
+        Returns:
+            asymp_inds, mild_inds, sev_inds (arrays): the people who are asymptomatic, who have mild symptoms, and who have severe symptoms (including critical)
+        '''
+        crit_factor  = self.pars['no_hosp_factor'] if hosp_max else 1.
+        death_factor = self.pars['no_icu_factor']  if icu_max  else 1.
+
+        # Calculate the outcomes in a single pass, if the durations can all be sampled by Numba
+        if cvo.compiled_prognoses:
+            dists = [self.get_sampler(key).compiled for key in dur_keys]
+            if None not in dists:
+                dist_codes = np.array([dist[0] for dist in dists], dtype=np.int64)
+                dist_pars  = np.array([dist[1:] for dist in dists], dtype=np.float64)
+                rel_probs  = np.array([infect_pars[k] for k in ['rel_symp_prob', 'rel_severe_prob', 'rel_crit_prob', 'rel_death_prob']], dtype=np.float64)
+                durs  = tuple(self[key] for key in ['dur_exp2inf', 'dur_inf2sym', 'dur_sym2sev', 'dur_sev2crit', 'dur_disease'])
+                dates = tuple(self[key] for key in ['date_infectious', 'date_symptomatic', 'date_severe', 'date_critical', 'date_diagnosed', 'date_recovered', 'date_dead'])
+                inds = np.asarray(inds, dtype=np.int64)
+                outcomes = cvu.compute_prognoses(self.t, inds, rel_probs, self.symp_prob, self.severe_prob, self.crit_prob, self.death_prob,
+                                                 self.symp_imm[variant], self.sev_imm[variant], float(crit_factor), float(death_factor), dist_codes, dist_pars, durs, dates)
+                return inds[outcomes == 0], inds[outcomes == 1], inds[outcomes >= 2]
 
         # Calculate how long before this person can infect other people
-        self.dur_exp2inf[inds] = cvu.sample(**durpars['exp2inf'], size=n_infections)
-        self.date_exposed[inds]   = self.t
+        self.dur_exp2inf[inds] = self.get_sampler('exp2inf').draw(len(inds))
         self.date_infectious[inds] = self.dur_exp2inf[inds] + self.t
 
         # Reset all other dates
@@ -524,66 +732,59 @@ class People(cvb.BasePeople):
         is_symp = cvu.binomial_arr(symp_probs) # Determine if they develop symptoms
         symp_inds = inds[is_symp]
         asymp_inds = inds[~is_symp] # Asymptomatic
-        self.flows_variant['new_symptomatic_by_variant'][variant] += len(symp_inds)
 
         # CASE 1: Asymptomatic: may infect others, but have no symptoms and do not die
-        dur_asym2rec = cvu.sample(**durpars['asym2rec'], size=len(asymp_inds))
+        dur_asym2rec = self.get_sampler('asym2rec').draw(len(asymp_inds))
         self.date_recovered[asymp_inds] = self.date_infectious[asymp_inds] + dur_asym2rec  # Date they recover
         self.dur_disease[asymp_inds] = self.dur_exp2inf[asymp_inds] + dur_asym2rec  # Store how long this person had COVID-19
 
         # CASE 2: Symptomatic: can either be mild, severe, or critical
         n_symp_inds = len(symp_inds)
-        self.dur_inf2sym[symp_inds] = cvu.sample(**durpars['inf2sym'], size=n_symp_inds) # Store how long this person took to develop symptoms
+        self.dur_inf2sym[symp_inds] = self.get_sampler('inf2sym').draw(n_symp_inds) # Store how long this person took to develop symptoms
         self.date_symptomatic[symp_inds] = self.date_infectious[symp_inds] + self.dur_inf2sym[symp_inds] # Date they become symptomatic
         sev_probs = infect_pars['rel_severe_prob'] * self.severe_prob[symp_inds]*(1-self.sev_imm[variant, symp_inds]) # Probability of these people being severe
         is_sev = cvu.binomial_arr(sev_probs) # See if they're a severe or mild case
         sev_inds = symp_inds[is_sev]
         mild_inds = symp_inds[~is_sev] # Not severe
-        self.flows_variant['new_severe_by_variant'][variant] += len(sev_inds)
 
         # CASE 2.1: Mild symptoms, no hospitalization required and no probability of death
-        dur_mild2rec = cvu.sample(**durpars['mild2rec'], size=len(mild_inds))
+        dur_mild2rec = self.get_sampler('mild2rec').draw(len(mild_inds))
         self.date_recovered[mild_inds] = self.date_symptomatic[mild_inds] + dur_mild2rec  # Date they recover
         self.dur_disease[mild_inds] = self.dur_exp2inf[mild_inds] + self.dur_inf2sym[mild_inds] + dur_mild2rec  # Store how long this person had COVID-19
 
         # CASE 2.2: Severe cases: hospitalization required, may become critical
-        self.dur_sym2sev[sev_inds] = cvu.sample(**durpars['sym2sev'], size=len(sev_inds)) # Store how long this person took to develop severe symptoms
+        self.dur_sym2sev[sev_inds] = self.get_sampler('sym2sev').draw(len(sev_inds)) # Store how long this person took to develop severe symptoms
         self.date_severe[sev_inds] = self.date_symptomatic[sev_inds] + self.dur_sym2sev[sev_inds]  # Date symptoms become severe
-        crit_probs = infect_pars['rel_crit_prob'] * self.crit_prob[sev_inds] * (self.pars['no_hosp_factor'] if hosp_max else 1.) # Probability of these people becoming critical - higher if no beds available
+        crit_probs = infect_pars['rel_crit_prob'] * self.crit_prob[sev_inds] * crit_factor # Probability of these people becoming critical - higher if no beds available
         is_crit = cvu.binomial_arr(crit_probs)  # See if they're a critical case
         crit_inds = sev_inds[is_crit]
         non_crit_inds = sev_inds[~is_crit]
 
         # CASE 2.2.1 Not critical - they will recover
-        dur_sev2rec = cvu.sample(**durpars['sev2rec'], size=len(non_crit_inds))
+        dur_sev2rec = self.get_sampler('sev2rec').draw(len(non_crit_inds))
         self.date_recovered[non_crit_inds] = self.date_severe[non_crit_inds] + dur_sev2rec  # Date they recover
         self.dur_disease[non_crit_inds] = self.dur_exp2inf[non_crit_inds] + self.dur_inf2sym[non_crit_inds] + self.dur_sym2sev[non_crit_inds] + dur_sev2rec  # Store how long this person had COVID-19
 
         # CASE 2.2.2: Critical cases: ICU required, may die
-        self.dur_sev2crit[crit_inds] = cvu.sample(**durpars['sev2crit'], size=len(crit_inds))
+        self.dur_sev2crit[crit_inds] = self.get_sampler('sev2crit').draw(len(crit_inds))
         self.date_critical[crit_inds] = self.date_severe[crit_inds] + self.dur_sev2crit[crit_inds]  # Date they become critical
-        death_probs = infect_pars['rel_death_prob'] * self.death_prob[crit_inds] * (self.pars['no_icu_factor'] if icu_max else 1.)# Probability they'll die
+        death_probs = infect_pars['rel_death_prob'] * self.death_prob[crit_inds] * death_factor # Probability they'll die
         is_dead = cvu.binomial_arr(death_probs)  # Death outcome
         dead_inds = crit_inds[is_dead]
         alive_inds = crit_inds[~is_dead]
 
         # CASE 2.2.2.1: Did not die
-        dur_crit2rec = cvu.sample(**durpars['crit2rec'], size=len(alive_inds))
+        dur_crit2rec = self.get_sampler('crit2rec').draw(len(alive_inds))
         self.date_recovered[alive_inds] = self.date_critical[alive_inds] + dur_crit2rec # Date they recover
         self.dur_disease[alive_inds] = self.dur_exp2inf[alive_inds] + self.dur_inf2sym[alive_inds] + self.dur_sym2sev[alive_inds] + self.dur_sev2crit[alive_inds] + dur_crit2rec  # Store how long this person had COVID-19
 
         # CASE 2.2.2.2: Did die
-        dur_crit2die = cvu.sample(**durpars['crit2die'], size=len(dead_inds))
+        dur_crit2die = self.get_sampler('crit2die').draw(len(dead_inds))
         self.date_dead[dead_inds] = self.date_critical[dead_inds] + dur_crit2die # Date of death
         self.dur_disease[dead_inds] = self.dur_exp2inf[dead_inds] + self.dur_inf2sym[dead_inds] + self.dur_sym2sev[dead_inds] + self.dur_sev2crit[dead_inds] + dur_crit2die   # Store how long this person had COVID-19
         self.date_recovered[dead_inds] = np.nan # If they did die, remove them from recovered
 
-        # Handle immunity aspects
-        if self.pars['use_waning']:
-            symp = dict(asymp=asymp_inds, mild=mild_inds, sev=sev_inds)
-            cvi.update_peak_nab(self, inds, nab_pars=self.pars, symp=symp)
-
-        return inds # For incrementing counters
+        return asymp_inds, mild_inds, sev_inds
 
 
     def test(self, inds, test_sensitivity=1.0, loss_prob=0.0, test_delay=0):
@@ -613,6 +814,7 @@ class People(cvb.BasePeople):
         # Store the date the person will be diagnosed, as well as the date they took the test which will come back positive
         self.date_diagnosed[final_inds] = self.t + test_delay
         self.date_pos_test[final_inds] = self.t
+        self.schedule_events(final_inds, ['date_diagnosed', 'date_pos_test'])
 
         return final_inds
 
@@ -635,8 +837,10 @@ class People(cvb.BasePeople):
 
         start_date = self.t if start_date is None else int(start_date)
         period = self.pars['quar_period'] if period is None else int(period)
-        for ind in inds:
-            self._pending_quarantine[start_date].append((ind, start_date + period))
+        inds = np.asarray(inds, dtype=np.int64) if isinstance(inds, np.ndarray) else np.fromiter(inds, dtype=np.int64)
+        if len(inds):
+            end_days = np.full(len(inds), start_date + period, dtype=np.int64)
+            self._pending_quarantine[start_date].append((inds, end_days))
         return
 
 
@@ -751,7 +955,9 @@ class People(cvb.BasePeople):
                 if not np.isnan(date):
                     events.append((date, message))
 
-            for infection in self.infection_log:
+            log = self.infection_log
+            rows = sc.findinds((log.target == uid) | (log.source == uid)) # Only look at infections this person was involved in
+            for infection in log[rows]:
                 lkey = infection['layer']
                 llabel = label_lkey(lkey)
                 if infection['target'] == uid:
@@ -761,7 +967,7 @@ class People(cvb.BasePeople):
                         events.append((infection['date'], 'was infected with COVID as a seed infection'))
 
                 if infection['source'] == uid:
-                    x = len([a for a in self.infection_log if a['source'] == infection['target']])
+                    x = np.count_nonzero(log.source == infection['target'])
                     events.append((infection['date'],f'gave COVID to {infection["target"]} via the {llabel} layer ({x} secondary infections)'))
 
             if len(events):
@@ -594,7 +594,9 @@ def plot_people(people, bins=None, width=1.0, alpha=0.6, fig_args=None, axis_arg
     min_age = min(bins)
     max_age = max(bins)
     edges = np.append(bins, np.inf) # Add an extra bin to end to turn them into edges
-    age_counts = np.histogram(people.age, edges)[0]
+    codes = people.age_bins(edges) # The age bin of each person, which is cached, so can be reused
+    n_codes = len(edges) # Including people outside the bins, which are discarded
+    age_counts = np.bincount(codes, minlength=n_codes)[:-1]
 
     with cvo.with_style(style_args):
 
@@ -614,7 +616,7 @@ def plot_people(people, bins=None, width=1.0, alpha=0.6, fig_args=None, axis_arg
 
         # Plot cumulative distribution
         pl.subplot(n_rows,2,2)
-        age_sorted = sorted(people.age)
+        age_sorted = np.sort(people.age)
         y = np.linspace(0, 100, len(age_sorted)) # Percentage, not hard-coded!
         pl.plot(age_sorted, y, '-', **plot_args)
         pl.xlim([0,max_age])
@@ -631,9 +633,9 @@ def plot_people(people, bins=None, width=1.0, alpha=0.6, fig_args=None, axis_arg
         contact_counts = sc.objdict()
         for lk in lkeys:
             layer = people.contacts[lk]
-            p1ages = people.age[layer['p1']]
-            p2ages = people.age[layer['p2']]
-            contact_counts[lk] = np.histogram(p1ages, edges)[0] + np.histogram(p2ages, edges)[0]
+            p1codes = codes[layer['p1']]
+            p2codes = codes[layer['p2']]
+            contact_counts[lk] = np.bincount(p1codes, minlength=n_codes)[:-1] + np.bincount(p2codes, minlength=n_codes)[:-1]
 
         # Plot contacts
         layer_colors = sc.gridcolors(n_layers)
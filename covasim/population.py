@@ -228,10 +228,10 @@ def make_randpop(pars, use_age_data=True, use_household_data=True, sex_ratio=0.5
 
 def _tidy_edgelist(p1, p2, mapping):
     ''' Helper function to convert lists to arrays and optionally map arrays '''
-    p1 = np.array(p1, dtype=cvd.default_int)
-    p2 = np.array(p2, dtype=cvd.default_int)
+    p1 = np.asarray(p1, dtype=cvd.default_int)
+    p2 = np.asarray(p2, dtype=cvd.default_int)
     if mapping is not None:
-        mapping = np.array(mapping, dtype=cvd.default_int)
+        mapping = np.asarray(mapping, dtype=cvd.default_int)
         p1 = mapping[p1]
         p2 = mapping[p2]
     output = dict(p1=p1, p2=p2)
@@ -257,8 +257,6 @@ def make_random_contacts(pop_size, n, overshoot=1.2, dispersion=None, mapping=No
 
     # Preprocessing
     pop_size = int(pop_size) # Number of people
-    p1 = [] # Initialize the "sources"
-    p2 = [] # Initialize the "targets"
 
     # Precalculate contacts
     n_all_contacts  = int(pop_size*n*overshoot) # The overshoot is used so we won't run out of contacts if the Poisson draws happen to be higher than the expected value
@@ -269,14 +267,13 @@ def make_random_contacts(pop_size, n, overshoot=1.2, dispersion=None, mapping=No
         p_count = cvu.n_neg_binomial(rate=n, dispersion=dispersion, n=pop_size) # Or, from a negative binomial
     p_count = np.array((p_count/2.0).round(), dtype=cvd.default_int)
 
-    # Make contacts
-    count = 0
-    for p in range(pop_size):
-        n_contacts = p_count[p]
-        these_contacts = all_contacts[count:count+n_contacts] # Assign people
-        count += n_contacts
-        p1.extend([p]*n_contacts)
-        p2.extend(these_contacts)
+    # Make contacts -- each person is the source of p_count contacts, assigned in order
+    n_contacts = p_count.sum()
+    if n_contacts > n_all_contacts: # In the unlikely event that the overshoot wasn't enough, choose more people
+        extra_contacts = cvu.choose_r(max_n=pop_size, n=n_contacts-n_all_contacts)
+        all_contacts = np.concatenate([all_contacts, extra_contacts])
+    p1 = np.repeat(np.arange(pop_size, dtype=cvd.default_int), p_count)
+    p2 = all_contacts[:n_contacts]
 
     # Tidy up
     output = _tidy_edgelist(p1, p2, mapping)
@@ -297,31 +294,9 @@ def make_microstructured_contacts(pop_size, cluster_size, mapping=None):
 
     # Preprocessing -- same as above
     pop_size = int(pop_size) # Number of people
-    p1 = [] # Initialize the "sources"
-    p2 = [] # Initialize the "targets"
-
-    # Initialize
-    n_remaining = pop_size # Make clusters - each person belongs to one cluster
-
-    # Loop over the clusters
-    cluster_id = -1
-    while n_remaining > 0:
-        cluster_id += 1 # Assign cluster id
-        this_cluster =  cvu.poisson(cluster_size)  # Sample the cluster size
-        if this_cluster > n_remaining:
-            this_cluster = n_remaining
-
-        # Indices of people in this cluster
-        cluster_indices = (pop_size-n_remaining) + np.arange(this_cluster)
-        for source in cluster_indices: # Add symmetric pairwise contacts in each cluster
-            targets = set()
-            for target in cluster_indices:
-                if target > source:
-                    targets.add(target)
-            p1.extend([source]*len(targets))
-            p2.extend(list(targets))
-
-        n_remaining -= this_cluster
+
+    # Make clusters -- each person belongs to one cluster
+    p1, p2 = cvu.make_clusters(pop_size, cluster_size)
 
     # Tidy up
     output = _tidy_edgelist(p1, p2, mapping)
@@ -3,20 +3,30 @@ Functions and classes for running multiple Covasim runs.
 '''
 
 #%% Imports
+import os
+import shutil
+import tempfile
 import numpy as np
 import pandas as pd
 import sciris as sc
 import pickle as pkl
+import inspect
+import collections as co
+import concurrent.futures as cf
+from . import utils as cvu
 from . import defaults as cvd
 from . import misc as cvm
 from . import base as cvb
 from . import sim as cvs
+from . import people as cvppl
+from . import immunity as cvimm
+from . import interventions as cvi
 from . import plotting as cvpl
 from .settings import options as cvo
 
 
 # Specify all externally visible functions this file defines
-__all__ = ['make_metapars', 'MultiSim', 'Scenarios', 'single_run', 'multi_run', 'parallel']
+__all__ = ['make_metapars', 'MultiSim', 'StreamingReducer', 'Scenarios', 'EnsembleSim', 'single_run', 'multi_run', 'parallel']
 
 
 
@@ -89,6 +99,7 @@ class MultiSim(cvb.FlexPretty):
         self.label     = base_sim.label if (label is None and base_sim is not None) else label
         self.run_args  = sc.mergedicts(kwargs)
         self.results   = None
+        self.reducer   = None # Used if the sims are reduced as they run
         self.which     = None # Whether the multisim is to be reduced, combined, etc.
         cvb.set_metadata(self) # Set version, date, and git info
 
@@ -139,14 +150,15 @@ class MultiSim(cvb.FlexPretty):
         return
 
 
-    def run(self, reduce=False, combine=False, **kwargs):
+    def run(self, reduce=False, combine=False, keep_sims=True, **kwargs):
         '''
         Run the actual sims
 
         Args:
-            reduce  (bool): whether or not to reduce after running (see reduce())
-            combine (bool): whether or not to combine after running (see combine(), not compatible with reduce)
-            kwargs  (dict): passed to multi_run(); use run_args to pass arguments to sim.run()
+            reduce    (bool): whether or not to reduce after running (see reduce())
+            combine   (bool): whether or not to combine after running (see combine(), not compatible with reduce)
+            keep_sims (bool): if False, reduce the sims as they finish rather than keeping them (see StreamingReducer)
+            kwargs    (dict): passed to multi_run(); use run_args to pass arguments to sim.run()
 
         Returns:
             None (modifies MultiSim object in place)
@@ -155,6 +167,7 @@ class MultiSim(cvb.FlexPretty):
 
             msim.run()
             msim.run(run_args=dict(until='2020-0601', restore_pars=False))
+            msim.run(n_runs=1000, keep_sims=False, reduce=True) # Large ensemble
         '''
         # Handle which sims to use -- same as init_sims()
         if self.sims is None:
@@ -169,6 +182,9 @@ class MultiSim(cvb.FlexPretty):
 
         # Run
         kwargs = sc.mergedicts(self.run_args, kwargs)
+        if not keep_sims and kwargs.get('reducer') is None:
+            kwargs['reducer'] = StreamingReducer()
+        self.reducer = kwargs.get('reducer')
         self.sims = multi_run(sims, **kwargs)
 
         # Reduce or combine
@@ -222,7 +238,9 @@ class MultiSim(cvb.FlexPretty):
         Combine multiple sims into a single sim statistically: by default, use
         the median value and the 10th and 90th percentiles for the lower and upper
         bounds. If use_mean=True, then use the mean and ±2 standard deviations
-        for lower and upper bounds.
+        for lower and upper bounds. If the sims were not kept (i.e., the multisim
+        was run with ``keep_sims=False``), use the statistics from the reducer;
+        in this case, the quantiles cannot be changed.
 
         Args:
             quantiles (dict): the quantiles to use, e.g. [0.1, 0.9] or {'low : '0.1, 'high' : 0.9}
@@ -238,6 +256,12 @@ class MultiSim(cvb.FlexPretty):
             msim.summarize()
         '''
 
+        # Use the streaming quantiles by default if the sims were not kept
+        reducer = getattr(self, 'reducer', None)
+        streamed = reducer is not None and not len(self)
+        if streamed and quantiles is None:
+            quantiles = reducer.quantiles
+
         if use_mean:
             if bounds is None:
                 bounds = 2
@@ -251,6 +275,32 @@ class MultiSim(cvb.FlexPretty):
                     errormsg = f'Could not figure out how to convert {quantiles} into a quantiles object: must be a dict with keys low, high or a 2-element array ({str(E)})'
                     raise ValueError(errormsg)
 
+        # Use the streaming statistics if the sims were not kept
+        if streamed:
+            if not use_mean and quantiles != reducer.quantiles:
+                errormsg = f'The sims were reduced as they ran using quantiles {reducer.quantiles}, so cannot be reduced using {quantiles}'
+                raise ValueError(errormsg)
+            reduced_sim = reducer.to_sim(use_mean=use_mean, bounds=bounds)
+        else:
+            reduced_sim = self._reduce_sims(quantiles=quantiles, use_mean=use_mean, bounds=bounds)
+
+        # Compute and store final results
+        reduced_sim.compute_summary()
+        self.orig_base_sim = self.base_sim
+        self.base_sim = reduced_sim
+        self.results = reduced_sim.results
+        self.summary = reduced_sim.summary
+        self.which = 'reduced'
+
+        if output:
+            return self.base_sim
+        else:
+            return
+
+
+    def _reduce_sims(self, quantiles, use_mean, bounds):
+        ''' Perform the statistics for reduce() using the stored sims '''
+
         # Store information on the sims
         n_runs = len(self)
         reduced_sim = sc.dcp(self.sims[0])
@@ -289,18 +339,7 @@ class MultiSim(cvb.FlexPretty):
                 results[reskey].low = np.quantile(raw[reskey], q=quantiles['low'], axis=axis)
                 results[reskey].high = np.quantile(raw[reskey], q=quantiles['high'], axis=axis)
 
-        # Compute and store final results
-        reduced_sim.compute_summary()
-        self.orig_base_sim = self.base_sim
-        self.base_sim = reduced_sim
-        self.results = reduced_sim.results
-        self.summary = reduced_sim.summary
-        self.which = 'reduced'
-
-        if output:
-            return self.base_sim
-        else:
-            return
+        return reduced_sim
 
 
     def mean(self, bounds=None, **kwargs):
@@ -858,6 +897,230 @@ class MultiSim(cvb.FlexPretty):
         return self.base_sim.to_excel(*args, **kwargs)
 
 
+class StreamingReducer(sc.prettyobj):
+    '''
+    Reduce the results of multiple sims one at a time, as they finish, so the sims
+    themselves do not need to be kept. Computes the same statistics as
+    MultiSim.reduce(): the running mean and standard deviation of each result
+    (using Welford's algorithm), and the median and lower and upper quantiles.
+
+    The results of the first ``n_exact`` sims are stored, so for ensembles up to
+    this size, the statistics are identical to MultiSim.reduce(). Beyond this,
+    the quantiles are estimated using the P² algorithm (Jain and Chlamtac, 1985),
+    which tracks five markers for each quantile instead of storing the values.
+    For most results, its estimates are within a few percent of the range between
+    the lower and upper quantiles; for results that take only a few distinct
+    values (e.g. daily deaths in a small population), the estimates may fall
+    between them. The mean and standard deviation are exact to within
+    floating-point rounding.
+
+    Args:
+        quantiles (dict) : the lower and upper quantiles to track, e.g. [0.1, 0.9] or {'low':0.1, 'high':0.9}
+        n_exact   (int)  : the number of sims for which to store the results exactly
+
+    **Example**::
+
+        reducer = cv.StreamingReducer()
+        cv.multi_run(cv.Sim(), n_runs=1000, reducer=reducer)
+        sim = reducer.to_sim() # Equivalent to msim.reduce(output=True)
+    '''
+
+    def __init__(self, quantiles=None, n_exact=100):
+        if quantiles is None:
+            quantiles = make_metapars()['quantiles']
+        if not isinstance(quantiles, dict):
+            try:
+                quantiles = {'low':float(quantiles[0]), 'high':float(quantiles[1])}
+            except Exception as E:
+                errormsg = f'Could not figure out how to convert {quantiles} into a quantiles object: must be a dict with keys low, high or a 2-element array ({str(E)})'
+                raise ValueError(errormsg)
+        self.quantiles = quantiles
+        self.n_exact   = max(int(n_exact), 5) # The P² algorithm needs at least 5 values to start
+        self.n_runs    = 0    # Number of sims added so far
+        self.base_sim  = None # A copy of the first sim, used as the template for the reduced sim
+        self.keys      = None # The main and variant result keys
+        self.n_values  = None # The total number of result values per sim
+        self.buffer    = None # The flattened results of the first n_exact sims
+        self.mean      = None # The running mean...
+        self.m2        = None # ...and sum of squared deviations, for Welford's algorithm
+        self.has_nan   = None # Whether any sim had a NaN value at each point
+        self.markers   = None # The heights of the P² markers for each quantile
+        self.positions = None # The positions of the P² markers for each quantile
+        return
+
+
+    @property
+    def probs(self):
+        ''' The probabilities of the quantiles being tracked: the lower quantile, the median, and the upper quantile '''
+        return np.array([self.quantiles['low'], 0.5, self.quantiles['high']])
+
+
+    def _flatten(self, sim):
+        ''' Flatten all results of a sim into a single array '''
+        main = [sim.results[key].values for key in self.keys['main']]
+        variant = [sim.results['variant'][key].values.ravel() for key in self.keys['variant']]
+        return np.concatenate(main + variant).astype(np.float64)
+
+
+    def add(self, sim):
+        ''' Add the results of a sim to the statistics '''
+
+        # Use the first sim as a template
+        if self.base_sim is None:
+            self.base_sim = sc.dcp(sim)
+            self.keys = dict(main=sim.result_keys('main'), variant=sim.result_keys('variant'))
+            self.n_values = len(self._flatten(sim))
+            self.buffer = np.zeros((self.n_exact, self.n_values))
+            self.has_nan = np.zeros(self.n_values, dtype=bool)
+
+        x = self._flatten(sim)
+        if len(x) != self.n_values:
+            errormsg = f'Sim "{sim.label}" has {len(x)} result values, but the first sim had {self.n_values}; all sims must have the same results'
+            raise ValueError(errormsg)
+        self.has_nan |= np.isnan(x)
+        x = np.nan_to_num(x) # NaNs are handled via has_nan, so replace them to keep the arithmetic well behaved
+        self.n_runs += 1
+
+        # Store the values exactly until the buffer is full, then start streaming
+        if self.n_runs <= self.n_exact:
+            self.buffer[self.n_runs-1,:] = x
+        else:
+            if self.markers is None:
+                self._init_stream()
+            self._update_stream(x)
+
+        return
+
+
+    def _init_stream(self):
+        ''' Initialize the running statistics from the buffered values '''
+        n = self.n_exact
+        self.mean = self.buffer.mean(axis=0)
+        self.m2 = ((self.buffer - self.mean)**2).sum(axis=0)
+
+        # Place the markers at the order statistics closest to their desired positions
+        ordered = np.sort(self.buffer, axis=0)
+        self.markers = np.zeros((3, self.buffer.shape[1], 5))
+        self.positions = np.zeros((3, self.buffer.shape[1], 5))
+        for p,prob in enumerate(self.probs):
+            pos = np.round(1 + (n-1)*np.array([0, prob/2, prob, (1+prob)/2, 1])).astype(int)
+            for i in range(1, 4): # Ensure the positions are strictly increasing
+                pos[i] = max(pos[i], pos[i-1]+1)
+            for i in range(3, 0, -1):
+                pos[i] = min(pos[i], pos[i+1]-1)
+            self.markers[p] = ordered[pos-1,:].T
+            self.positions[p] = pos
+        self.buffer = None # No longer needed
+        return
+
+
+    def _update_stream(self, x):
+        ''' Update the running statistics with a new set of values '''
+
+        # Update the mean and variance
+        delta = x - self.mean
+        self.mean += delta/self.n_runs
+        self.m2 += delta*(x - self.mean)
+
+        # Update the P² markers for each quantile
+        for p,prob in enumerate(self.probs):
+            q = self.markers[p]
+            n = self.positions[p]
+            below = x < q[:,0]
+            above = x > q[:,4]
+            q[below,0] = x[below]
+            q[above,4] = x[above]
+            k = (x[:,None] >= q[:,1:4]).sum(axis=1) # The cell that the value falls into
+            n += np.arange(5)[None,:] > k[:,None] # Increment the positions of the markers above it
+            desired = 1 + (self.n_runs-1)*np.array([0, prob/2, prob, (1+prob)/2, 1])
+
+            # Adjust the heights of the middle markers if they're too far from their desired positions
+            for i in [1, 2, 3]:
+                d = desired[i] - n[:,i]
+                move = ((d >= 1) & (n[:,i+1] - n[:,i] > 1)) | ((d <= -1) & (n[:,i-1] - n[:,i] < -1))
+                if move.any():
+                    sign = np.sign(d[move])
+                    qm, qi, qp = q[move,i-1], q[move,i], q[move,i+1]
+                    nm, ni, np_ = n[move,i-1], n[move,i], n[move,i+1]
+                    parabolic = qi + sign/(np_-nm)*((ni-nm+sign)*(qp-qi)/(np_-ni) + (np_-ni-sign)*(qi-qm)/(ni-nm))
+                    j = i + sign.astype(int)
+                    qj = q[move,:][np.arange(len(j)), j]
+                    nj = n[move,:][np.arange(len(j)), j]
+                    linear = qi + sign*(qj-qi)/(nj-ni)
+                    q[move,i] = np.where((qm < parabolic) & (parabolic < qp), parabolic, linear)
+                    n[move,i] += sign
+
+        return
+
+
+    def stats(self):
+        '''
+        Return the flattened statistics: the mean, standard deviation, median, and
+        lower and upper quantiles.
+        '''
+        if self.n_runs == 0:
+            errormsg = 'No sims have been added to the reducer'
+            raise ValueError(errormsg)
+        if self.n_runs <= self.n_exact: # Not streaming yet, so calculate the statistics exactly
+            raw = self.buffer[:self.n_runs]
+            raw = np.where(self.has_nan, np.nan, raw)
+            stats = sc.objdict(
+                mean   = np.mean(raw, axis=0),
+                std    = np.std(raw, axis=0),
+                median = np.quantile(raw, q=0.5, axis=0),
+                low    = np.quantile(raw, q=self.quantiles['low'], axis=0),
+                high   = np.quantile(raw, q=self.quantiles['high'], axis=0),
+            )
+        else:
+            stats = sc.objdict(
+                mean   = self.mean.copy(),
+                std    = np.sqrt(self.m2/self.n_runs),
+                median = self.markers[1,:,2].copy(),
+                low    = self.markers[0,:,2].copy(),
+                high   = self.markers[2,:,2].copy(),
+            )
+        for v in stats.values():
+            v[self.has_nan] = np.nan
+        return stats
+
+
+    def to_sim(self, use_mean=False, bounds=None):
+        '''
+        Create the reduced sim, with the same results as MultiSim.reduce().
+
+        Args:
+            use_mean (bool): whether to use the mean instead of the median
+            bounds (float): if use_mean=True, the multiplier on the standard deviation for upper and lower bounds (default 2)
+        '''
+        if use_mean and bounds is None:
+            bounds = 2
+        stats = self.stats()
+        reduced_sim = sc.dcp(self.base_sim)
+        reduced_sim.metadata = dict(parallelized=True, combined=False, n_runs=self.n_runs, quantiles=None if use_mean else self.quantiles, use_mean=use_mean, bounds=bounds)
+
+        # Unflatten the results
+        start = 0
+        for key in self.keys['main'] + self.keys['variant']:
+            if key in self.keys['main']:
+                res = reduced_sim.results[key]
+            else:
+                res = reduced_sim.results['variant'][key]
+            shape = res.values.shape
+            inds = slice(start, start+res.values.size)
+            start += res.values.size
+            if use_mean:
+                res.values[:] = stats.mean[inds].reshape(shape)
+                res.low = stats.mean[inds].reshape(shape) - bounds*stats.std[inds].reshape(shape)
+                res.high = stats.mean[inds].reshape(shape) + bounds*stats.std[inds].reshape(shape)
+            else:
+                res.values[:] = stats.median[inds].reshape(shape)
+                res.low = stats.low[inds].reshape(shape)
+                res.high = stats.high[inds].reshape(shape)
+
+        reduced_sim.compute_summary()
+        return reduced_sim
+
+
 class Scenarios(cvb.ParsObj):
     '''
     Class for running multiple sets of multiple simulations -- e.g., scenarios.
@@ -944,17 +1207,37 @@ class Scenarios(cvb.ParsObj):
         return keys
 
 
-    def run(self, debug=False, keep_people=False, verbose=None, **kwargs):
+    def run(self, debug=False, keep_people=False, verbose=None, branch=None, **kwargs):
         '''
         Run the specified scenarios.
 
+        All runs of all scenarios are run in a single pool of processes, starting
+        with the largest sims, and the results for each scenario are processed
+        as soon as all of its runs have finished.
+
+        If the scenarios differ only in their interventions, and these all start
+        on or after a certain day, then the days before it are the same in every
+        scenario. With ``branch``, these days are only run once for each seed,
+        and each scenario continues from a copy of this burn-in. The results are
+        identical to running each scenario from the start. Since this restores
+        the random number stream for each copy, branching relies on Numba internals
+        (see cv.get_rng_state()); with Numba versions that do not provide them,
+        a warning is given and the scenarios are run independently instead.
+
         Args:
-            debug   (bool) : if True, runs a single run instead of multiple, which makes debugging easier
-            verbose (int)  : level of detail to print, passed to sim.run()
-            kwargs  (dict) : passed to multi_run() and thence to sim.run()
+            debug   (bool)    : if True, runs a single run instead of multiple, which makes debugging easier
+            verbose (int)     : level of detail to print, passed to sim.run()
+            branch  (int/str) : if supplied, the day or date on which the scenarios diverge; scenarios may then only change the interventions (requires the Numba internal numba._helperlib.rnd_get_state(), otherwise ignored)
+            kwargs  (dict)    : passed to single_run() (or multi_run(), if options specific to it are used), e.g. n_cpus or parallel
 
         Returns:
             None (modifies Scenarios object in place)
+
+        **Example**::
+
+            scenarios = {'base': {'name':'Base', 'pars': {}}, 'lockdown': {'name':'Lockdown', 'pars': {'interventions': cv.change_beta(30, 0.5)}}}
+            scens = cv.Scenarios(scenarios=scenarios)
+            scens.run(branch=30) # Only run the first 30 days once per seed
         '''
 
         if verbose is None:
@@ -968,10 +1251,17 @@ class Scenarios(cvb.ParsObj):
                 print(string)
             return
 
-        mainkeys   = self.result_keys('main')
-        variantkeys = self.result_keys('variant')
-
-        # Loop over scenarios
+        # Branching needs to restore the random number stream, so check it's possible
+        if branch is not None:
+            try:
+                cvu.get_rng_state()
+            except NotImplementedError as E:
+                warnmsg = f'Cannot branch the scenarios on {branch}, so running them independently instead: {E}'
+                cvm.warn(warnmsg)
+                branch = None
+
+        # Create the simulations
+        base_sims = sc.objdict()
         for scenkey,scen in self.scenarios.items():
             scenname = scen['name']
             scenpars = scen['pars']
@@ -980,9 +1270,12 @@ class Scenarios(cvb.ParsObj):
             if 'n_days' in scenpars.keys():
                 errormsg = 'Scenarios cannot be run with different numbers of days; set via basepars instead'
                 raise ValueError(errormsg)
+            if branch is not None:
+                changed = [key for key in scenpars.keys() if key != 'interventions']
+                if changed:
+                    errormsg = f'Scenario "{scenkey}" changes {sc.strjoin(changed)}, which would change the days before the branch; only interventions can differ when branching (or use branch=None)'
+                    raise ValueError(errormsg)
 
-            # Create and run the simulations
-            print_heading(f'Multirun for {scenkey}')
             scen_sim = sc.dcp(self.base_sim)
             scen_sim.scenkey = scenkey
             scen_sim.label = scenname
@@ -991,44 +1284,52 @@ class Scenarios(cvb.ParsObj):
             # Update the parameters, if provided, and re-initialize aspects of the simulation
             scen_sim.update_pars(scenpars)
             scen_sim.initialized = False # Ensure it gets re-initialized
-
-            run_args = dict(n_runs=self['n_runs'], noise=self['noise'], noisepar=self['noisepar'], keep_people=keep_people, verbose=verbose)
+            base_sims[scenkey] = scen_sim
+
+        # Run the burn-in for each seed, then each scenario from it
+        run_args = dict(noise=self['noise'], noisepar=self['noisepar'], keep_people=keep_people, verbose=verbose)
+        if branch is not None:
+            print_heading(f'Multirun for {len(base_sims)} scenarios branching on {branch}')
+            n_runs = 1 if debug else self['n_runs']
+            iterkwargs = dict(ind=np.arange(n_runs))
+            branch_kwargs = dict(sims=base_sims.values(), branch=branch, **run_args, **kwargs)
             if debug:
                 print('Running in debug mode (not parallelized)')
-                run_args.pop('n_runs', None) # Remove n_runs argument, not used for a single run
-                scen_sims = [single_run(scen_sim, **run_args, **kwargs)]
+                runs = [_branch_run(ind=0, **sc.dcp(branch_kwargs))]
             else:
-                scen_sims = multi_run(scen_sim, **run_args, **kwargs) # This is where the sims actually get run
-
-            # Process the simulations
-            print_heading(f'Processing {scenkey}')
-            ns = scen_sims[0]['n_variants'] # Get number of variants
-            scenraw = {}
-            for reskey in mainkeys:
-                scenraw[reskey] = np.zeros((self.npts, len(scen_sims)))
-                for s,sim in enumerate(scen_sims):
-                    scenraw[reskey][:,s] = sim.results[reskey].values
-            for reskey in variantkeys:
-                scenraw[reskey] = np.zeros((ns, self.npts, len(scen_sims)))
-                for s,sim in enumerate(scen_sims):
-                    scenraw[reskey][:,:,s] = sim.results['variant'][reskey].values
-
-            scenres = sc.objdict()
-            scenres.best = {}
-            scenres.low = {}
-            scenres.high = {}
-            for reskey in mainkeys + variantkeys:
-                axis = 1 if reskey in mainkeys else 2
-                scenres.best[reskey] = np.quantile(scenraw[reskey], q=0.5, axis=axis) # Changed from median to mean for smoother plots
-                scenres.low[reskey]  = np.quantile(scenraw[reskey], q=self['quantiles']['low'], axis=axis)
-                scenres.high[reskey] = np.quantile(scenraw[reskey], q=self['quantiles']['high'], axis=axis)
-
-            for reskey in mainkeys + variantkeys:
-                self.results[reskey][scenkey]['name'] = scenname
-                for blh in ['best', 'low', 'high']:
-                    self.results[reskey][scenkey][blh] = scenres[blh][reskey]
-
-            self.sims[scenkey] = scen_sims
+                runs = sc.parallelize(_branch_run, iterkwargs=iterkwargs, kwargs=branch_kwargs)
+            for s,scenkey in enumerate(base_sims.keys()):
+                self._process_sims(scenkey, [run[s] for run in runs], print_heading)
+
+        # Run each scenario separately, with a single run for debugging or if options that only multi_run() supports are used
+        elif debug or any(key in kwargs for key in _multi_run_args()) or any(key not in stream_par_args for key in sc.mergedicts(kwargs.get('par_args'))):
+            for scenkey,scen_sim in base_sims.items():
+                print_heading(f'Multirun for {scenkey}')
+                if debug:
+                    print('Running in debug mode (not parallelized)')
+                    scen_sims = [single_run(scen_sim, **run_args, **kwargs)]
+                else:
+                    scen_sims = multi_run(scen_sim, n_runs=self['n_runs'], **run_args, **kwargs) # This is where the sims actually get run
+                self._process_sims(scenkey, scen_sims, print_heading)
+
+        # Otherwise, run all scenarios and replicates as a single set of jobs
+        else:
+            print_heading(f'Multirun for {len(base_sims)} scenarios')
+            n_cpus   = kwargs.pop('n_cpus', None)
+            parallel = kwargs.pop('parallel', True)
+            par_args = sc.mergedicts({'ncpus':n_cpus}, kwargs.pop('par_args', None))
+            retry    = kwargs.pop('retry', 'warn')
+            jobs = {}
+            for scenkey,scen_sim in base_sims.items():
+                for ind in range(self['n_runs']):
+                    jobs[(scenkey, ind)] = dict(sim=scen_sim, ind=ind, **run_args, **kwargs)
+            order = sorted(jobs.keys(), key=lambda job: -_job_size(base_sims[job[0]])) # Longest job first, otherwise in order
+            done = {scenkey:[None]*self['n_runs'] for scenkey in base_sims.keys()}
+            for (scenkey,ind),sim in _iter_parallel(single_run, {job:jobs[job] for job in order}, parallel=parallel, par_args=par_args, retry=retry, ordered=False):
+                done[scenkey][ind] = sim
+                if all(done[scenkey]): # All replicates have finished, so process this scenario now
+                    self._process_sims(scenkey, done[scenkey], print_heading)
+            self.sims = sc.objdict({scenkey:self.sims[scenkey] for scenkey in base_sims.keys()}) # Restore the scenario order
 
         #%% Print statistics
         if verbose:
@@ -1040,6 +1341,43 @@ class Scenarios(cvb.ParsObj):
         return self
 
 
+    def _process_sims(self, scenkey, scen_sims, print_heading=print):
+        ''' Calculate the quantiles of the results across the runs of a scenario '''
+        mainkeys    = self.result_keys('main')
+        variantkeys = self.result_keys('variant')
+        scenname    = self.scenarios[scenkey]['name']
+
+        print_heading(f'Processing {scenkey}')
+        ns = scen_sims[0]['n_variants'] # Get number of variants
+        scenraw = {}
+        for reskey in mainkeys:
+            scenraw[reskey] = np.zeros((self.npts, len(scen_sims)))
+            for s,sim in enumerate(scen_sims):
+                scenraw[reskey][:,s] = sim.results[reskey].values
+        for reskey in variantkeys:
+            scenraw[reskey] = np.zeros((ns, self.npts, len(scen_sims)))
+            for s,sim in enumerate(scen_sims):
+                scenraw[reskey][:,:,s] = sim.results['variant'][reskey].values
+
+        scenres = sc.objdict()
+        scenres.best = {}
+        scenres.low = {}
+        scenres.high = {}
+        for reskey in mainkeys + variantkeys:
+            axis = 1 if reskey in mainkeys else 2
+            scenres.best[reskey] = np.quantile(scenraw[reskey], q=0.5, axis=axis) # Changed from median to mean for smoother plots
+            scenres.low[reskey]  = np.quantile(scenraw[reskey], q=self['quantiles']['low'], axis=axis)
+            scenres.high[reskey] = np.quantile(scenraw[reskey], q=self['quantiles']['high'], axis=axis)
+
+        for reskey in mainkeys + variantkeys:
+            self.results[reskey][scenkey]['name'] = scenname
+            for blh in ['best', 'low', 'high']:
+                self.results[reskey][scenkey][blh] = scenres[blh][reskey]
+
+        self.sims[scenkey] = scen_sims
+        return
+
+
     def compare(self, t=None, output=False):
         '''
         Print out a comparison of each scenario.
@@ -1323,6 +1661,782 @@ class Scenarios(cvb.ParsObj):
             return string
 
 
+class SharedPeople:
+    '''
+    Store the arrays of a People object (including its contact layers) in files
+    that other processes map into memory copy-on-write, rather than receiving a
+    pickled copy. The operating system shares the pages of each array between
+    the processes until one of them modifies it, at which point that process gets
+    its own copy of the modified pages, so changes made by one sim (e.g. to its
+    people's states, or to a contact layer by an intervention) are never seen by
+    the others. Only the file names, shapes, and dtypes of the arrays are pickled.
+    Used by multi_run(shared=True).
+
+    Args:
+        people (People) : the people whose arrays to share
+        folder (str)    : the folder in which to create the directory of files (default: the system temporary folder)
+    '''
+
+    def __init__(self, people, folder=None):
+        self.dirname = tempfile.mkdtemp(prefix='covasim_shared_', dir=folder)
+        self.specs = {} # The file name of each array, by key
+        for key in people.keys():
+            self.specs[key] = self._share(key, people[key])
+        for lkey,layer in people.contacts.items():
+            for key in layer.keys():
+                self.specs[(lkey, key)] = self._share(f'{lkey}_{key}', layer[key])
+        return
+
+
+    def _share(self, name, arr):
+        ''' Save an array to a file in the directory, and return its path '''
+        path = os.path.join(self.dirname, f'{len(self.specs)}_{name}.npy') # Numbered, since keys may not be unique once combined
+        np.save(path, arr, allow_pickle=False)
+        return path
+
+
+    def make_shell(self, sim):
+        ''' Make a shallow copy of the sim whose people have empty arrays, for sending to other processes '''
+        shell = sc.cp(sim)
+        shell.popdict = None
+        shell.people = sc.cp(sim.people)
+        for key in sim.people.keys():
+            shell.people[key] = None
+        contacts = sc.cp(sim.people.contacts)
+        for lkey,layer in sim.people.contacts.items():
+            contacts[lkey] = sc.cp(layer)
+            for key in layer.keys():
+                contacts[lkey][key] = np.empty(0, dtype=layer[key].dtype)
+        shell.people.contacts = contacts
+        return shell
+
+
+    def attach(self, people):
+        '''
+        Fill in the arrays of a people object made by make_shell(), mapping each
+        file copy-on-write. The arrays are writeable (as Numba functions require),
+        but writing to them only changes this process's copy.
+        '''
+        for key,path in self.specs.items():
+            arr = np.asarray(np.load(path, mmap_mode='c')) # A plain array, rather than a memmap, backed by the private mapping
+            if isinstance(key, tuple):
+                lkey, key = key
+                people.contacts[lkey][key] = arr
+            else:
+                people[key] = arr
+        return
+
+
+    def detach(self, people=None):
+        ''' Copy any arrays the people still use out of the mapped files, so they can be kept after the files are removed '''
+        if people is not None:
+            for key in people.keys():
+                arr = people[key]
+                if isinstance(arr, np.ndarray) and not arr.flags.owndata:
+                    people[key] = arr.copy()
+            for layer in people.contacts.values():
+                for key in layer.keys():
+                    if not layer[key].flags.owndata:
+                        layer[key] = layer[key].copy()
+        return
+
+
+    def unlink(self):
+        ''' Remove the files (in the process that created them) '''
+        shutil.rmtree(self.dirname, ignore_errors=True)
+        return
+
+
+class EnsemblePeople(cvppl.People):
+    '''
+    The people for an EnsembleSim: n_runs copies of the same population, stored
+    one after the other in the same arrays, so person i of replicate r has index
+    r*run_size + i. As well as the usual flows (which are totals over all the
+    replicates), the flows of each replicate are counted in ``run_flows`` (arrays
+    of length n_runs) and ``run_flows_variant`` (arrays of shape (n_variants, n_runs)).
+
+    Args:
+        pars     (dict) : the parameters of the ensemble, with pop_size = n_runs*run_size
+        n_runs   (int)  : the number of replicates
+        run_size (int)  : the number of people in each replicate
+        kwargs   (dict) : passed to People
+    '''
+
+    def __init__(self, pars, n_runs, run_size, **kwargs):
+        self.n_runs   = int(n_runs) # Set first, since init_flows() is called by People.__init__()
+        self.run_size = int(run_size)
+        super().__init__(pars, **kwargs)
+        return
+
+
+    def init_flows(self):
+        ''' Initialize the flows, both the totals and those of each replicate, to be zero '''
+        super().init_flows()
+        self.run_flows = {key:np.zeros(self.n_runs, dtype=cvd.default_float) for key in cvd.new_result_flows + ['n_imports']}
+        self.run_flows_variant = {}
+        for key in cvd.new_result_flows_by_variant:
+            self.run_flows_variant[key] = np.zeros((self.pars['n_variants'], self.n_runs), dtype=cvd.default_float)
+        return
+
+
+    def count_runs(self, inds, variants=None):
+        '''
+        Count the people with the given indices in each replicate, optionally by
+        variant, in which case the counts have shape (n_variants, n_runs)
+        '''
+        runs = np.asarray(inds, dtype=np.int64) // self.run_size
+        if variants is None:
+            return np.bincount(runs, minlength=self.n_runs)
+        nv = self.pars['n_variants']
+        keys = np.asarray(variants, dtype=np.int64)*self.n_runs + runs
+        return np.bincount(keys, minlength=nv*self.n_runs).reshape((nv, self.n_runs))
+
+
+    def check_infectious(self):
+        inds = super().check_infectious()
+        self.run_flows['new_infectious'] += self.count_runs(inds)
+        self.run_flows_variant['new_infectious_by_variant'] += self.count_runs(inds, self.infectious_variant[inds])
+        return inds
+
+
+    def check_symptomatic(self):
+        inds = super().check_symptomatic()
+        self.run_flows['new_symptomatic'] += self.count_runs(inds)
+        return inds
+
+
+    def check_severe(self):
+        inds = super().check_severe()
+        self.run_flows['new_severe'] += self.count_runs(inds)
+        return inds
+
+
+    def check_critical(self):
+        inds = super().check_critical()
+        self.run_flows['new_critical'] += self.count_runs(inds)
+        return inds
+
+
+    def check_recovery(self, inds=None, filter_inds='is_exp'):
+        inds = super().check_recovery(inds=inds, filter_inds=filter_inds)
+        self.run_flows['new_recoveries'] += self.count_runs(inds)
+        return inds
+
+
+    def check_death(self):
+        inds, n_deaths, n_known_deaths = super().check_death()
+        self.run_flows['new_deaths'] += self.count_runs(inds)
+        self.run_flows['new_known_deaths'] += self.count_runs(inds[self.known_dead[inds]])
+        return inds, n_deaths, n_known_deaths
+
+
+    def check_diagnosed(self):
+        inds = super().check_diagnosed()
+        self.run_flows['new_diagnoses'] += self.count_runs(inds)
+        return inds
+
+
+    def check_quar(self):
+        n_quarantined = super().check_quar()
+        if n_quarantined: # Only check_quar() sets the date of quarantine, so everyone quarantined today is new
+            self.run_flows['new_quarantined'] += self.count_runs(cvu.true(self.date_quarantined == self.t))
+        return n_quarantined
+
+
+    def check_enter_iso(self):
+        inds = super().check_enter_iso()
+        self.run_flows['new_isolated'] += self.count_runs(inds)
+        return inds
+
+
+    def infect(self, inds, hosp_max=None, icu_max=None, source=None, layer=None, variant=0):
+        ''' Infect people, as for People.infect(), and count the flows of each replicate '''
+        if layer == 'importation':
+            self.run_flows['n_imports'] += self.count_runs(inds)
+
+        # Find reinfections before the dates are reset
+        new_inds = np.unique(inds).astype(np.int64)
+        new_inds = new_inds[self.susceptible[new_inds]]
+        reinf_inds = new_inds[~np.isnan(self.date_recovered[new_inds])]
+
+        inds = super().infect(inds, hosp_max=hosp_max, icu_max=icu_max, source=source, layer=layer, variant=variant)
+        if len(inds):
+            n_infections = self.count_runs(inds)
+            self.run_flows['new_infections'] += n_infections
+            self.run_flows['new_reinfections'] += self.count_runs(reinf_inds)
+            self.run_flows_variant['new_infections_by_variant'][variant] += n_infections
+            self.run_flows_variant['new_symptomatic_by_variant'][variant] += self.count_runs(inds[~np.isnan(self.date_symptomatic[inds])])
+            self.run_flows_variant['new_severe_by_variant'][variant] += self.count_runs(inds[~np.isnan(self.date_severe[inds])])
+        return inds
+
+
+    def test(self, inds, *args, **kwargs):
+        ''' Test people, as for People.test(), and count the tests in each replicate '''
+        self.run_flows['new_tests'] += self.count_runs(np.unique(inds))
+        return super().test(inds, *args, **kwargs)
+
+
+    def get_run(self, r, pars, contacts=False):
+        '''
+        Return a People object for replicate r, whose arrays are views of the
+        arrays of the ensemble.
+
+        Args:
+            r        (int)  : the index of the replicate
+            pars     (dict) : the parameters of the replicate, e.g. sim.pars
+            contacts (bool) : whether to also copy the contacts and infection log of the replicate
+        '''
+        start = r*self.run_size
+        end   = start + self.run_size
+        people = cvppl.People(pars)
+        for key in self.keys():
+            people[key] = self[key][..., start:end] # The last axis is the person, including for by-variant states
+        people.t = self.t
+        people.initialized = True
+
+        if contacts:
+            for lkey,layer in self.contacts.items():
+                keep = (layer['p1'] >= start) & (layer['p1'] < end) # Layers are block diagonal, so p2 is in the same replicate
+                new_layer = {key:layer[key][keep] for key in layer.keys()}
+                new_layer['p1'] = new_layer['p1'] - start
+                new_layer['p2'] = new_layer['p2'] - start
+                people.contacts[lkey] = cvb.Layer(label=lkey, **new_layer)
+
+            log = self.infection_log
+            rows = (log.target >= start) & (log.target < end)
+            run_log = cvb.InfectionLog()
+            run_log.arrs = {key:log[key][rows] for key in log.meta.keys()}
+            run_log.arrs['target'] -= start
+            has_source = run_log.arrs['source'] >= 0
+            run_log.arrs['source'][has_source] -= start
+            run_log.n = len(run_log.arrs['target'])
+            run_log.labels = sc.dcp(log.labels)
+            run_log._sorted = log._sorted
+            people.infection_log = run_log
+
+        return people
+
+
+class EnsembleSim(cvs.Sim):
+    '''
+    Run several replicates of a sim, which differ only in their random numbers,
+    as a single larger sim. Each replicate is a copy of the same population and
+    contact network (created once), and the people of all the replicates are
+    stored in the same arrays, so each step processes all the replicates with a
+    single call to each of the state-update, transmission, and counting
+    functions. This amortizes the Python overhead of each step, which dominates
+    for small populations, across the replicates. The results of each replicate
+    are then split out into a list of sims, one per replicate, which can be used
+    e.g. to create a MultiSim.
+
+    Since the contact layers are block diagonal, there is no transmission between
+    replicates. However, the replicates are not independent runs in the sense
+    that multi_run() implies: they draw from a single random number stream (seeded
+    with the sim's rand_seed, which the sims returned keep), so replicate r does
+    not give the same results as run r of multi_run(), and variant importations
+    are made from the susceptible people of all the replicates together, so the
+    number in each replicate is only n_imports on average. Each replicate's
+    results therefore have the same distribution as a single run only if there
+    are no importations, and the replicates can only be reproduced together.
+
+    Requirements: the contact layers must be static; dynamic rescaling (with pop_scale > 1),
+    hospital and ICU capacity, analyzers, and interventions that use a fixed number
+    across the whole population (e.g. test_num(), vaccinate_num(), including within
+    a sequence()) are not supported. Subtargeting by a fixed list of indices is
+    applied to the same people in each replicate; a function that returns the
+    indices or values is called with the ensemble, so must use its people
+    (e.g. ``lambda sim: cv.true(sim.people.age > 60)``) rather than fixed indices.
+
+    Args:
+        sim         (Sim)  : the sim to run replicates of (not yet initialized)
+        n_runs      (int)  : the number of replicates
+        keep_people (bool) : whether to keep the people (including their contacts and infection log) in the sims of each replicate
+        kwargs      (dict) : passed to Sim
+
+    **Example**::
+
+        sim = cv.Sim(pop_size=5e3, interventions=cv.test_prob(symp_prob=0.1))
+        ens = cv.EnsembleSim(sim, n_runs=10)
+        ens.run()
+        msim = ens.to_multisim()
+        msim.mean()
+        msim.plot()
+    '''
+
+    def __init__(self, sim, n_runs=4, keep_people=False, **kwargs):
+        if not isinstance(sim, cvs.Sim):
+            errormsg = f'EnsembleSim requires a Sim, not {type(sim)}'
+            raise TypeError(errormsg)
+        if sim.initialized:
+            errormsg = 'EnsembleSim requires a sim that has not been initialized, since it creates the population itself'
+            raise ValueError(errormsg)
+        n_runs = int(n_runs)
+        if n_runs < 1:
+            errormsg = f'The number of runs must be at least 1, not {n_runs}'
+            raise ValueError(errormsg)
+
+        self.base_sim    = sc.dcp(sim) # Used to create the population, and the sims of each replicate
+        self.n_runs      = n_runs
+        self.keep_people = keep_people
+        self.sims        = None
+
+        # Scale the parameters that are totals over the population
+        pars = sc.dcp(sim.pars)
+        pars['pop_size']     = n_runs*int(sim['pop_size'])
+        pars['pop_infected'] = n_runs*sim['pop_infected'] # Seeded separately in each replicate by init_infections()
+        pars['n_imports']    = n_runs*sim['n_imports'] # Equivalent to independent importations in each replicate, since these are Poisson
+        for variant in sc.tolist(pars['variants']):
+            if isinstance(variant, cvimm.variant):
+                variant.n_imports *= n_runs
+        super().__init__(pars=pars, label=sim.label, **kwargs)
+        self.data = sim.data
+        return
+
+
+    def initialize(self, reset=False, **kwargs):
+        ''' Initialize the sim, as for Sim.initialize(), and check that it can be run as an ensemble '''
+        super().initialize(reset=reset, **kwargs)
+        self.validate_ensemble()
+        self.tile_subtargets()
+        return self
+
+
+    def get_interventions(self):
+        ''' Return a list of all the interventions, including those within a sequence() '''
+        interventions = []
+        def add(intervs):
+            for intervention in intervs:
+                interventions.append(intervention)
+                if isinstance(intervention, cvi.sequence):
+                    add(intervention.interventions)
+        add(self['interventions'])
+        return interventions
+
+
+    def validate_ensemble(self):
+        ''' Check that the parameters, interventions, and analyzers can be used in an ensemble '''
+        errormsg = None
+        dynam_layers = [lkey for lkey,is_dynam in self['dynam_layer'].items() if is_dynam]
+        interventions = self.get_interventions()
+        unsupported = [intervention for intervention in interventions if isinstance(intervention, (cvi.test_num, cvi.vaccinate_num, cvi.historical_wave, cvi.historical_vaccinate_prob))]
+        mixed = [intervention for intervention in interventions if isinstance(getattr(intervention, 'subtarget', None), dict) and not callable(intervention.subtarget['inds']) and callable(intervention.subtarget['vals'])]
+        if dynam_layers:
+            errormsg = f'EnsembleSim requires static contact layers, but {sc.strjoin(dynam_layers)} are dynamic'
+        elif self['rescale'] and self['pop_scale'] > 1:
+            errormsg = 'EnsembleSim does not support dynamic rescaling; please set rescale=False'
+        elif self['n_beds_hosp'] is not None or self['n_beds_icu'] is not None:
+            errormsg = 'EnsembleSim does not support hospital or ICU capacity, since this applies to each replicate separately'
+        elif unsupported:
+            errormsg = f'EnsembleSim does not support interventions that apply to the whole population at once: {sc.strjoin([intervention.__class__.__name__ for intervention in unsupported])}'
+        elif mixed:
+            errormsg = f'EnsembleSim does not support subtargeting with fixed indices but values from a function, since the values would not match the indices of each replicate: {sc.strjoin([intervention.__class__.__name__ for intervention in mixed])}'
+        elif len(self['analyzers']):
+            errormsg = 'EnsembleSim does not support analyzers, since they would see all the replicates at once'
+        if errormsg:
+            raise ValueError(errormsg)
+        return
+
+
+    def tile_subtargets(self):
+        ''' Apply subtargeting by fixed indices to the same people in each replicate '''
+        n = self.people.run_size
+        for intervention in self.get_interventions():
+            subtarget = getattr(intervention, 'subtarget', None)
+            if isinstance(subtarget, dict) and not callable(subtarget['inds']):
+                subtarget = getattr(intervention, '_run_subtarget', subtarget) # The subtargeting for a single replicate, in case of reinitialization
+                intervention._run_subtarget = subtarget
+                inds = np.asarray(subtarget['inds'])
+                vals = subtarget['vals']
+                intervention.subtarget = sc.mergedicts(subtarget, {
+                    'inds': (inds + np.arange(self.n_runs)[:,None]*n).reshape(-1),
+                    'vals': np.tile(vals, self.n_runs) if sc.isiterable(vals) else vals,
+                })
+        return
+
+
+    def init_people(self, reset=False, **kwargs):
+        ''' Create the population once, and then copy it for each replicate; see Sim.init_people() '''
+        if self.people is None or reset:
+            self.people = self.make_ensemble_people()
+        return super().init_people(reset=False, **kwargs)
+
+
+    def make_ensemble_people(self):
+        ''' Create the population of the base sim, and copy it n_runs times '''
+        base = sc.dcp(self.base_sim)
+        base['interventions'] = []
+        base['analyzers'] = []
+        base.initialize(init_infections=False)
+        people = base.people
+        n = len(people)
+        offsets = np.arange(self.n_runs)*n
+
+        # Copy the contacts, offsetting the indices of each replicate
+        contacts = {}
+        for lkey,layer in people.contacts.items():
+            contacts[lkey] = {key:np.tile(layer[key], self.n_runs) for key in layer.keys()}
+            for key in ['p1', 'p2']:
+                contacts[lkey][key] = (layer[key] + offsets[:,None].astype(layer[key].dtype)).reshape(-1)
+
+        age = np.tile(people.age, self.n_runs)
+        sex = np.tile(people.sex, self.n_runs)
+        return EnsemblePeople(self.pars, n_runs=self.n_runs, run_size=n, age=age, sex=sex, contacts=contacts)
+
+
+    def init_results(self):
+        ''' Create the results, and the results of each replicate '''
+        super().init_results()
+        self.run_results = {'variant':{}} # Arrays of shape (n_runs, npts), or (n_runs, n_variants, npts) for variant results
+        return
+
+
+    def store_run_result(self, key, values, by_variant=False):
+        ''' Store the values of a result for each replicate on this timestep '''
+        results = self.run_results['variant'] if by_variant else self.run_results
+        if key not in results:
+            shape = (self.n_runs, self['n_variants'], self.npts) if by_variant else (self.n_runs, self.npts)
+            results[key] = np.zeros(shape, dtype=cvd.result_float)
+        results[key][..., self.t] = values
+        return
+
+
+    def init_infections(self, force=False, verbose=None):
+        ''' Initialize prior immunity and seed infections separately in each replicate; see Sim.init_infections() '''
+        if verbose is None:
+            verbose = self['verbose']
+
+        people = self.people
+        n = people.run_size
+        if people.count_not('naive') == 0 or force:
+            if self['frac_susceptible'] < 1:
+                n_nonnaive = np.round((1-self['frac_susceptible'])*n)
+                inds = np.concatenate([cvu.choose(n, n_nonnaive) + r*n for r in range(self.n_runs)])
+                people.make_nonnaive(inds=inds)
+            n_infected = self.base_sim['pop_infected']
+            if n_infected:
+                inds = np.concatenate([cvu.choose(n, n_infected) + r*n for r in range(self.n_runs)])
+                people.infect(inds=inds, layer='seed_infection')
+        elif verbose:
+            print(f'People already initialized with {people.count_not("naive")} people non-naive and {people.count("exposed")} exposed; not reinitializing')
+        return
+
+
+    def step(self):
+        ''' Step all the replicates forward in time, and store the results of each; see Sim.step() '''
+        people = self.people
+        shape = (self.n_runs, people.run_size)
+        doses = people.doses.reshape(shape).sum(axis=1)
+        n_vaccinated = np.count_nonzero(people.vaccinated.reshape(shape), axis=1)
+
+        super().step()
+        self.t -= 1 # Store the results for the timestep that was just run
+
+        # Flows, including vaccinations (counted from the change in doses, since vaccinations are counted by the intervention rather than by the people)
+        for key,counts in people.run_flows.items():
+            self.store_run_result(key, counts)
+        for key,counts in people.run_flows_variant.items():
+            self.store_run_result(key, counts.T, by_variant=True)
+        self.store_run_result('new_doses', people.doses.reshape(shape).sum(axis=1) - doses)
+        self.store_run_result('new_vaccinated', np.count_nonzero(people.vaccinated.reshape(shape), axis=1) - n_vaccinated)
+
+        # Stocks and population immunity of each replicate
+        n = people.run_size
+        run_stocks = [self.calc_stocks(block=slice(r*n, (r+1)*n)) for r in range(self.n_runs)]
+        for key,by_variant in self._stocks.items():
+            self.store_run_result(f'n_{key}', np.array([stocks[key] for stocks,_ in run_stocks]), by_variant=by_variant)
+        for key in run_stocks[0][1].keys():
+            self.store_run_result(key, np.array([pop_imm[key] for _,pop_imm in run_stocks]))
+
+        self.t += 1
+        return
+
+
+    def finalize(self, verbose=None, restore_pars=True):
+        ''' Finalize the results of the ensemble, then split them into a sim for each replicate '''
+        super().finalize(verbose=verbose, restore_pars=restore_pars)
+        self.sims = [self.make_run_sim(r) for r in range(self.n_runs)]
+        return
+
+
+    def make_run_sim(self, r):
+        ''' Create a finalized sim with the results (and optionally the people) of replicate r '''
+        sim = sc.dcp(self.base_sim)
+        if not sim.label:
+            sim.label = f'Sim {r}'
+        sim.ensemble_run = r # The replicate index; rand_seed is unchanged, since all the replicates were run with it
+        sim.validate_pars()
+        sim.init_variants()
+        sim.init_immunity()
+        sim.init_results()
+        sim.people = self.people.get_run(r, sim.pars, contacts=self.keep_people)
+
+        # Copy the results of this replicate
+        for key,values in self.run_results.items():
+            if key != 'variant':
+                sim.results[key].values[:] = values[r]
+        for key,values in self.run_results['variant'].items():
+            sim.results['variant'][key].values[:] = values[r]
+
+        # Finalize the sim without finalizing the interventions again
+        sim.t = self.npts
+        sim.initialized = True
+        sim.complete = True
+        sim['interventions'] = []
+        sim['analyzers'] = []
+        sim.finalize(verbose=0)
+        if not self.keep_people:
+            sim.shrink()
+        sim['interventions'] = list(self['interventions']) # Shared with the ensemble, e.g. for plotting
+        return sim
+
+
+    def to_multisim(self, **kwargs):
+        ''' Create a MultiSim from the sims of each replicate, e.g. to calculate their mean '''
+        if self.sims is None:
+            errormsg = 'The ensemble has not been run yet; please run it first'
+            raise RuntimeError(errormsg)
+        return MultiSim(sims=self.sims, **kwargs)
+
+
+def _call_job(key, func, job):
+    ''' Helper function to call a run function with keyword arguments, returning the key too; see _iter_parallel() '''
+    return key, func(**job)
+
+
+# The arguments to sc.parallelize() that _iter_parallel() also supports
+stream_par_args = ['ncpus', 'parallelizer']
+
+
+def _raise_parallel_error(E):
+    '''
+    Raise a RuntimeError from running in parallel, adding advice if it was caused
+    by running outside of __main__ on Windows
+    '''
+    if 'freeze_support' in str(E): # For this error, add additional information
+        errormsg = '''
+ Uh oh! It appears you are trying to run with multiprocessing on Windows outside
+ of the __main__ block; please see https://docs.python.org/3/library/multiprocessing.html
+ for more information. The correct syntax to use is e.g.
+
+     import covasim as cv
+     sim = cv.Sim()
+     msim = cv.MultiSim(sim)
+
+     if __name__ == '__main__':
+         msim.run()
+
+Alternatively, to run without multiprocessing, set parallel=False.
+ '''
+        raise RuntimeError(errormsg) from E
+    else: # For all other runtime errors, raise the original exception
+        raise E
+
+
+def _iter_parallel(func, jobs, parallel=True, par_args=None, retry='warn', ordered=True):
+    '''
+    Yield (key, result) pairs for a dict of jobs, each a dict of keyword arguments
+    to func, in the order given (if ordered) or as they finish. Unlike sc.parallelize(),
+    results are not kept once they have been yielded, and at most twice as many
+    jobs as CPUs are in progress at once, so that results that have finished but
+    not yet been used are not buffered without limit. Used by multi_run() with
+    a reducer, and by Scenarios.run().
+
+    Of the arguments to sc.parallelize(), only ncpus and parallelizer (one of
+    'concurrent.futures' (default), 'multiprocess', 'multiprocessing', or 'serial')
+    are supported, and any others raise an exception. Errors are handled as for
+    multi_run(), including retrying with 'multiprocess' if the jobs can't be pickled.
+    '''
+    par_args = sc.mergedicts(par_args)
+    unsupported = [key for key,val in par_args.items() if key not in stream_par_args and val is not None]
+    if unsupported:
+        errormsg = f'Arguments to sc.parallelize() {sc.strjoin(unsupported)} are not supported when results are used as they finish; supported arguments are {sc.strjoin(stream_par_args)}'
+        raise ValueError(errormsg)
+    parallelizer = par_args.get('parallelizer') or 'concurrent.futures'
+    n_cpus = par_args.get('ncpus')
+
+    # Run in serial
+    if not parallel or parallelizer == 'serial':
+        for key,job in jobs.items():
+            job = sc.mergedicts(job, {'sim':job['sim'].copy()}) # Ensure we have a fresh sim; this happens implicitly on pickling with multiprocessing
+            yield key, func(**job)
+        return
+
+    # Run in parallel
+    if parallelizer not in ['concurrent.futures', 'multiprocess', 'multiprocessing']:
+        errormsg = f'Parallelizer "{parallelizer}" is not supported when results are used as they finish; choices are concurrent.futures, multiprocess, multiprocessing, or serial'
+        raise ValueError(errormsg)
+    max_pending = 2*(n_cpus or sc.cpu_count()) # The maximum number of jobs in progress at once
+    n_yielded = 0
+    try:
+        if parallelizer == 'concurrent.futures':
+            pool = cf.ProcessPoolExecutor(max_workers=n_cpus)
+            submit = lambda key, job: pool.submit(_call_job, key, func, job)
+        else:
+            mp = __import__(parallelizer) # Both have the same interface
+            pool = mp.Pool(processes=n_cpus)
+            def submit(key, job): # Wrap the result in a future, so both parallelizers can be waited on in the same way
+                future = cf.Future()
+                pool.apply_async(_call_job, (key, func, job), callback=future.set_result, error_callback=future.set_exception)
+                return future
+        with pool:
+            job_items = iter(jobs.items())
+            pending = co.deque() # Futures in the order they were submitted; each is released once its result has been yielded
+            while True:
+                for key,job in job_items:
+                    pending.append(submit(key, job))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                if ordered:
+                    future = pending.popleft()
+                else:
+                    future = next(iter(cf.wait(pending, return_when=cf.FIRST_COMPLETED).done))
+                    pending.remove(future)
+                output = future.result() # Raises any exception from the job
+                del future
+                n_yielded += 1
+                yield output
+                del output
+    except RuntimeError as E: # Handle if run outside of __main__ on Windows
+        _raise_parallel_error(E)
+    except pkl.PicklingError as E:
+        if retry in ['warn', 'silent'] and parallelizer != 'multiprocess' and not n_yielded: # Only retry if nothing has been used yet, otherwise results would be repeated
+            if retry == 'warn':
+                warnmsg = f'Parallel run failed with parallelizer={parallelizer}, trying more robust "multiprocess"...'
+                cvm.warn(warnmsg)
+            par_args = sc.mergedicts(par_args, {'parallelizer':'multiprocess'})
+            yield from _iter_parallel(func, jobs, parallel=parallel, par_args=par_args, retry='die', ordered=ordered)
+        else:
+            errormsg = 'Parallel run failed due to a pickling error; this is usually due to including a lambda function or other complex object'
+            raise pkl.PicklingError(errormsg) from E
+    return
+
+
+def _multi_run_args():
+    '''
+    The arguments to multi_run() that aren't arguments to single_run(), other than
+    those that _iter_parallel() handles, so can't be used when running individual
+    jobs; see Scenarios.run()
+    '''
+    single = inspect.signature(single_run).parameters
+    handled = ['n_runs', 'parallel', 'n_cpus', 'par_args', 'retry']
+    return [key for key,par in inspect.signature(multi_run).parameters.items() if key not in single and key not in handled and par.kind != par.VAR_KEYWORD]
+
+
+def _job_size(sim):
+    ''' Estimate the relative cost of running a sim, for scheduling the longest jobs first '''
+    return sim['pop_size']*sim.npts
+
+
+def _shared_single_run(sim, shared_people, keep_people=False, **kwargs):
+    ''' Attach a sim to a shared population, run it, and detach it; see multi_run() '''
+    shared_people.attach(sim.people)
+    try:
+        sim = single_run(sim, keep_people=keep_people, **kwargs)
+    finally:
+        shared_people.detach(sim.people)
+    return sim
+
+
+def _intervention_key(intervention):
+    ''' Identify interventions that are the same in different scenarios, for _branch_run() '''
+    if isinstance(intervention, cvi.Intervention):
+        try:
+            return (intervention.__class__, str(intervention.to_json()))
+        except Exception: # pragma: no cover
+            return id(intervention) # Never shared
+    return intervention # E.g. a function
+
+
+def _intervention_start(intervention):
+    '''
+    Find the first day on which an (initialized) intervention can act, from its
+    start day and/or its days, for _branch_run(); None if this can't be determined
+    '''
+    days = [getattr(intervention, 'start_day', None)] + list(np.ravel(np.array(getattr(intervention, 'days', []), dtype=object)))
+    days = [day for day in days if day is not None]
+    if not days or not all(sc.isnumber(day) for day in days): # E.g. no days at all, or days given as functions
+        return None
+    return min(days)
+
+
+def _branch_run(sims, branch, ind=0, keep_people=False, verbose=None, **kwargs):
+    '''
+    Run several sims that differ only in their interventions, by running their
+    shared burn-in once and then copying it for each sim. Used by Scenarios.run().
+
+    The burn-in is run with the interventions that all the sims have in common,
+    up to (but not including) the branch day. Each copy then gets the rest of its
+    own interventions, which must not start before the branch day, and the random
+    number stream is restored to the same point, so each sim gives identical
+    results to running it from the start with single_run().
+
+    Args:
+        sims        (list)    : the (uninitialized) sims to run, e.g. one per scenario
+        branch      (int/str) : the first day on which the sims can differ
+        ind         (int)     : the index of this run, used for the seed as in single_run()
+        keep_people (bool)    : whether to keep the people after the sims are run
+        verbose     (int)     : detail to print
+        kwargs      (dict)    : passed to single_run()
+
+    Returns:
+        A list of sims, in the same order as the input
+    '''
+
+    # Find the interventions that all the sims have in common
+    sims = list(sims)
+    for sim in sims:
+        sim['interventions'] = sc.tolist(sim['interventions'])
+    all_keys = [[_intervention_key(intervention) for intervention in sim['interventions']] for sim in sims]
+    shared = [key for key in all_keys[0] if all(key in keys for keys in all_keys[1:])]
+
+    # Run the burn-in
+    burnin = sc.dcp(sims[0])
+    burnin['interventions'] = [intervention for intervention,key in zip(burnin['interventions'], all_keys[0]) if key in shared]
+    burnin = single_run(burnin, ind=ind, keep_people=True, verbose=verbose, do_run=False, **kwargs)
+    until = burnin.day(branch)
+    if not (0 < until < burnin.npts):
+        errormsg = f'The branch day must be after the start and before the end of the sim (t=1 to t={burnin.npts-1}), not t={until}'
+        raise ValueError(errormsg)
+    burnin.run(until=until, verbose=verbose)
+    rng_state = cvu.get_rng_state()
+
+    # Copy the burn-in for each sim, and add its own interventions
+    branch_sims = []
+    for sim,keys in zip(sims, all_keys):
+        branch_sim = sc.dcp(burnin)
+        branch_sim.label = sim.label
+        for attr in ['scenkey', 'scen']:
+            if hasattr(sim, attr):
+                setattr(branch_sim, attr, getattr(sim, attr))
+
+        burnin_interventions = dict(zip(shared, branch_sim['interventions']))
+        interventions = []
+        for intervention,key in zip(sim['interventions'], keys):
+            if key in burnin_interventions:
+                intervention = burnin_interventions[key] # Already run during the burn-in
+            else:
+                intervention = sc.dcp(intervention)
+                if isinstance(intervention, cvi.Intervention):
+                    intervention.initialize(branch_sim)
+                start = _intervention_start(intervention)
+                if start is None or start < until:
+                    errormsg = f'Intervention {intervention} is not shared by all scenarios, so it must start on or after the branch day (t={until}); use branch=None to run the scenarios independently'
+                    raise ValueError(errormsg)
+            interventions.append(intervention)
+        branch_sim['interventions'] = interventions
+        branch_sim._orig_pars['interventions'] = sc.dcp(sim['interventions']) # Restored by sim.initialize(), as for a sim run from the start
+
+        cvu.set_rng_state(rng_state) # Continue from the same point in the random number stream for every sim
+        branch_sim.run(reset_seed=False, verbose=verbose)
+        if not keep_people:
+            branch_sim.shrink()
+        branch_sims.append(branch_sim)
+
+    return branch_sims
+
+
 def single_run(sim, ind=0, reseed=True, noise=0.0, noisepar=None, keep_people=False, run_args=None, sim_args=None, verbose=None, do_run=True, **kwargs):
     '''
     Convenience function to perform a single simulation run. Mostly used for
@@ -1405,7 +2519,7 @@ def single_run(sim, ind=0, reseed=True, noise=0.0, noisepar=None, keep_people=Fa
 
 def multi_run(sim, n_runs=4, reseed=None, noise=0.0, noisepar=None, iterpars=None, 
               combine=False, keep_people=None, run_args=None, sim_args=None, par_args=None, 
-              do_run=True, parallel=True, n_cpus=None, verbose=None, retry='warn', **kwargs):
+              do_run=True, parallel=True, n_cpus=None, shared=False, reducer=None, verbose=None, retry='warn', **kwargs):
     '''
     For running multiple runs in parallel. If the first argument is a list of sims,
     exactly these will be run and most other arguments will be ignored.
@@ -1425,19 +2539,32 @@ def multi_run(sim, n_runs=4, reseed=None, noise=0.0, noisepar=None, iterpars=Non
         do_run      (bool)  : whether to actually run the sim (if not, just initialize it)
         parallel    (bool)  : whether to run in parallel using multiprocessing (else, just run in a loop)
         n_cpus      (int)   : the number of CPUs to run on (if blank, set automatically; otherwise, passed to par_args)
+        shared      (bool)  : if running a single sim in parallel, initialize it once and share its population between the processes rather than sending a copy to each one (see below)
+        reducer     (StreamingReducer) : if supplied, add each sim to the reducer as soon as it finishes, rather than returning the sims
         verbose     (int)   : detail to print
         retry       (str)   : what to do if default parallelizer fails: choices are 'warn' (default), 'die' (raise exception), or 'silent' (keep going)
         kwargs      (dict)  : also passed to the sim
 
     Returns:
         If combine is True, a single sim object with the combined results from each sim.
+        If a reducer is supplied, an empty list, since the sims are not kept.
         Otherwise, a list of sim objects (default).
 
-    **Example**::
+    With ``shared=True``, the people's arrays and contact layers are saved to
+    files once, and only the rest of the sim is pickled and sent to each process.
+    Each process maps the files into memory copy-on-write (see SharedPeople), so
+    the memory is shared between the processes except for the parts each one
+    modifies. All runs therefore use the same population, as they would if an
+    initialized sim were supplied.
+
+    **Examples**::
 
         import covasim as cv
         sim = cv.Sim()
         sims = cv.multi_run(sim, n_runs=6, noise=0.2)
+
+        sim = cv.Sim(pop_size=2e6)
+        sims = cv.multi_run(sim, n_runs=32, shared=True) # Create the population once
     '''
 
     # Handle inputs
@@ -1470,30 +2597,41 @@ def multi_run(sim, n_runs=4, reseed=None, noise=0.0, noisepar=None, iterpars=Non
         errormsg = f'Must be Sim object or list, not {type(sim)}'
         raise TypeError(errormsg)
 
+    # Optionally share the population between the processes, and send each one a copy of the sim without it
+    shared_people = None
+    func = single_run
+    if shared and parallel:
+        if isinstance(sim, cvs.Sim):
+            if not sim.initialized:
+                sim.initialize()
+            shared_people = SharedPeople(sim.people)
+            kwargs.update(sim=shared_people.make_shell(sim), shared_people=shared_people)
+            func = _shared_single_run
+        else:
+            warnmsg = 'Shared memory can only be used when running a single sim, not a list of sims; ignoring'
+            cvm.warn(warnmsg)
+
     # Actually run!
-    if parallel:
+    if reducer is not None: # Add each sim to the reducer as it finishes, in order
+        if combine:
+            errormsg = 'Sims reduced as they run cannot be combined; use either combine or reducer, not both'
+            raise ValueError(errormsg)
+        n_sims = len(list(iterkwargs.values())[0])
+        jobs = {s:sc.mergedicts({k:v[s] for k,v in iterkwargs.items()}, kwargs) for s in range(n_sims)}
+        try:
+            for _,sim in _iter_parallel(func, jobs, parallel=parallel, par_args=par_args, retry=retry):
+                reducer.add(sim)
+        finally:
+            if shared_people is not None:
+                shared_people.unlink()
+        sims = []
+
+    elif parallel:
         kw = dict(iterkwargs=iterkwargs, kwargs=kwargs, **par_args)
         try:
-            sims = sc.parallelize(single_run, **kw) # Run in parallel
+            sims = sc.parallelize(func, **kw) # Run in parallel
         except RuntimeError as E: # Handle if run outside of __main__ on Windows
-            if 'freeze_support' in E.args[0]: # For this error, add additional information
-                errormsg = '''
- Uh oh! It appears you are trying to run with multiprocessing on Windows outside
- of the __main__ block; please see https://docs.python.org/3/library/multiprocessing.html
- for more information. The correct syntax to use is e.g.
-
-     import covasim as cv
-     sim = cv.Sim()
-     msim = cv.MultiSim(sim)
-
-     if __name__ == '__main__':
-         msim.run()
-
-Alternatively, to run without multiprocessing, set parallel=False.
- '''
-                raise RuntimeError(errormsg) from E
-            else: # For all other runtime errors, raise the original exception
-                raise E
+            _raise_parallel_error(E)
         except pkl.PicklingError as E:
             parallelizer = par_args.get('parallelizer')
             if retry in ['warn', 'silent'] and parallelizer != 'multiprocess':
@@ -1501,11 +2639,14 @@ Alternatively, to run without multiprocessing, set parallel=False.
                     warnmsg = f'multi_run() failed with parallelizer={parallelizer}, trying more robust "multiprocess"...'
                     cvm.warn(warnmsg)
                 kw['parallelizer'] = 'multiprocess'
-                sims = sc.parallelize(single_run, **kw) # Try again to run in parallel
+                sims = sc.parallelize(func, **kw) # Try again to run in parallel
             else:
                 errormsg = 'Parallel run failed due to a pickling error; this is usually due to including a lambda function or other complex object'
                 raise pkl.PicklingError(errormsg) from E
-                
+        finally:
+            if shared_people is not None:
+                shared_people.unlink() # Remove the files of the shared population
+
     else: # Run in serial, not in parallel
         sims = []
         n_sims = len(list(iterkwargs.values())[0]) # Must have length >=1 and all entries must be the same length
@@ -206,6 +206,30 @@ class Options(sc.objdict):
         optdesc.numba_cache = 'Set Numba caching -- saves on compilation time; disabling is not recommended'
         options.numba_cache = bool(int(os.getenv('COVASIM_NUMBA_CACHE', 1)))
 
+        optdesc.fused_trans = 'Set whether to calculate transmission for all layers and variants in a single Numba kernel -- faster with many layers or variants, and gives identical results'
+        options.fused_trans = bool(int(os.getenv('COVASIM_FUSED_TRANS', 0)))
+
+        optdesc.counter_rng = 'Set whether to draw transmission random numbers from a counter-based generator keyed on the seed, day, and contact -- results differ from the default random stream, but do not depend on the number of Numba threads'
+        options.counter_rng = bool(int(os.getenv('COVASIM_COUNTER_RNG', 0)))
+
+        optdesc.sparse_viral_load = 'Set whether to only calculate viral loads for infectious people -- faster when prevalence is low, and gives identical results (finding the infectious people still scans the whole population once per timestep)'
+        options.sparse_viral_load = bool(int(os.getenv('COVASIM_SPARSE_VIRAL_LOAD', 0)))
+
+        optdesc.event_queue = 'Set whether to only check people who have a state transition scheduled for the current timestep, rather than everyone with a date defined -- faster for large populations, and gives identical results'
+        options.event_queue = bool(int(os.getenv('COVASIM_EVENT_QUEUE', 0)))
+
+        optdesc.compiled_prognoses = 'Set whether to determine the outcomes of newly infected people in a single Numba pass -- faster when there are many infections; the outcomes have the same distributions, but use a different random number stream'
+        options.compiled_prognoses = bool(int(os.getenv('COVASIM_COMPILED_PROGNOSES', 0)))
+
+        optdesc.vaccine_pool = 'Set whether vaccinate_num() and vaccinate_prob() keep a pool of the people eligible for a first dose between days, rather than checking everyone every day -- faster for large populations; selection uses the same probabilities, but a different random number stream'
+        options.vaccine_pool = bool(int(os.getenv('COVASIM_VACCINE_POOL', 0)))
+
+        optdesc.compact_people = 'Set whether to store the people in compact form (see people.compact()) once a sim has finished running -- saves memory if people are kept, e.g. multi_run(keep_people=True), but immunity levels are stored at lower precision'
+        options.compact_people = bool(int(os.getenv('COVASIM_COMPACT_PEOPLE', 0)))
+
+        optdesc.timings = 'Set whether to record how long each phase of each time step takes, stored in sim.timings (for profiling); when transmission is fused (see fused_trans and counter_rng), all layers and variants are reported as a single "transmission" phase'
+        options.timings = bool(int(os.getenv('COVASIM_TIMINGS', 0)))
+
         return optdesc, options
 
 
@@ -64,8 +64,10 @@ class Sim(cvb.BaseSim):
         self.initialized   = False    # Whether or not initialization is complete
         self.complete      = False    # Whether a simulation has completed running
         self.results_ready = False    # Whether or not results are ready
+        self.timings       = None     # How long each phase of each step took, if cv.options.timings is set
         self._default_ver  = version  # Default version of parameters used
         self._legacy_trans = None     # Whether to use the legacy transmission calculation method (slower; for reproducing earlier results)
+        self._nab_eff_table = None    # Lookup table for converting NAbs to immunity protection, if nab_eff_tol is set; see immunity.init_immunity()
         self._orig_pars    = None     # Store original parameters to optionally restore at the end of the simulation
 
         # Make default parameters (using values from parameters.py)
@@ -119,6 +121,8 @@ class Sim(cvb.BaseSim):
         self.init_analyzers()  # ...and the analyzers...
         self.validate_layer_pars() # Once the population is initialized, validate the layer parameters again
         self.set_seed() # Reset the random seed again so the random number stream is consistent
+        self.timings       = cvb.Timings(self.npts) # Only filled in if cv.options.timings is set
+        self._counter_key  = None # Only set if cv.options.counter_rng is set; see get_counter_key()
         self.initialized   = True
         self.complete      = False
         self.results_ready = False
@@ -347,19 +351,140 @@ class Sim(cvb.BaseSim):
         self.results['date'] = self.datevec
         self.results['t']    = self.tvec
         self.results_ready   = False
+        self.init_stocks()
 
         return
 
 
+    def init_stocks(self):
+        ''' Set the states counted by count_stocks() on each timestep, and whether they are counted by variant '''
+        self._stocks = sc.odict()
+        for key in cvd.result_stocks.keys():
+            self._stocks[key] = False
+        for key in cvd.result_stocks_by_variant.keys():
+            self._stocks[key] = True
+        return
+
+
+    def register_stock(self, key, label=None, by_variant=False, color=None):
+        '''
+        Count the number of people in a custom state on each timestep, in the same
+        way as the default stocks (e.g. "n_infectious"). The state must be a boolean
+        array on the People object (of shape (n_variants, pop_size) if by_variant is
+        True); the count is stored in ``sim.results[f'n_{key}']`` (or in
+        ``sim.results['variant']`` if by variant). Since registrations are reset
+        by ``sim.init_results()``, this is usually called after the sim is initialized,
+        e.g. in an intervention's ``initialize()`` method.
+
+        Args:
+            key (str): the name of the state on the People object
+            label (str): the label of the result (default: "Number {key}")
+            by_variant (bool): whether the state has a row for each variant
+            color (str): the color of the result
+
+        **Example**::
+
+            sim = cv.Sim()
+            sim.initialize()
+            sim.people.long_covid = sim.people.recovered.copy()
+            sim.register_stock('long_covid', label='Number with long COVID')
+            sim.run()
+            sim.results['n_long_covid'].plot()
+        '''
+        if not hasattr(self, '_stocks'):
+            errormsg = 'Results have not been initialized; please call sim.initialize() before registering stocks'
+            raise RuntimeError(errormsg)
+        if label is None:
+            label = f'Number {key}'
+        if by_variant:
+            results = self.results['variant']
+            kwargs = dict(n_variants=self['n_variants'])
+        else:
+            results = self.results
+            kwargs = {}
+        res_key = f'n_{key}'
+        if res_key not in results:
+            results[res_key] = cvb.Result(label, scale=True, color=color, npts=self.npts, **kwargs)
+        self._stocks[key] = by_variant
+        return
+
+
+    def count_stocks(self):
+        '''
+        Count the number of people in each state (e.g. infectious), and the population
+        immunity levels, and store them in the results for the current timestep. Called
+        by sim.step() after NAbs have been updated; custom states can be added via
+        ``sim.register_stock()``. See calc_stocks() for the calculation.
+        '''
+        t = self.t
+        stocks, pop_imm = self.calc_stocks()
+        for key,count in stocks.items():
+            if self._stocks[key]:
+                self.results['variant'][f'n_{key}'].values[:, t] = count
+            else:
+                self.results[f'n_{key}'].values[t] = count
+        for key,value in pop_imm.items():
+            self.results[key][t] = value
+        return
+
+
+    def calc_stocks(self, block=None):
+        '''
+        Calculate the number of people in each state, and the population immunity
+        levels, for the people in block (a slice of the population; by default,
+        everyone), e.g. for each replicate of an EnsembleSim.
+
+        The population immunity levels are calculated by copying the values needed
+        into a reusable buffer in a single compiled pass over each array, and then
+        summing, rather than by masking and indexing; this avoids creating several
+        temporary arrays the size of the population, but gives identical results.
+
+        Args:
+            block (slice): the people to include
+
+        Returns:
+            stocks (dict): the number of people in each state, as an array by variant for states counted by variant
+            pop_imm (dict): the population immunity results
+        '''
+        people = self.people
+        nv     = self['n_variants']
+        if block is None:
+            block = slice(None)
+
+        # Stocks: count_nonzero() is already the fastest way to count a boolean array, and faster than a compiled pass over all of them
+        stocks = {}
+        for key,by_variant in self._stocks.items():
+            state = people[key]
+            if by_variant:
+                stocks[key] = np.array([np.count_nonzero(state[variant, block]) for variant in range(nv)])
+            else:
+                stocks[key] = np.count_nonzero(state[block])
+
+        # Population immunity: equivalent to np.sum(nab[alive & (nab != 0)])/n_alive and np.nanmean(sus_imm)
+        nab = people.nab[block]
+        n = len(nab)
+        buffer = people.get_stock_buffer(nv*n)
+        n_alive, n_nabs = cvu.alive_nabs(nab, people.dead[block], buffer)
+        pop_imm = {'pop_nabs': np.sum(buffer[:n_nabs])/n_alive}
+        for key,imm in [['pop_protection', people.sus_imm], ['pop_symp_protection', people.symp_imm]]:
+            count = sum(cvu.nan_to_zero(imm[variant, block], buffer[variant*n:(variant+1)*n]) for variant in range(nv))
+            total = np.sum(buffer[:nv*n])
+            pop_imm[key] = (total/count).astype(total.dtype) # Round to the precision of the values, as np.nanmean() does
+
+        return stocks, pop_imm
+
+
     def load_population(self, popfile=None, init_people=True, **kwargs):
         '''
         Load the population dictionary from file -- typically done automatically
         as part of ``sim.initialize()``.
 
         Supports loading either saved population dictionaries (popdicts, file ending
-        .pop by convention), or ready-to-go People objects (file ending .ppl by
-        convention). Either object an also be supplied directly. Once a population
-        file is loaded, it is removed from the Sim object.
+        .pop by convention), ready-to-go People objects (file ending .ppl by
+        convention), or folders of People saved with ``people.save(columnar=True)``,
+        whose arrays are memory-mapped rather than read. Either object an also be
+        supplied directly. Once a population file is loaded, it is removed from
+        the Sim object.
 
         Args:
             popfile (str or obj): if a string, name of the file; otherwise, the popdict or People object to load
@@ -371,7 +496,10 @@ class Sim(cvb.BaseSim):
             popfile = self.popfile
 
         # Load the population into the popdict
-        self.popdict = cvm.load(popfile)
+        if cvb.is_columnar(popfile):
+            self.popdict = cvb.BasePeople.load(popfile)
+        else:
+            self.popdict = cvm.load(popfile)
         if self['verbose']:
             print(f'Loading population from {popfile}')
 
@@ -412,6 +540,7 @@ class Sim(cvb.BaseSim):
         # Actually make the people
         self.people = cvpop.make_people(self, reset=reset, verbose=verbose, **kwargs)
         self.people.initialize(sim_pars=self.pars) # Fully initialize the people
+        self.people._nab_eff_table = self._nab_eff_table # Constructed by init_immunity()
         self.reset_layer_pars(force=False) # Ensure that layer keys match the loaded population
         if init_infections:
             self.init_infections(verbose=verbose)
@@ -567,15 +696,28 @@ class Sim(cvb.BaseSim):
 
         t = self.t
 
+        # Time each phase of the step, if requested; the "if timings" checks are negligible otherwise
+        timings = self.timings if cvo.timings else None
+        if timings:
+            timings.start(t)
+
         # If it's the first timestep, infect people
         if t == 0:
             self.init_infections(verbose=False)
+            if timings:
+                timings.lap('init_infections')
 
         # Perform initial operations
         self.rescale() # Check if we need to rescale
+        if timings:
+            timings.lap('rescale')
         people   = self.people # Shorten this for later use
         people.update_states_pre(t=t) # Update the state of everyone and count the flows
+        if timings:
+            timings.lap('update_states_pre')
         contacts = people.update_contacts() # Compute new contacts
+        if timings:
+            timings.lap('update_contacts')
         hosp_max = people.count('severe')   > self['n_beds_hosp'] if self['n_beds_hosp'] is not None else False # Check for acute bed constraint
         icu_max  = people.count('critical') > self['n_beds_icu']  if self['n_beds_icu']  is not None else False # Check for ICU bed constraint
 
@@ -586,17 +728,25 @@ class Sim(cvb.BaseSim):
                 importation_inds = cvu.choose(max_n=self['pop_size'], n=n_imports)
                 people.infect(inds=importation_inds, hosp_max=hosp_max, icu_max=icu_max, layer='importation')
                 self.results['n_imports'][t] += n_imports
+        if timings:
+            timings.lap('imports')
 
         # Add variants
         for variant in self['variants']:
             if isinstance(variant, cvimm.variant):
                 variant.apply(self)
+        if timings:
+            timings.lap('variants')
 
         # Apply interventions
         for i,intervention in enumerate(self['interventions']):
             intervention(self) # If it's a function, call it directly
+            if timings:
+                timings.lap(f'intervention:{getattr(intervention, "label", None) or intervention.__name__}')
 
         people.update_states_post() # Check for state changes after interventions
+        if timings:
+            timings.lap('update_states_post')
 
         # Compute viral loads
         frac_time = cvd.default_float(self['viral_dist']['frac_time'])
@@ -605,7 +755,14 @@ class Sim(cvb.BaseSim):
         date_inf = people.date_infectious
         date_rec = people.date_recovered
         date_dead = people.date_dead
-        viral_load = cvu.compute_viral_load(t, date_inf, date_rec, date_dead, frac_time, load_ratio, high_cap)
+        if cvo.sparse_viral_load: # Only compute viral loads for infectious people, since everyone else has zero transmissibility regardless
+            inf_inds = cvu.true(people.infectious) # Still a scan of everyone, but a cheap one compared to computing the viral loads, or to the transmission step that follows
+            viral_load = people.get_viral_load_buffer()
+            viral_load[inf_inds] = cvu.compute_viral_load(t, date_inf[inf_inds], date_rec[inf_inds], date_dead[inf_inds], frac_time, load_ratio, high_cap)
+        else:
+            viral_load = cvu.compute_viral_load(t, date_inf, date_rec, date_dead, frac_time, load_ratio, high_cap)
+        if timings:
+            timings.lap('viral_load')
 
         # Shorten useful parameters
         nv = self['n_variants'] # Shorten number of variants
@@ -618,64 +775,70 @@ class Sim(cvb.BaseSim):
         prel_trans = people.rel_trans
         prel_sus   = people.rel_sus
 
-        # Iterate through n_variants to calculate infections
-        for variant in range(nv):
-
-            # Deal with variant parameters
-            asymp_factor = self['asymp_factor']
-            variant_label = self.pars['variant_map'][variant]
-            beta = cvd.default_float(self['beta'] * self['rel_beta'] * self['variant_pars'][variant_label]['rel_beta'])
-
-            inf_variant = people.infectious * (people.infectious_variant == variant)
-            if ~inf_variant.any():
-                continue
-
-            for lkey, layer in contacts.items():
-                p1 = layer['p1']
-                p2 = layer['p2']
-                betas = layer['beta']
-
-                # Compute relative transmission and susceptibility
-                sus_imm = people.sus_imm[variant,:]
-                iso_factor  = cvd.default_float(self['iso_factor'][lkey])
-                quar_factor = cvd.default_float(self['quar_factor'][lkey])
-                beta_layer  = cvd.default_float(self['beta_layer'][lkey])
-                rel_trans, rel_sus = cvu.compute_trans_sus(prel_trans, prel_sus, inf_variant, sus, beta_layer, viral_load, symp, iso, quar, asymp_factor, iso_factor, quar_factor, sus_imm)
-
-                # Calculate actual transmission
-                pairs = [[p1,p2]] if not self._legacy_trans else [[p1,p2], [p2,p1]] # Support slower legacy method of calculation, but by default skip this loop
-                for p1,p2 in pairs:
-                    source_inds, target_inds = cvu.compute_infections(beta, p1, p2, betas, rel_trans, rel_sus, legacy=self._legacy_trans)  # Calculate transmission!
-                    people.infect(inds=target_inds, hosp_max=hosp_max, icu_max=icu_max, source=source_inds, layer=lkey, variant=variant)  # Actually infect people
-
-        # Update counts for this time step: stocks
-        for key in cvd.result_stocks.keys():
-            self.results[f'n_{key}'][t] = people.count(key)
-        for key in cvd.result_stocks_by_variant.keys():
+        # Calculate infections for all variants and layers at once, unless legacy transmission, Poisson durations, or compiled prognoses (which use the Numba random stream) are used
+        counter = cvo.counter_rng and not self._legacy_trans # The counter-based generator doesn't use the random stream, so these are fine
+        numba_stream = cvo.compiled_prognoses or any(dur['dist'] == 'poisson' for dur in self['dur'].values()) # People.infect() draws from the Numba random stream
+        fused = counter or (cvo.fused_trans and not self._legacy_trans and not numba_stream)
+        if fused:
+            self.compute_infections_fused(viral_load, hosp_max, icu_max, counter=counter)
+            if timings:
+                timings.lap('transmission') # All layers and variants are calculated together
+        else:
+            # Iterate through n_variants to calculate infections
             for variant in range(nv):
-                self.results['variant'][f'n_{key}'][variant, t] = people.count_by_variant(key, variant)
 
-        # Update counts for this time step: flows
-        for key,count in people.flows.items():
-            self.results[key][t] += count
-        for key,count in people.flows_variant.items():
-            for variant in range(nv):
-                self.results['variant'][key][variant][t] += count[variant]
+                # Deal with variant parameters
+                asymp_factor = self['asymp_factor']
+                variant_label = self.pars['variant_map'][variant]
+                beta = cvd.default_float(self['beta'] * self['rel_beta'] * self['variant_pars'][variant_label]['rel_beta'])
+
+                inf_variant = people.infectious * (people.infectious_variant == variant)
+                if ~inf_variant.any():
+                    continue
+
+                for lkey, layer in contacts.items():
+                    p1 = layer['p1']
+                    p2 = layer['p2']
+                    betas = layer['beta']
+
+                    # Compute relative transmission and susceptibility
+                    sus_imm = people.sus_imm[variant,:]
+                    iso_factor  = cvd.default_float(self['iso_factor'][lkey])
+                    quar_factor = cvd.default_float(self['quar_factor'][lkey])
+                    beta_layer  = cvd.default_float(self['beta_layer'][lkey])
+                    rel_trans, rel_sus = cvu.compute_trans_sus(prel_trans, prel_sus, inf_variant, sus, beta_layer, viral_load, symp, iso, quar, asymp_factor, iso_factor, quar_factor, sus_imm)
+
+                    # Calculate actual transmission
+                    pairs = [[p1,p2]] if not self._legacy_trans else [[p1,p2], [p2,p1]] # Support slower legacy method of calculation, but by default skip this loop
+                    for p1,p2 in pairs:
+                        source_inds, target_inds = cvu.compute_infections(beta, p1, p2, betas, rel_trans, rel_sus, legacy=self._legacy_trans)  # Calculate transmission!
+                        people.infect(inds=target_inds, hosp_max=hosp_max, icu_max=icu_max, source=source_inds, layer=lkey, variant=variant)  # Actually infect people
+                    if timings:
+                        timings.lap(f'transmission:{lkey}:{variant_label}')
 
         # Update nab and immunity for this time step
         if self['use_waning']:
             has_nabs = cvu.true(people.peak_nab)
             if len(has_nabs):
                 cvimm.update_nab(people, inds=has_nabs)
+        if timings:
+            timings.lap('nab')
 
-        inds_alive = cvu.false(people.dead)
-        self.results['pop_nabs'][t]            = np.sum(people.nab[inds_alive[cvu.true(people.nab[inds_alive])]])/len(inds_alive)
-        self.results['pop_protection'][t]      = np.nanmean(people.sus_imm)
-        self.results['pop_symp_protection'][t] = np.nanmean(people.symp_imm)
+        # Update counts for this time step: flows, then stocks and population immunity
+        for key,count in people.flows.items():
+            self.results[key][t] += count
+        for key,count in people.flows_variant.items():
+            for variant in range(nv):
+                self.results['variant'][key][variant][t] += count[variant]
+        self.count_stocks()
+        if timings:
+            timings.lap('results')
 
         # Apply analyzers -- same syntax as interventions
         for i,analyzer in enumerate(self['analyzers']):
             analyzer(self)
+            if timings:
+                timings.lap(f'analyzer:{getattr(analyzer, "label", None) or analyzer.__name__}')
 
         # Tidy up
         self.t += 1
@@ -685,6 +848,81 @@ class Sim(cvb.BaseSim):
         return
 
 
+    def compute_infections_fused(self, viral_load, hosp_max=None, icu_max=None, counter=False):
+        '''
+        Calculate transmission for all variants and layers in a single Numba pass
+        over the concatenated edges of all layers, then infect the people. Used by
+        sim.step() if ``cv.options.fused_trans`` is set; gives identical results
+        to the default per-variant, per-layer loop.
+
+        If ``counter`` is True (used if ``cv.options.counter_rng`` is set), the
+        random numbers are instead drawn from a counter-based generator keyed on
+        the seed, day, and contact (see ``cvu.compute_infections_counter()``), so
+        the results don't depend on the number of threads, but differ from those
+        of the default loop.
+
+        Args:
+            viral_load (array): the viral load of each person on this timestep
+            hosp_max (bool): whether hospitals are at capacity
+            icu_max (bool): whether ICUs are at capacity
+            counter (bool): whether to use the counter-based generator
+        '''
+        people = self.people
+        lkeys = people.contacts.keys()
+        if not len(lkeys):
+            return
+
+        # Concatenate the edges and per-layer parameters
+        layers = [people.contacts[lkey] for lkey in lkeys]
+        p1 = np.concatenate([layer['p1'] for layer in layers])
+        p2 = np.concatenate([layer['p2'] for layer in layers])
+        layer_betas = np.concatenate([layer['beta'] for layer in layers])
+        layer_offsets = np.concatenate([[0], np.cumsum([len(layer) for layer in layers])]).astype(np.int64)
+        beta_layer  = np.array([self['beta_layer'][lkey]  for lkey in lkeys], dtype=cvd.default_float)
+        iso_factor  = np.array([self['iso_factor'][lkey]  for lkey in lkeys], dtype=cvd.default_float)
+        quar_factor = np.array([self['quar_factor'][lkey] for lkey in lkeys], dtype=cvd.default_float)
+        variant_labels = [self['variant_map'][variant] for variant in range(self['n_variants'])]
+        beta = np.array([cvd.default_float(self['beta'] * self['rel_beta'] * self['variant_pars'][label]['rel_beta']) for label in variant_labels])
+        asymp_factor = cvd.default_float(self['asymp_factor'])
+
+        # Calculate transmission!
+        args = (beta, p1, p2, layer_betas, layer_offsets, beta_layer, iso_factor, quar_factor, people.rel_trans, people.rel_sus, people.infectious,
+                people.infectious_variant, people.susceptible, viral_load, people.symptomatic, people.isolated, people.quarantined, asymp_factor, people.sus_imm)
+        if counter:
+            k0, k1 = self.get_counter_key()
+            source_inds, target_inds, counts = cvu.compute_infections_counter(k0, k1, np.int64(self.t), *args)
+        else:
+            source_inds, target_inds, counts = cvu.compute_infections_fused(*args)
+
+        # Infect people, in the same order as they would have been without fusing
+        counts = counts.reshape((len(variant_labels), len(lkeys)))
+        end = 0
+        for variant in range(len(variant_labels)):
+            for l,lkey in enumerate(lkeys):
+                start, end = end, end + counts[variant, l]
+                if end > start:
+                    people.infect(inds=target_inds[start:end], hosp_max=hosp_max, icu_max=icu_max, source=source_inds[start:end], layer=lkey, variant=variant)
+
+        return
+
+
+    def get_counter_key(self):
+        '''
+        Get the key for the counter-based generator used by compute_infections_fused(),
+        as two 32-bit integers: from the random seed if it's set, otherwise drawn
+        from the random stream once and stored for the rest of the sim.
+        '''
+        key = getattr(self, '_counter_key', None)
+        if key is None:
+            seed = self['rand_seed']
+            if seed is None:
+                seed = np.random.randint(np.iinfo(np.int64).max, dtype=np.int64)
+            seed = int(seed)
+            key = (np.uint64(seed & 0xFFFFFFFF), np.uint64((seed >> 32) & 0xFFFFFFFF))
+            self._counter_key = key
+        return key
+
+
     def run(self, do_plot=False, until=None, restore_pars=True, reset_seed=True, verbose=None):
         '''
         Run the simulation.
@@ -797,6 +1035,8 @@ class Sim(cvb.BaseSim):
         # Perform calculations on results
         self.compute_results(verbose=verbose) # Calculate the rest of the results
         self.results = sc.objdict(self.results) # Convert results to a odicts/objdict to allow e.g. sim.results.diagnoses
+        if cvo.compact_people and self.people is not None:
+            self.people.compact()
 
         if restore_pars and self._orig_pars:
             preserved = ['analyzers', 'interventions']
@@ -954,7 +1194,7 @@ class Sim(cvb.BaseSim):
         elif method in ['infectious', 'outcome']:
 
             # Store a mapping from each source to their date
-            source_dates = {}
+            source_dates = np.full(len(self.people), -1, dtype=np.int64)
 
             for t in self.tvec:
 
@@ -968,18 +1208,13 @@ class Sim(cvb.BaseSim):
                 sources[t] = len(inds)
 
                 # Create the mapping from sources to dates
-                for ind in inds:
-                    source_dates[ind] = t
+                source_dates[inds] = t
 
-            # Targets are hard -- loop over the transmission tree
-            for transdict in self.people.infection_log:
-                source = transdict['source']
-                if source is not None and source in source_dates: # Skip seed infections and people with e.g. recovery after the end of the sim
-                    source_date = source_dates[source]
-                    targets[source_date] += 1
-
-                # for ind in inds:
-                #     targets[t] += len(self.people.transtree.targets[ind])
+            # Targets are hard -- use the transmission tree
+            log = self.people.infection_log
+            target_dates = source_dates[log.source[log.has_source]] # Skip seed infections
+            target_dates = target_dates[target_dates >= 0] # Skip people with e.g. recovery after the end of the sim
+            targets += np.bincount(target_dates, minlength=self.npts)
 
             # Populate the array -- to avoid divide-by-zero, skip indices that are 0
             r_eff = np.divide(targets, sources, out=np.full(self.npts, np.nan), where=sources > 0)
@@ -1012,28 +1247,22 @@ class Sim(cvb.BaseSim):
             gen_time (dict): the generation time results
         '''
 
-        intervals1 = np.zeros(len(self.people))
-        intervals2 = np.zeros(len(self.people))
-        pos1 = 0
-        pos2 = 0
-        date_exposed = self.people.date_exposed
-        date_symptomatic = self.people.date_symptomatic
-
-        for infection in self.people.infection_log:
-            if infection['source'] is not None:
-                source_ind = infection['source']
-                target_ind = infection['target']
-                intervals1[pos1] = date_exposed[target_ind] - date_exposed[source_ind]
-                pos1 += 1
-                if np.isfinite(date_symptomatic[source_ind]) and np.isfinite(date_symptomatic[target_ind]):
-                    intervals2[pos2] = date_symptomatic[target_ind] - date_symptomatic[source_ind]
-                    pos2 += 1
+        log = self.people.infection_log
+        has_source = log.has_source # Skip seed infections
+        source_inds = log.source[has_source]
+        target_inds = log.target[has_source]
+        date_exposed = np.array(self.people.date_exposed, dtype=np.float64)
+        date_symptomatic = np.array(self.people.date_symptomatic, dtype=np.float64)
+
+        intervals1 = date_exposed[target_inds] - date_exposed[source_inds]
+        intervals2 = date_symptomatic[target_inds] - date_symptomatic[source_inds]
+        intervals2 = intervals2[np.isfinite(intervals2)] # Only people for whom both source and target were symptomatic
 
         self.results['gen_time'] = {
-                'true':         np.mean(intervals1[:pos1]),
-                'true_std':     np.std(intervals1[:pos1]),
-                'clinical':     np.mean(intervals2[:pos2]),
-                'clinical_std': np.std(intervals2[:pos2])}
+                'true':         np.mean(intervals1),
+                'true_std':     np.std(intervals1),
+                'clinical':     np.mean(intervals2),
+                'clinical_std': np.std(intervals2)}
         return self.results['gen_time']
 
 
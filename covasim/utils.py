@@ -128,6 +128,314 @@ def compute_infections(beta,     p1,        p2,       layer_betas,  rel_trans,
     return slist, tlist
 
 
+@nb.njit(                   (nbfloat[:], nbint[:], nbint[:], nbfloat[:],  nb.int64[:],   nbfloat[:], nbfloat[:], nbfloat[:],  nbfloat[:], nbfloat[:], nbbool[:], nbfloat[:],  nbbool[:], nbfloat[:], nbbool[:], nbbool[:], nbbool[:], nbfloat,      nbfloat[:,:]), cache=cache)
+def compute_infections_fused(beta,       p1,       p2,       layer_betas, layer_offsets, beta_layer, iso_factor, quar_factor, rel_trans,  rel_sus,    inf,       inf_variant, sus,       viral_load, symp,      iso,       quar,      asymp_factor, sus_imm): # pragma: no cover
+    '''
+    Compute who infects whom for all variants and layers in a single pass.
+
+    Equivalent to calling compute_trans_sus() and compute_infections() for each
+    variant and layer in turn, and infecting the resulting targets before moving
+    on to the next one, but without allocating any population-sized arrays. Random
+    numbers are drawn in the same order, so results are identical for the same seed.
+
+    Args:
+        beta: overall transmissibility for each variant
+        p1: person 1 for the edges of all layers, concatenated
+        p2: person 2 for the edges of all layers, concatenated
+        layer_betas: per-contact transmissibilities, concatenated
+        layer_offsets: the start of each layer in the edge arrays, plus the total number of edges
+        beta_layer: the transmissibility of each layer
+        iso_factor: the isolation factor of each layer
+        quar_factor: the quarantine factor of each layer
+        rel_trans: the relative transmissibility of each person
+        rel_sus: the relative susceptibility of each person
+        inf: whether each person is infectious
+        inf_variant: the variant each person is infectious with
+        sus: whether each person is susceptible
+        viral_load: the viral load of each person
+        symp: whether each person is symptomatic
+        iso: whether each person is isolated
+        quar: whether each person is quarantined
+        asymp_factor: the asymptomatic transmissibility factor
+        sus_imm: the immunity of each person to each variant
+
+    Returns:
+        slist: source indices
+        tlist: target indices
+        counts: the number of infections for each variant and layer, in that order
+    '''
+    n_variants = len(beta)
+    n_layers   = len(layer_offsets) - 1
+    one        = nbfloat(1.0)
+
+    # First pass over all edges: find the candidate (edge, direction) pairs, i.e. with an infectious source and a susceptible target
+    n_cands = 0
+    for e in range(len(p1)): # Count them first to avoid resizing the array in the loop, which is slow
+        n_cands += (inf[p1[e]] and sus[p2[e]]) + (inf[p2[e]] and sus[p1[e]])
+    cands = np.empty(n_cands, dtype=np.int64) # Stores 2*edge + direction
+    cand_offsets = np.zeros(n_layers+1, dtype=np.int64)
+    c = 0
+    for l in range(n_layers):
+        for direction in range(2): # Loop over contacts in both directions (i.e., targets become sources)
+            for e in range(layer_offsets[l], layer_offsets[l+1]):
+                source = p1[e] if direction == 0 else p2[e]
+                target = p2[e] if direction == 0 else p1[e]
+                if inf[source] and sus[target]:
+                    cands[c] = 2*e + direction
+                    c += 1
+        cand_offsets[l+1] = c
+
+    # Second pass over the candidates: compute the infections for each variant and layer in turn
+    infected = np.zeros(len(rel_trans), dtype=np.bool_) # People infected by an earlier variant or layer, who are no longer susceptible
+    counts   = np.zeros(n_variants*n_layers, dtype=np.int64)
+    slist    = np.empty(n_cands, dtype=nbint) # Each candidate can only transmit once, since its source has only one variant
+    tlist    = np.empty(n_cands, dtype=nbint)
+    n = 0
+    for v in range(n_variants):
+        for l in range(n_layers):
+            start = n
+            for c in range(cand_offsets[l], cand_offsets[l+1]):
+                e = cands[c] // 2
+                source = p1[e] if cands[c] % 2 == 0 else p2[e]
+                target = p2[e] if cands[c] % 2 == 0 else p1[e]
+                if inf_variant[source] != v or infected[target]:
+                    continue
+
+                # Calculate the source's transmissibility and the target's susceptibility, in the same order of operations as compute_trans_sus()
+                f_asymp = one if symp[source] else asymp_factor
+                f_iso   = iso_factor[l]  if iso[source]  else one
+                f_quar  = quar_factor[l] if quar[source] else one
+                source_trans = rel_trans[source] * f_quar * f_asymp * f_iso * beta_layer[l] * viral_load[source]
+                f_quar = quar_factor[l] if quar[target] else one
+                target_sus = rel_sus[target] * f_quar * (one - sus_imm[v, target])
+
+                # Compute the actual infection!
+                b = beta[v] * layer_betas[e] * source_trans * target_sus
+                if b != 0 and np.random.random() < b:
+                    slist[n] = source
+                    tlist[n] = target
+                    n += 1
+
+            infected[tlist[start:n]] = True
+            counts[v*n_layers + l] = n - start
+
+    return slist[:n], tlist[:n], counts
+
+
+# Constants for the Philox4x32-10 counter-based generator (Salmon et al., 2011)
+philox_m0 = np.uint64(0xD2511F53)
+philox_m1 = np.uint64(0xCD9E8D57)
+philox_w0 = np.uint64(0x9E3779B9)
+philox_w1 = np.uint64(0xBB67AE85)
+philox_mask = np.uint64(0xFFFFFFFF)
+
+
+@nb.njit((nb.uint64, nb.uint64, nb.uint64, nb.uint64, nb.uint64, nb.uint64), cache=cache)
+def philox(c0, c1, c2, c3, k0, k1): # pragma: no cover
+    '''
+    The Philox4x32-10 counter-based random number generator: returns four random
+    32-bit integers that are a pure function of the counter (c0, c1, c2, c3) and
+    the key (k0, k1), each of which are 32-bit integers. Unlike a random stream,
+    any number can be found without finding the previous ones, so the results
+    do not depend on the order in which they are found, e.g. by different threads.
+    '''
+    for r in range(10):
+        prod0 = philox_m0 * c0
+        prod1 = philox_m1 * c2
+        c0, c1, c2, c3 = ((prod1 >> np.uint64(32)) ^ c1 ^ k0), (prod1 & philox_mask), ((prod0 >> np.uint64(32)) ^ c3 ^ k1), (prod0 & philox_mask)
+        k0 = (k0 + philox_w0) & philox_mask
+        k1 = (k1 + philox_w1) & philox_mask
+    return c0, c1, c2, c3
+
+
+@nb.njit((nb.uint64, nb.uint64, nb.uint64, nb.uint64, nb.uint64, nb.uint64), cache=cache)
+def philox_random(c0, c1, c2, c3, k0, k1): # pragma: no cover
+    ''' A uniform random number in [0, 1) with 53 bits of precision, from the first two outputs of philox() '''
+    x0, x1, x2, x3 = philox(c0, c1, c2, c3, k0, k1)
+    return ((x0 >> np.uint64(5)) * 67108864.0 + (x1 >> np.uint64(6))) / 9007199254740992.0
+
+
+@nb.njit(                     (nb.uint64, nb.uint64, nb.int64, nbfloat[:], nbint[:], nbint[:], nbfloat[:],  nb.int64[:],   nbfloat[:], nbfloat[:], nbfloat[:],  nbfloat[:], nbfloat[:], nbbool[:], nbfloat[:],  nbbool[:], nbfloat[:], nbbool[:], nbbool[:], nbbool[:], nbfloat,      nbfloat[:,:]), cache=cache, parallel=safe_parallel)
+def compute_infections_counter(k0,        k1,        t,        beta,       p1,       p2,       layer_betas, layer_offsets, beta_layer, iso_factor, quar_factor, rel_trans,  rel_sus,    inf,       inf_variant, sus,       viral_load, symp,      iso,       quar,      asymp_factor, sus_imm): # pragma: no cover
+    '''
+    Compute who infects whom for all variants and layers, like compute_infections_fused(),
+    but with the random number for each contact drawn from a counter-based generator
+    (see philox()), keyed on the seed (k0, k1), and with the day, the layer, the
+    index of the edge within the layer, and the direction of transmission as the
+    counter. Since each random number doesn't depend on any of the others, the
+    edges are processed in parallel (if numba_parallel is "safe" or "full"),
+    and the results are identical for any number of threads. However, they are
+    not the same as those of compute_infections_fused(), which uses the random stream.
+
+    Args:
+        k0: the low 32 bits of the seed
+        k1: the high 32 bits of the seed
+        t: the current day
+        others: as for compute_infections_fused()
+
+    Returns:
+        slist: source indices
+        tlist: target indices
+        counts: the number of infections for each variant and layer, in that order
+    '''
+    n_edges    = len(p1)
+    n_variants = len(beta)
+    n_layers   = len(layer_offsets) - 1
+    one        = nbfloat(1.0)
+
+    # First pass over all edges, in parallel: draw whether each infectious source would infect its susceptible contact
+    hits = np.zeros((2, n_edges), dtype=np.bool_) # By direction, then edge
+    for l in range(n_layers):
+        start = layer_offsets[l]
+        for i in nb.prange(layer_offsets[l+1] - start):
+            e = start + i
+            for direction in range(2): # Loop over contacts in both directions (i.e., targets become sources)
+                source = p1[e] if direction == 0 else p2[e]
+                target = p2[e] if direction == 0 else p1[e]
+                if inf[source] and sus[target]:
+
+                    # Calculate the source's transmissibility and the target's susceptibility, as for compute_infections_fused()
+                    v = int(inf_variant[source])
+                    f_asymp = one if symp[source] else asymp_factor
+                    f_iso   = iso_factor[l]  if iso[source]  else one
+                    f_quar  = quar_factor[l] if quar[source] else one
+                    source_trans = rel_trans[source] * f_quar * f_asymp * f_iso * beta_layer[l] * viral_load[source]
+                    f_quar = quar_factor[l] if quar[target] else one
+                    target_sus = rel_sus[target] * f_quar * (one - sus_imm[v, target])
+                    b = beta[v] * layer_betas[e] * source_trans * target_sus
+                    if b != 0:
+                        hits[direction, e] = philox_random(np.uint64(i), np.uint64(t), np.uint64(l), np.uint64(direction), k0, k1) < b
+
+    # Second pass over the hits, in order: infect the targets for each variant and layer in turn, skipping people infected by an earlier one
+    infected = np.zeros(len(rel_trans), dtype=np.bool_)
+    counts   = np.zeros(n_variants*n_layers, dtype=np.int64)
+    n_hits   = np.count_nonzero(hits)
+    slist    = np.empty(n_hits, dtype=cvd.default_int)
+    tlist    = np.empty(n_hits, dtype=cvd.default_int)
+    hit_edges = [] # The edges with a hit, for each layer and direction
+    for l in range(n_layers):
+        for direction in range(2):
+            hit_edges.append(np.nonzero(hits[direction, layer_offsets[l]:layer_offsets[l+1]])[0] + layer_offsets[l])
+    n = 0
+    for v in range(n_variants):
+        for l in range(n_layers):
+            start = n
+            for direction in range(2):
+                for e in hit_edges[2*l + direction]:
+                    source = p1[e] if direction == 0 else p2[e]
+                    target = p2[e] if direction == 0 else p1[e]
+                    if inf_variant[source] == v and not infected[target]:
+                        slist[n] = source
+                        tlist[n] = target
+                        n += 1
+            infected[tlist[start:n]] = True
+            counts[v*n_layers + l] = n - start
+
+    return slist[:n], tlist[:n], counts
+
+
+@nb.njit(           (nb.float64[:], nb.int64, nb.int64, nb.float64[:], nb.float64[:,:], nb.float64[:,:]), cache=cache, parallel=safe_parallel)
+def interpolate_VE(nab,            shift,    k_min,    grid,           values,          slopes): # pragma: no cover
+    '''
+    Convert NAb levels to immunity protection factors using a lookup table; see
+    immunity.make_VE_table(). The table entry is found directly from the bits of
+    each NAb level (i.e. its exponent and the leading bits of its mantissa), so
+    each octave is divided into equal-width bins, and the values are linearly
+    interpolated within each bin. People without NAbs have zero protection. Values
+    that are outside the range of the table are returned as NaN, to be calculated
+    exactly instead.
+
+    Args:
+        nab: effective NAb levels
+        shift: the number of bits to discard to find the table entry
+        k_min: the table entry corresponding to the smallest NAb level
+        grid: the NAb levels at the start of each bin
+        values: the protection factors at each grid point, one row per axis of protection
+        slopes: the slope of the protection factors in each bin
+
+    Returns:
+        output: the protection factors, one row per axis of protection
+    '''
+    n_axes, n_bins = slopes.shape
+    bits = nab.view(np.int64)
+    output = np.zeros((n_axes, len(nab)))
+    for i in nb.prange(len(nab)):
+        if nab[i] != 0:
+            k = (bits[i] >> shift) - k_min # Also negative for negative numbers
+            if k >= 0 and k < n_bins and not np.isnan(nab[i]):
+                d = nab[i] - grid[k]
+                for a in range(n_axes):
+                    output[a,i] = values[a,k] + slopes[a,k]*d
+            else:
+                for a in range(n_axes):
+                    output[a,i] = np.nan
+    return output
+
+
+@nb.njit(         (nbint, nb.int64[:], nbfloat[:], nbfloat[:], nbint[:],    nb.float64[:]), cache=cache, parallel=safe_parallel)
+def update_nab(t,     inds,        nab,        peak_nab,   t_nab_event, nab_kin): # pragma: no cover
+    """
+    Numba for immunity.update_nab(): step the NAb levels of the people with the
+    given (unique) indices forward in time, in place, according to the NAb
+    kinetics, then clamp them between 0 and the peak NAb level.
+
+    Args:
+        t: the current timestep
+        inds: indices of people to update
+        nab: the NAb level of each person (modified in place)
+        peak_nab: the peak NAb level of each person
+        t_nab_event: the timestep of each person's last NAb event
+        nab_kin: the change in NAb level relative to the peak, by time since the NAb event
+
+    Returns:
+        changed: whether the NAb level of each of these people changed
+    """
+    changed = np.zeros(len(inds), dtype=np.bool_)
+    for j in nb.prange(len(inds)):
+        i = inds[j]
+        prev = nab[i]
+        nab[i] += nab_kin[t - t_nab_event[i]]*peak_nab[i]
+        if nab[i] < 0: # Make sure NAbs don't drop below 0
+            nab[i] = 0
+        if nab[i] > peak_nab[i]: # Make sure NAbs don't exceed the peak
+            nab[i] = peak_nab[i]
+        changed[j] = nab[i] != prev
+    return changed
+
+
+@nb.njit(              (nbint, nb.int64[:], nbfloat[:], nbfloat[:], nbint[:],    nbfloat, nb.float64[:], nb.float64[:], nb.float64), cache=cache)
+def update_peak_nab(t,     inds,        nab,        peak_nab,   t_nab_event, boost,   init_nab,      scale,         norm): # pragma: no cover
+    """
+    Numba for immunity.update_peak_nab(): update the peak NAb levels of the people
+    with the given indices in place. People who already have NAbs have their peak
+    boosted; the others are assigned the initial levels given, in order, optionally
+    scaled by symptom severity.
+
+    Args:
+        t: the current timestep, stored as the time of the NAb event
+        inds: indices of people with a NAb event
+        nab: the NAb level of each person
+        peak_nab: the peak NAb level of each person (modified in place)
+        t_nab_event: the timestep of each person's last NAb event (modified in place)
+        boost: the factor to boost the peak NAbs of people who already have NAbs
+        init_nab: the initial NAb level of each person without NAbs, in order
+        scale: if not empty, the factor to scale each initial NAb level by, in order
+        norm: the normalization factor applied along with the scale factors
+    """
+    k = 0
+    for i in inds:
+        if nab[i] > 0:
+            peak_nab[i] *= boost
+        else:
+            if len(scale):
+                peak_nab[i] = init_nab[k]*scale[k]*norm
+            else:
+                peak_nab[i] = init_nab[k]
+            k += 1
+        t_nab_event[i] = t
+    return
+
+
 @nb.njit((nbint[:], nbint[:], nb.int64[:]), cache=cache)
 def find_contacts(p1, p2, inds): # pragma: no cover
     """
@@ -147,10 +455,241 @@ def find_contacts(p1, p2, inds): # pragma: no cover
     return pairing_partners
 
 
+@nb.njit(                (nb.int64[:], nb.float64[:], nb.int64, nb.int64, nbbool[:], nbbool[:], nbbool), cache=cache)
+def select_sequence(sequence, probs,         start,    n,        dead,      vaccinated, booster): # pragma: no cover
+    """
+    Numba for vaccinate_num.select_people(): walk along the vaccination sequence,
+    from the position start, until n people have been chosen for their first dose.
+    Each eligible person is chosen with their probability (if probs is empty, all
+    are chosen). Dead people, and vaccinated people unless it's a booster, can
+    never be eligible again, so the returned position for the next walk skips
+    over any of them at the start.
+
+    Args:
+        sequence: the people, in order of priority
+        probs: the probability of choosing each person in the sequence, or empty if all are 1
+        start: the position in the sequence to start from
+        n: the number of people to choose
+        dead: whether each person is dead
+        vaccinated: whether each person is vaccinated
+        booster: whether only vaccinated people are eligible
+
+    Returns:
+        inds: the people chosen, in order of priority
+        start: the position to start from next time
+    """
+    inds = np.empty(n, dtype=np.int64)
+    k = 0
+    pos = start
+    n_seq = len(sequence)
+    all_probs = len(probs) > 0
+    while pos < n_seq and k < n:
+        i = sequence[pos]
+        if dead[i] or (vaccinated[i] and not booster):
+            if pos == start: # Never eligible again, so skip over them next time
+                start += 1
+        elif vaccinated[i] or not booster:
+            if not all_probs or np.random.random() < probs[pos]:
+                inds[k] = i
+                k += 1
+        pos += 1
+    return inds[:k], start
+
+
+@nb.njit((nbint[:], nbint[:], nbbool[:]), cache=cache)
+def find_partners(p1, p2, is_ind): # pragma: no cover
+    '''
+    Numba for Layer.find_contacts()
+
+    Like find_contacts(), but the people are specified by a boolean array (which
+    may be shorter than the population, if the people with the highest indices are
+    not included), and the partners are returned as an array, including duplicates.
+    This avoids the set lookups, and is used when the layer's adjacency index has
+    not been built.
+    '''
+    n = len(is_ind)
+    count = 0
+    for e in range(len(p1)):
+        count += (p1[e] < n and is_ind[p1[e]]) + (p2[e] < n and is_ind[p2[e]])
+    partners = np.empty(count, dtype=nbint)
+    count = 0
+    for e in range(len(p1)):
+        if p1[e] < n and is_ind[p1[e]]:
+            partners[count] = p2[e]
+            count += 1
+        if p2[e] < n and is_ind[p2[e]]:
+            partners[count] = p1[e]
+            count += 1
+    return partners
+
+
+@nb.njit((nbint[:], nbint[:], nb.int64), cache=cache)
+def make_csr(p1, p2, n): # pragma: no cover
+    '''
+    Numba for Layer.build_index()
+
+    Builds a compressed sparse row index of an undirected edgelist over n people,
+    via a counting sort. The neighbors of person i are neighbors[offsets[i]:offsets[i+1]],
+    and edges gives the index of the corresponding edge in p1 and p2. Each person's
+    neighbors are listed first for the edges where they are p1, then for the edges
+    where they are p2, each in order of edge index.
+    '''
+    n_edges = len(p1)
+    offsets = np.zeros(n+1, dtype=np.int64)
+    for e in range(n_edges):
+        offsets[p1[e]+1] += 1
+        offsets[p2[e]+1] += 1
+    for i in range(n):
+        offsets[i+1] += offsets[i]
+    pos = offsets[:-1].copy()
+    neighbors = np.empty(2*n_edges, dtype=nbint)
+    edges = np.empty(2*n_edges, dtype=np.int64)
+    for e in range(n_edges):
+        source = p1[e]
+        neighbors[pos[source]] = p2[e]
+        edges[pos[source]] = e
+        pos[source] += 1
+    for e in range(n_edges):
+        source = p2[e]
+        neighbors[pos[source]] = p1[e]
+        edges[pos[source]] = e
+        pos[source] += 1
+    return offsets, neighbors, edges
+
+
+@nb.njit((nb.int64[:], nbint[:], nb.int64[:], nb.int64[:]), cache=cache)
+def csr_neighbors(offsets, neighbors, edges, inds): # pragma: no cover
+    '''
+    Numba for Layer.neighbors()
+
+    Returns the neighbors of each person in inds in turn, and the corresponding
+    edge indices, from an index created by make_csr(). Indices outside the index
+    have no neighbors.
+    '''
+    n = len(offsets) - 1
+    total = 0
+    for i in inds:
+        if i >= 0 and i < n:
+            total += offsets[i+1] - offsets[i]
+    out_neighbors = np.empty(total, dtype=nbint)
+    out_edges = np.empty(total, dtype=np.int64)
+    count = 0
+    for i in inds:
+        if i >= 0 and i < n:
+            for j in range(offsets[i], offsets[i+1]):
+                out_neighbors[count] = neighbors[j]
+                out_edges[count] = edges[j]
+                count += 1
+    return out_neighbors, out_edges
+
+
+@nb.njit((nbint, nbfloat), cache=cache)
+def make_clusters(pop_size, cluster_size): # pragma: no cover
+    '''
+    Numba for population.make_microstructured_contacts()
+
+    Assigns consecutive people to clusters of Poisson-distributed size, and returns
+    the edgelist connecting each pair of people within each cluster. The cluster
+    sizes are drawn one at a time, as with successive calls to poisson(), so that
+    the random number stream is consumed in the same way.
+    '''
+
+    # Draw the cluster sizes until everyone has been assigned
+    sizes = np.empty(pop_size, dtype=np.int64)
+    n_clusters = 0
+    n_remaining = pop_size
+    n_edges = 0
+    while n_remaining > 0:
+        this_cluster = min(np.random.poisson(cluster_size), n_remaining)
+        if this_cluster > 0: # Empty clusters have no contacts, so don't need to be stored
+            sizes[n_clusters] = this_cluster
+            n_clusters += 1
+            n_edges += this_cluster*(this_cluster-1)//2
+            n_remaining -= this_cluster
+
+    # The targets for each source were previously collected in a Python set, which
+    # lists integers by their value modulo the size of its hash table. To keep
+    # populations reproducible, they are listed in the same order, so find the size
+    # of the table after each number of insertions, as in CPython's setobject.c
+    max_size = sizes[:n_clusters].max() if n_clusters else 0
+    table_sizes = np.empty(max(max_size, 1), dtype=np.int64)
+    table_size = 8
+    table_sizes[0] = table_size
+    for fill in range(1, max_size):
+        if fill*5 >= (table_size-1)*3: # The table is resized when it is 60% full...
+            min_size = fill*2 if fill > 50000 else fill*4 # ...to the smallest power of 2 larger than this
+            table_size = 8
+            while table_size <= min_size:
+                table_size *= 2
+        table_sizes[fill] = table_size
+
+    # Add symmetric pairwise contacts in each cluster
+    p1 = np.empty(n_edges, dtype=nbint)
+    p2 = np.empty(n_edges, dtype=nbint)
+    start = 0
+    count = 0
+    for c in range(n_clusters):
+        end = start + sizes[c]
+        for source in range(start, end):
+            n_targets = end - source - 1
+            if n_targets > 0:
+                table_size = table_sizes[n_targets]
+                n_before_wrap = table_size - ((source+1) % table_size)
+                split = source + 1 + min(n_before_wrap, n_targets)
+                for target in range(split, end): # Targets that wrap around to the start of the table come first
+                    p1[count] = source
+                    p2[count] = target
+                    count += 1
+                for target in range(source+1, split):
+                    p1[count] = source
+                    p2[count] = target
+                    count += 1
+        start = end
+
+    return p1, p2
+
+
+@nb.njit((nbfloat[:], nbbool[:], nbfloat[:]), cache=cache)
+def alive_nabs(nab, dead, out): # pragma: no cover
+    '''
+    Numba for sim.calc_stocks()
+
+    Copies the nonzero NAb levels of people who are alive into out, in order, and
+    returns the number of people alive and the number of NAb levels copied.
+    '''
+    n_alive = 0
+    n_nabs = 0
+    for i in range(len(nab)):
+        if not dead[i]:
+            n_alive += 1
+            if nab[i] != 0:
+                out[n_nabs] = nab[i]
+                n_nabs += 1
+    return n_alive, n_nabs
+
+
+@nb.njit((nbfloat[:], nbfloat[:]), cache=cache)
+def nan_to_zero(arr, out): # pragma: no cover
+    '''
+    Numba for sim.calc_stocks()
+
+    Copies arr into out with NaNs replaced by zero, and returns the number of
+    non-NaN entries. Summing out with np.sum() gives the same value as np.nanmean()
+    uses, without its temporary arrays.
+    '''
+    count = 0
+    for i in range(len(arr)):
+        val = arr[i]
+        isnan = val != val
+        out[i] = 0 if isnan else val
+        count += not isnan
+    return count
+
+
 
 #%% Sampling and seed methods
 
-__all__ += ['sample', 'get_pdf', 'set_seed']
+__all__ += ['sample', 'Sampler', 'make_sampler', 'register_sampler', 'compile_dist', 'get_pdf', 'set_seed', 'get_rng_state', 'set_rng_state']
 
 
 def sample(dist=None, par1=None, par2=None, size=None, **kwargs):
@@ -167,6 +706,10 @@ def sample(dist=None, par1=None, par2=None, size=None, **kwargs):
     - 'poisson'       : Poisson distribution with rate=par1 (par2 is not used); mean and variance are equal to par1
     - 'neg_binomial'  : negative binomial distribution with mean=par1 and k=par2; converges to Poisson with k=∞
 
+    Custom distributions can be added with cv.register_sampler(). To draw samples
+    from the same distribution repeatedly, use cv.make_sampler() instead, which
+    precomputes the distribution's parameters.
+
     Args:
         dist (str):   the distribution to sample from
         par1 (float): the "main" distribution parameter (e.g. mean)
@@ -196,45 +739,365 @@ def sample(dist=None, par1=None, par2=None, size=None, **kwargs):
         the mean.
     '''
 
-    # Some of these have aliases, but these are the "official" names
-    choices = [
-        'uniform',
-        'normal',
-        'normal_pos',
-        'normal_int',
-        'lognormal',
-        'lognormal_int',
-        'poisson',
-        'neg_binomial',
-    ]
+    return make_sampler(dist=dist, par1=par1, par2=par2, **kwargs).draw(size)
+
+
+class Sampler(sc.prettyobj):
+    '''
+    A distribution with its parameters precomputed, for drawing samples repeatedly.
+    Samplers are usually created by make_sampler() (e.g. for each duration in
+    ``sim['dur']``, by ``people.get_sampler()``), and give identical samples to
+    sample() for the same distribution.
+
+    To add a new distribution, subclass this class and implement sample() (and
+    optionally initialize(), to precompute parameters), then register it with
+    register_sampler().
+
+    Args:
+        dist (str): the name of the distribution
+        par1 (float): the "main" distribution parameter (e.g. mean)
+        par2 (float): the "secondary" distribution parameter (e.g. std)
+        kwargs (dict): passed to the sampling function
+
+    **Example**::
+
+        sampler = cv.make_sampler(dist='lognormal_int', par1=5, par2=3)
+        samples = sampler.draw(100)
+    '''
+
+    numba = False # Whether the distribution can be sampled inside Numba functions; see compile_dist()
+
+    def __init__(self, dist=None, par1=None, par2=None, **kwargs):
+        self.dist   = dist
+        self.par1   = par1
+        self.par2   = par2
+        self.kwargs = kwargs
+        self.spec   = dict(dist=dist, par1=par1, par2=par2, **kwargs) # Store a copy of the specification, to check if it's changed
+        self.initialize()
+        self.compiled = compile_dist(**self.spec) if self.numba else None # For sampling inside Numba functions
+        return
+
+
+    def initialize(self):
+        ''' Precompute any parameters needed for sampling '''
+        pass
+
+
+    def sample(self, n=None):
+        ''' Draw n samples -- implemented by each subclass '''
+        raise NotImplementedError
+
+
+    def draw(self, n=None):
+        '''
+        Draw n samples from the distribution.
+
+        Args:
+            n (int): the number of samples (if None, return a single sample)
+
+        Returns:
+            An array of samples
+        '''
+        if n is not None:
+            n = int(n) # Ensure it's an integer
+        return self.sample(n)
+
+
+    def matches(self, dist):
+        ''' Check whether this sampler is for the distribution specified by the dict dist '''
+        spec = dict(dist=None, par1=None, par2=None)
+        spec.update(dist)
+        return spec == self.spec
+
+
+class UniformSampler(Sampler):
+    ''' Uniform distribution from low=par1 to high=par2 '''
+    numba = True
+
+    def sample(self, n=None):
+        return np.random.uniform(low=self.par1, high=self.par2, size=n, **self.kwargs)
+
+
+class NormalSampler(Sampler):
+    ''' Normal distribution with mean=par1 and std=par2; positive only for 'normal_pos', and integer for 'normal_int' '''
+    numba = True
+
+    def sample(self, n=None):
+        samples = np.random.normal(loc=self.par1, scale=self.par2, size=n, **self.kwargs)
+        if   self.dist == 'normal_pos': samples = np.abs(samples)
+        elif self.dist == 'normal_int': samples = np.round(np.abs(samples))
+        return samples
+
 
-    # Ensure it's an integer
-    if size is not None:
-        size = int(size)
-
-    # Compute distribution parameters and draw samples
-    # NB, if adding a new distribution, also add to choices above
-    if   dist in ['unif', 'uniform']: samples = np.random.uniform(low=par1, high=par2, size=size, **kwargs)
-    elif dist in ['norm', 'normal']:  samples = np.random.normal(loc=par1, scale=par2, size=size, **kwargs)
-    elif dist == 'normal_pos':        samples = np.abs(np.random.normal(loc=par1, scale=par2, size=size, **kwargs))
-    elif dist == 'normal_int':        samples = np.round(np.abs(np.random.normal(loc=par1, scale=par2, size=size, **kwargs)))
-    elif dist == 'poisson':           samples = n_poisson(rate=par1, n=size, **kwargs) # Use Numba version below for speed
-    elif dist == 'neg_binomial':      samples = n_neg_binomial(rate=par1, dispersion=par2, n=size, **kwargs) # Use custom version below
-    elif dist in ['lognorm', 'lognormal', 'lognorm_int', 'lognormal_int']:
-        if par1>0:
-            mean  = np.log(par1**2 / np.sqrt(par2**2 + par1**2)) # Computes the mean of the underlying normal distribution
-            sigma = np.sqrt(np.log(par2**2/par1**2 + 1)) # Computes sigma for the underlying normal distribution
-            samples = np.random.lognormal(mean=mean, sigma=sigma, size=size, **kwargs)
+class LognormalSampler(Sampler):
+    ''' Lognormal distribution with mean=par1 and std=par2 (of the lognormal distribution); integer for 'lognormal_int' '''
+    numba = True
+
+    def initialize(self):
+        par1, par2 = self.par1, self.par2
+        if par1 > 0:
+            self.mean  = np.log(par1**2 / np.sqrt(par2**2 + par1**2)) # Computes the mean of the underlying normal distribution
+            self.sigma = np.sqrt(np.log(par2**2/par1**2 + 1)) # Computes sigma for the underlying normal distribution
+        else:
+            self.mean = self.sigma = None # Always zero
+        self.round = '_int' in self.dist
+        return
+
+    def sample(self, n=None):
+        if self.mean is not None:
+            samples = np.random.lognormal(mean=self.mean, sigma=self.sigma, size=n, **self.kwargs)
         else:
-            samples = np.zeros(size)
-        if '_int' in dist:
+            samples = np.zeros(n)
+        if self.round:
             samples = np.round(samples)
-    else:
-        errormsg = f'The selected distribution "{dist}" is not implemented; choices are: {sc.newlinejoin(choices)}'
+        return samples
+
+
+class PoissonSampler(Sampler):
+    ''' Poisson distribution with rate=par1 (par2 is not used) '''
+    numba = True
+
+    def sample(self, n=None):
+        return n_poisson(rate=self.par1, n=n, **self.kwargs) # Use Numba version below for speed
+
+
+class NegBinomialSampler(Sampler):
+    ''' Negative binomial distribution with mean=par1 and k=par2 '''
+
+    def sample(self, n=None):
+        return n_neg_binomial(rate=self.par1, dispersion=self.par2, n=n, **self.kwargs) # Use custom version below
+
+
+class FuncSampler(Sampler):
+    ''' A custom distribution, sampled by a function taking par1, par2, and size; see register_sampler() '''
+
+    def __init__(self, func, dist=None, par1=None, par2=None, **kwargs):
+        self.func = func
+        super().__init__(dist=dist, par1=par1, par2=par2, **kwargs)
+        return
+
+    def sample(self, n=None):
+        return self.func(par1=self.par1, par2=self.par2, size=n, **self.kwargs)
+
+
+# The samplers for each distribution, including aliases; custom distributions are added by register_sampler()
+samplers = dict(
+    unif          = UniformSampler,
+    uniform       = UniformSampler,
+    norm          = NormalSampler,
+    normal        = NormalSampler,
+    normal_pos    = NormalSampler,
+    normal_int    = NormalSampler,
+    lognorm       = LognormalSampler,
+    lognormal     = LognormalSampler,
+    lognorm_int   = LognormalSampler,
+    lognormal_int = LognormalSampler,
+    poisson       = PoissonSampler,
+    neg_binomial  = NegBinomialSampler,
+)
+
+
+def make_sampler(dist=None, par1=None, par2=None, **kwargs):
+    '''
+    Create a sampler for the distribution specified by the input, with its
+    parameters precomputed; see sample() for the available distributions, and
+    register_sampler() for adding new ones. If dist is already a sampler, it is
+    returned unchanged.
+
+    **Example**::
+
+        sampler = cv.make_sampler(**sim['dur']['exp2inf'])
+        durs = sampler.draw(100)
+    '''
+    if isinstance(dist, Sampler):
+        return dist
+    if dist not in samplers:
+        errormsg = f'The selected distribution "{dist}" is not implemented; choices are: {sc.newlinejoin(samplers.keys())}'
         raise NotImplementedError(errormsg)
+    sampler = samplers[dist]
+    if isinstance(sampler, type) and issubclass(sampler, Sampler):
+        return sampler(dist=dist, par1=par1, par2=par2, **kwargs)
+    else:
+        return FuncSampler(sampler, dist=dist, par1=par1, par2=par2, **kwargs)
 
-    return samples
 
+def register_sampler(dist, sampler, overwrite=False):
+    '''
+    Register a custom distribution, which can then be used anywhere a distribution
+    is specified, e.g. for durations, or with sample(). Note that custom distributions
+    can't be sampled by Numba, so prognoses are calculated with arrays if they are
+    used for durations, even if ``cv.options.compiled_prognoses`` is set.
+
+    Args:
+        dist (str): the name of the distribution
+        sampler (class/func): a subclass of cv.Sampler, or a function taking par1, par2, and size (and any other keyword arguments) and returning the samples
+        overwrite (bool): whether to allow replacing an existing distribution
+
+    **Example**::
+
+        cv.register_sampler('gamma', lambda par1, par2, size: np.random.gamma(shape=par1, scale=par2, size=size))
+        sim = cv.Sim()
+        sim['dur']['exp2inf'] = dict(dist='gamma', par1=5, par2=1)
+    '''
+    if dist in samplers and not overwrite:
+        errormsg = f'Distribution "{dist}" already exists; use overwrite=True to replace it'
+        raise ValueError(errormsg)
+    if not callable(sampler):
+        errormsg = f'Sampler must be a subclass of cv.Sampler or a function, not {type(sampler)}'
+        raise TypeError(errormsg)
+    samplers[dist] = sampler
+    return
+
+
+# Distributions that can be sampled by Numba functions, by code; see compile_dist()
+dist_codes = dict(
+    unif          = 0,
+    uniform       = 0,
+    norm          = 1,
+    normal        = 1,
+    normal_pos    = 2,
+    normal_int    = 3,
+    lognorm       = 4,
+    lognormal     = 4,
+    lognorm_int   = 5,
+    lognormal_int = 5,
+    poisson       = 6,
+    constant      = 7, # Only used for lognormal distributions with a mean of zero, which are always zero
+)
+
+
+def compile_dist(dist=None, par1=None, par2=None, **kwargs):
+    '''
+    Convert a distribution, as used by sample(), into a code and two parameters
+    for sampling inside Numba functions (see sample_compiled()). Lognormal
+    distributions are converted to the parameters of the underlying normal
+    distribution here, rather than for every sample. Returns None if the
+    distribution can't be sampled by Numba (e.g. 'neg_binomial').
+
+    **Example**::
+
+        code, par1, par2 = cv.compile_dist(dist='lognormal_int', par1=5, par2=3)
+    '''
+    if dist not in dist_codes or kwargs:
+        return None
+    code = dist_codes[dist]
+    if code in [4, 5]: # Lognormal
+        if par1 > 0:
+            par1, par2 = np.log(par1**2 / np.sqrt(par2**2 + par1**2)), np.sqrt(np.log(par2**2/par1**2 + 1)) # As for sample()
+        else:
+            code, par1, par2 = dist_codes['constant'], 0, 0
+    elif code == 6: # Poisson
+        par2 = 0
+    return code, float(par1), float(par2)
+
+
+@nb.njit((nb.int64, nb.float64, nb.float64), cache=cache)
+def sample_compiled(code, par1, par2): # pragma: no cover
+    '''
+    Draw a single sample inside a Numba function, using a code and parameters from
+    compile_dist(); the samples have the same distribution as those from sample(),
+    but are drawn from the Numba random number stream.
+    '''
+    if   code == 0: return np.random.uniform(par1, par2)
+    elif code == 1: return np.random.normal(par1, par2)
+    elif code == 2: return np.abs(np.random.normal(par1, par2))
+    elif code == 3: return np.round(np.abs(np.random.normal(par1, par2)))
+    elif code == 4: return np.random.lognormal(par1, par2)
+    elif code == 5: return np.round(np.random.lognormal(par1, par2))
+    elif code == 6: return float(np.random.poisson(par1))
+    else:           return par1
+
+
+@nb.njit(                 (nbint, nb.int64[:], nb.float64[:], nbfloat[:], nbfloat[:],  nbfloat[:], nbfloat[:], nbfloat[:], nbfloat[:], nb.float64, nb.float64,   nb.int64[:], nb.float64[:,:], nb.types.UniTuple(nbfloat[:], 5), nb.types.UniTuple(nbfloat[:], 7)), cache=cache)
+def compute_prognoses(t,     inds,        rel_probs,     symp_prob,  severe_prob, crit_prob,  death_prob, symp_imm,   sev_imm,    crit_factor, death_factor, dist_codes,  dist_pars,       durs,         dates): # pragma: no cover
+    '''
+    Numba for People.compute_outcomes(): determine what happens to each newly
+    infected person -- whether they become symptomatic, severe, or critical, and
+    whether they die -- and draw the durations of each stage, in a single pass.
+    The outcomes and durations have the same distributions as for the array
+    calculation, but are drawn from the Numba random number stream, one person
+    at a time.
+
+    Args:
+        t: the current timestep
+        inds: indices of the people infected
+        rel_probs: the relative probabilities of symptoms, severe disease, critical disease, and death for the variant
+        symp_prob, severe_prob, crit_prob, death_prob: the probabilities of each person
+        symp_imm, sev_imm: the immunity of each person against symptoms and severe disease, for the variant
+        crit_factor, death_factor: the factors to multiply the probabilities of critical disease and death by (e.g. if hospitals are full)
+        dist_codes, dist_pars: the duration distributions from compile_dist(), in the order exp2inf, inf2sym, sym2sev, sev2crit, asym2rec, mild2rec, sev2rec, crit2rec, crit2die
+        durs: the durations (modified in place), in the order dur_exp2inf, dur_inf2sym, dur_sym2sev, dur_sev2crit, dur_disease
+        dates: the dates (modified in place), in the order date_infectious, date_symptomatic, date_severe, date_critical, date_diagnosed, date_recovered, date_dead
+
+    Returns:
+        outcomes: for each person, 0 if asymptomatic, 1 if mild, 2 if severe, 3 if critical, and 4 if they die
+    '''
+    exp2inf, inf2sym, sym2sev, sev2crit, asym2rec, mild2rec, sev2rec, crit2rec, crit2die = 0, 1, 2, 3, 4, 5, 6, 7, 8
+    dur_exp2inf, dur_inf2sym, dur_sym2sev, dur_sev2crit, dur_disease = durs
+    date_infectious, date_symptomatic, date_severe, date_critical, date_diagnosed, date_recovered, date_dead = dates
+    outcomes = np.zeros(len(inds), dtype=np.int8)
+    for j in range(len(inds)):
+        i = inds[j]
+
+        # Calculate how long before this person can infect other people, and reset all other dates
+        dur_exp2inf[i] = sample_compiled(dist_codes[exp2inf], dist_pars[exp2inf,0], dist_pars[exp2inf,1])
+        date_infectious[i] = dur_exp2inf[i] + t
+        date_symptomatic[i] = np.nan
+        date_severe[i] = np.nan
+        date_critical[i] = np.nan
+        date_diagnosed[i] = np.nan
+        date_recovered[i] = np.nan
+
+        # CASE 1: Asymptomatic: may infect others, but have no symptoms and do not die
+        if not np.random.random() < rel_probs[0]*symp_prob[i]*(1 - symp_imm[i]):
+            dur = sample_compiled(dist_codes[asym2rec], dist_pars[asym2rec,0], dist_pars[asym2rec,1])
+            date_recovered[i] = date_infectious[i] + dur
+            dur_disease[i] = dur_exp2inf[i] + dur
+            continue
+
+        # CASE 2: Symptomatic: can either be mild, severe, or critical
+        dur_inf2sym[i] = sample_compiled(dist_codes[inf2sym], dist_pars[inf2sym,0], dist_pars[inf2sym,1])
+        date_symptomatic[i] = date_infectious[i] + dur_inf2sym[i]
+        if not np.random.random() < rel_probs[1]*severe_prob[i]*(1 - sev_imm[i]):
+
+            # CASE 2.1: Mild symptoms, no hospitalization required and no probability of death
+            dur = sample_compiled(dist_codes[mild2rec], dist_pars[mild2rec,0], dist_pars[mild2rec,1])
+            date_recovered[i] = date_symptomatic[i] + dur
+            dur_disease[i] = dur_exp2inf[i] + dur_inf2sym[i] + dur
+            outcomes[j] = 1
+            continue
+
+        # CASE 2.2: Severe cases: hospitalization required, may become critical
+        dur_sym2sev[i] = sample_compiled(dist_codes[sym2sev], dist_pars[sym2sev,0], dist_pars[sym2sev,1])
+        date_severe[i] = date_symptomatic[i] + dur_sym2sev[i]
+        if not np.random.random() < rel_probs[2]*crit_prob[i]*crit_factor:
+
+            # CASE 2.2.1 Not critical - they will recover
+            dur = sample_compiled(dist_codes[sev2rec], dist_pars[sev2rec,0], dist_pars[sev2rec,1])
+            date_recovered[i] = date_severe[i] + dur
+            dur_disease[i] = dur_exp2inf[i] + dur_inf2sym[i] + dur_sym2sev[i] + dur
+            outcomes[j] = 2
+            continue
+
+        # CASE 2.2.2: Critical cases: ICU required, may die
+        dur_sev2crit[i] = sample_compiled(dist_codes[sev2crit], dist_pars[sev2crit,0], dist_pars[sev2crit,1])
+        date_critical[i] = date_severe[i] + dur_sev2crit[i]
+        if not np.random.random() < rel_probs[3]*death_prob[i]*death_factor:
+
+            # CASE 2.2.2.1: Did not die
+            dur = sample_compiled(dist_codes[crit2rec], dist_pars[crit2rec,0], dist_pars[crit2rec,1])
+            date_recovered[i] = date_critical[i] + dur
+            dur_disease[i] = dur_exp2inf[i] + dur_inf2sym[i] + dur_sym2sev[i] + dur_sev2crit[i] + dur
+            outcomes[j] = 3
+        else:
+
+            # CASE 2.2.2.2: Did die
+            dur = sample_compiled(dist_codes[crit2die], dist_pars[crit2die,0], dist_pars[crit2die,1])
+            date_dead[i] = date_critical[i] + dur
+            dur_disease[i] = dur_exp2inf[i] + dur_inf2sym[i] + dur_sym2sev[i] + dur_sev2crit[i] + dur
+            outcomes[j] = 4
+
+    return outcomes
 
 
 def get_pdf(dist=None, par1=None, par2=None):
@@ -298,10 +1161,68 @@ def set_seed(seed=None):
     return
 
 
+def _numba_rng_funcs():
+    '''
+    Return the functions Numba uses internally to get and set the state of its
+    random number generator. These are not part of Numba's public API, so raise
+    a clear error if they are not available in the installed version.
+    '''
+    helperlib = getattr(nb, '_helperlib', None)
+    names = ['rnd_get_np_state_ptr', 'rnd_get_state', 'rnd_set_state']
+    funcs = [getattr(helperlib, name, None) for name in names]
+    if not all(callable(func) for func in funcs):
+        errormsg = f'Getting and setting the random number state requires the internal Numba functions numba._helperlib.{sc.strjoin(names, sep="/")}(), which are not available in Numba {nb.__version__}; please use a Numba version that provides them, or avoid features that need them (e.g. Scenarios.run(branch=...))'
+        raise NotImplementedError(errormsg)
+    return funcs
+
+
+def get_rng_state():
+    '''
+    Get the current state of all the random number generators (Numpy, Numba, and
+    Python), so that the random number stream can be resumed from this point
+    with set_rng_state(). Unlike set_seed(), this allows a partially run sim to be
+    copied and continued exactly as if it had never been copied.
+
+    Note: Numba does not provide a public way to get the state of its generator,
+    so this relies on Numba internals, and raises a NotImplementedError if they
+    are not available.
+
+    **Example**::
+
+        state = cv.get_rng_state()
+        x1 = cv.n_binomial(0.5, 10)
+        cv.set_rng_state(state)
+        x2 = cv.n_binomial(0.5, 10) # Identical to x1
+    '''
+    get_ptr, get_state, _ = _numba_rng_funcs()
+    ptr = get_ptr() # Numba keeps its own copy of the Numpy generator
+    state = dict(
+        numpy  = np.random.get_state(),
+        numba  = get_state(ptr),
+        python = random.getstate(),
+    )
+    return state
+
+
+def set_rng_state(state):
+    '''
+    Restore the state of all the random number generators, as returned by get_rng_state().
+
+    Args:
+        state (dict): the state to restore
+    '''
+    get_ptr, _, set_state = _numba_rng_funcs()
+    ptr = get_ptr()
+    np.random.set_state(state['numpy'])
+    set_state(ptr, state['numba'])
+    random.setstate(state['python'])
+    return
+
+
 #%% Probabilities -- mostly not jitted since performance gain is minimal
 
-__all__ += ['n_binomial', 'binomial_filter', 'binomial_arr', 'n_multinomial',
-            'poisson', 'n_poisson', 'n_neg_binomial', 'choose', 'choose_r', 'choose_w']
+__all__ += ['n_binomial', 'binomial_filter', 'n_binomial_sparse', 'binomial_arr', 'n_multinomial',
+            'poisson', 'n_poisson', 'n_neg_binomial', 'choose', 'choose_r', 'choose_w', 'choose_w_sparse']
 
 def n_binomial(prob, n):
     '''
@@ -340,6 +1261,32 @@ def binomial_filter(prob, arr): # No speed gain from Numba
     return arr[(np.random.random(len(arr)) < prob).nonzero()[0]]
 
 
+def n_binomial_sparse(prob, n):
+    '''
+    Like n_binomial(), but returns the indices of the trials that succeeded (in
+    random order) rather than an array of all of them, and the cost scales with the
+    number of successes rather than the number of trials. The number of successes
+    is drawn from a binomial distribution, then which trials succeeded is a uniform
+    sample, which gives each trial the same, independent probability of success.
+
+    Args:
+        prob (float): probability of each trial succeeding
+        n (int): number of trials
+
+    Returns:
+        Indices of the trials that succeeded
+
+    **Example**::
+
+        inds = cv.n_binomial_sparse(0.001, 1e6) # Return the indices of about 1000 trials out of a million
+    '''
+    n = int(n)
+    n_success = np.random.binomial(n, min(max(prob, 0), 1))
+    if not n_success:
+        return np.empty(0, dtype=np.int64)
+    return _choose_sparse(n, n_success)
+
+
 def binomial_arr(prob_arr):
     '''
     Binomial (Bernoulli) trials each with different probabilities.
@@ -463,6 +1410,12 @@ def choose_w(probs, n, unique=True): # No performance gain from Numba
     '''
     Choose n items (e.g. people), each with a probability from the distribution probs.
 
+    Sampling without replacement gives the same distribution as successive
+    weighted draws. For a small number of samples, repeated draws are discarded;
+    otherwise, exponential keys are used (Efraimidis-Spirakis): each item gets
+    the key E/w with E ~ Exp(1), and the n smallest keys are chosen, which only
+    needs a single pass over the weights.
+
     Args:
         probs (array): list of probabilities, should sum to 1
         n (int): number of samples to choose
@@ -472,15 +1425,130 @@ def choose_w(probs, n, unique=True): # No performance gain from Numba
 
         choices = cv.choose_w([0.2, 0.5, 0.1, 0.1, 0.1], 2) # choose 2 out of 5 people with nonequal probability.
     '''
-    probs = np.array(probs)
+    probs = np.array(probs, dtype=np.float64)
     n_choices = len(probs)
     n_samples = int(n)
     probs_sum = probs.sum()
-    if probs_sum: # Weight is nonzero, rescale
-        probs = probs/probs_sum
-    else: # Weights are all zero, choose uniformly
-        probs = np.ones(n_choices)/n_choices
-    return np.random.choice(n_choices, n_samples, p=probs, replace=not(unique))
+    if not unique:
+        if probs_sum: # Weight is nonzero, rescale
+            probs = probs/probs_sum
+        else: # Weights are all zero, choose uniformly
+            probs = np.ones(n_choices)/n_choices
+        return np.random.choice(n_choices, n_samples, p=probs, replace=True)
+
+    # The keys don't depend on the normalization, so the weights are used as-is
+    if not probs_sum:
+        probs = np.ones(n_choices)
+    n_nonzero = np.count_nonzero(probs)
+    if n_samples > n_nonzero:
+        errormsg = f'Cannot choose {n_samples} unique items, since only {n_nonzero} have nonzero probability'
+        raise ValueError(errormsg)
+    if 10*n_samples <= n_nonzero: # Few samples: draw with replacement and discard repeats, which is cheaper than keying everyone
+        choices = _choose_w_repeats(probs, n_samples)
+        if choices is not None:
+            return choices
+    with np.errstate(divide='ignore'): # Zero weights give infinite keys, so are never chosen
+        keys = np.random.standard_exponential(size=n_choices)/probs
+    return _smallest(keys, n_samples)
+
+
+def choose_w_sparse(n_total, n, inds, weights, default=1.0):
+    '''
+    Choose n unique items out of n_total, where the items in inds have the given
+    weights and all other items have weight default. Unlike choose_w(), the
+    full weight vector is never created: the cost scales with the number of
+    weighted items and the number of samples, not with n_total.
+
+    The default-weight items all have independent keys with the same rate, so
+    their smallest keys can be generated directly as exponential order
+    statistics, and which items they belong to is a uniform sample.
+
+    Args:
+        n_total (int): the total number of items
+        n (int): the number of items to choose
+        inds (array): the indices of items with non-default weights (must be unique)
+        weights (array): the weights of those items (a scalar applies to all of them)
+        default (float): the weight of every other item
+
+    **Example**::
+
+        choices = cv.choose_w_sparse(1000, 10, inds=[0,1,2], weights=[5,5,0]) # Everyone has weight 1 except 0 and 1 (weight 5) and 2 (never chosen)
+    '''
+    n_total = int(n_total)
+    n_samples = int(n)
+    inds = np.asarray(inds, dtype=np.int64)
+    weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), inds.shape)
+    n_rest = n_total - len(inds) # Number of items with the default weight
+
+    # Handle zero weights the same way as choose_w()
+    if not (weights.sum() + default*n_rest):
+        weights = np.ones(len(inds))
+        default = 1.0
+
+    # Keys for the explicitly weighted items
+    skip = np.sort(inds) # Needed below to map uniform picks onto the items not in inds
+    nonzero = weights.nonzero()[0]
+    n_avail = len(nonzero) + (n_rest if default else 0)
+    if n_samples > n_avail:
+        errormsg = f'Cannot choose {n_samples} unique items, since only {n_avail} have nonzero probability'
+        raise ValueError(errormsg)
+    inds = inds[nonzero]
+    keys = np.random.standard_exponential(size=len(inds))/weights[nonzero]
+
+    # Smallest keys of the default items: the gap between successive order statistics of m exponentials is Exp(1)/m
+    if default and n_rest:
+        n_stats = min(n_samples, n_rest)
+        rest_keys = np.cumsum(np.random.standard_exponential(size=n_stats)/np.arange(n_rest, n_rest-n_stats, -1))/default
+        keys = np.concatenate([keys, rest_keys])
+    order = _smallest(keys, n_samples)
+    chosen = inds[order[order < len(inds)]]
+
+    # Assign the default-weight picks to a uniform sample of the items not in inds
+    n_picked = n_samples - len(chosen)
+    if n_picked:
+        ranks = _choose_sparse(n_rest, n_picked)
+        ranks = ranks + np.searchsorted(skip - np.arange(len(skip)), ranks, side='right') # Skip over the weighted items
+        chosen = np.concatenate([chosen, ranks])
+    return chosen
+
+
+def _choose_w_repeats(probs, n, max_rounds=5):
+    '''
+    Choose n unique items by drawing with replacement and keeping the first
+    occurrence of each, which is equivalent to successive weighted draws without
+    replacement. Returns None if the weights are too concentrated to get n
+    unique items within max_rounds.
+    '''
+    cdf = np.cumsum(probs)
+    draws = np.empty(0, dtype=np.int64)
+    n_unique = 0
+    for r in range(max_rounds):
+        new = np.searchsorted(cdf, np.random.random(2*(n-n_unique))*cdf[-1], side='right') # Zero weights have empty intervals, so are never drawn
+        draws = np.concatenate([draws, new])
+        unique, first = np.unique(draws, return_index=True)
+        n_unique = len(unique)
+        if n_unique >= n:
+            return draws[np.sort(first)[:n]]
+    return None
+
+
+def _smallest(keys, n):
+    ''' Indices of the n smallest keys, in increasing order '''
+    if n < len(keys):
+        inds = np.argpartition(keys, n)[:n]
+    else:
+        inds = np.arange(len(keys))
+    return inds[np.argsort(keys[inds])]
+
+
+def _choose_sparse(max_n, n):
+    ''' Like choose(), but without creating an array of size max_n when n is small '''
+    if 4*n > max_n:
+        return np.random.choice(max_n, n, replace=False)
+    inds = np.unique(np.random.randint(max_n, size=n))
+    while len(inds) < n: # Redraw any duplicates
+        inds = np.unique(np.concatenate([inds, np.random.randint(max_n, size=n-len(inds))]))
+    return np.random.permutation(inds)
 
 
 
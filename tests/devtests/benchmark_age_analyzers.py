@@ -0,0 +1,40 @@
+'''
+Benchmark the age analyzers, which count people by age bin using cached bin
+indices, against the previous calculation using np.histogram() on the ages of
+the people found in each state, in a large population partway through an epidemic.
+'''
+
+import numpy as np
+import sciris as sc
+import covasim as cv
+
+pop_size = 2e6
+repeats  = 10
+
+sim = cv.Sim(pop_size=pop_size, pop_type='random', n_days=60, verbose=0)
+sim.run(until=40)
+ppl = sim.people
+states = ['exposed', 'severe', 'dead', 'tested', 'diagnosed']
+edges = np.linspace(0, 100, 11)
+
+def age_histogram(sim):
+    ''' The previous calculation in age_histogram.apply() '''
+    return {state:np.histogram(sim.people.age[sim.people.defined(f'date_{state}')], bins=edges)[0] for state in states}
+
+def daily_age_stats(sim):
+    ''' The previous calculation in daily_age_stats.apply() '''
+    return {state:np.histogram(sim.people.age[sc.findinds(sim.people[f'date_{state}'], sim.t)], edges)[0] for state in states}
+
+for label,func,analyzer in [['age_histogram', age_histogram, cv.age_histogram(days=sim.t, states=states, edges=edges)],
+                            ['daily_age_stats', daily_age_stats, cv.daily_age_stats(states=states, edges=edges)]]:
+    analyzer.initialize(sim)
+    analyzer.apply(sim) # Warm up, and calculate the age bins
+    T = sc.timer()
+    for r in range(repeats):
+        func(sim)
+    before = T.tocout()/repeats
+    T = sc.timer()
+    for r in range(repeats):
+        analyzer.apply(sim)
+    after = T.tocout()/repeats
+    print(f'{label:>15s}: np.histogram {before*1e3:0.2f} ms, cached age bins {after*1e3:0.2f} ms, speedup {before/after:0.1f}x')
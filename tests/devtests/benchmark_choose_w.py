@@ -0,0 +1,43 @@
+'''
+Benchmark weighted sampling without replacement, as used by test_num: the dense
+sampler (np.random.choice), cv.choose_w(), and sparse weights
+that avoid creating the full weight vector (cv.choose_w_sparse()).
+'''
+
+import numpy as np
+import sciris as sc
+import covasim as cv
+
+pop_size = int(1e6)
+n_tests  = 10_000
+n_symp   = 20_000
+n_diag   = 50_000
+repeats  = 5
+
+# Everyone has weight 1, except symptomatic people (weight 100) and diagnosed people (weight 0)
+cv.set_seed(1)
+inds = np.random.choice(pop_size, n_symp+n_diag, replace=False)
+weights = np.concatenate([np.full(n_symp, 100.0), np.zeros(n_diag)])
+probs = np.ones(pop_size)
+probs[inds] = weights
+
+def dense():
+    p = probs/probs.sum()
+    return np.random.choice(pop_size, n_tests, p=p, replace=False)
+
+methods = dict(
+    dense    = dense,
+    choose_w = lambda: cv.choose_w(probs, n_tests),
+    sparse   = lambda: cv.choose_w_sparse(pop_size, n_tests, inds=inds, weights=weights),
+)
+
+results = sc.objdict()
+for label,func in methods.items():
+    T = sc.timer()
+    for r in range(repeats):
+        out = func()
+    results[label] = T.tocout()/repeats
+    frac = np.isin(out, inds[:n_symp]).mean()
+    print(f'{label:>8s}: {results[label]*1e3:0.1f} ms per call ({frac*100:0.1f}% symptomatic)')
+
+print(f'Speedup: {results.dense/results.sparse:0.1f}x')
@@ -0,0 +1,36 @@
+'''
+Benchmark the memory used by the people of sims run with keep_people=True, with
+and without storing them in compact form -- cf. dev_test_memory.py.
+'''
+
+import tracemalloc
+import numpy as np
+import sciris as sc
+import covasim as cv
+
+n_runs = 10
+sim = cv.Sim(verbose=0, variants=cv.variant('delta', days=20, n_imports=10))
+
+def people_bytes(people):
+    ''' Bytes used by the people arrays, in full or compact form '''
+    compact = people.__dict__.get('_compact', {})
+    full = sum(people[key].nbytes for key in people.keys() if key not in compact)
+    return full + sum(entry[1].nbytes for entry in compact.values())
+
+results = sc.objdict()
+for compact in [False, True]:
+    label = 'compact' if compact else 'default'
+    with cv.options.context(compact_people=compact):
+        tracemalloc.start()
+        T = sc.timer()
+        sims = cv.multi_run(sim, n_runs=n_runs, keep_people=True, parallel=False)
+        elapsed = T.tocout()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    results[label] = current
+    print(f'{label:>8s}: {people_bytes(sims[0].people)/1e6:0.1f} MB of people arrays per sim; {current/1e6:0.0f} MB kept for {n_runs} sims (peak {peak/1e6:0.0f} MB); {elapsed:0.1f} s')
+    if compact:
+        inf = sims[0].people.date_infectious # Decoded as needed
+        print(f'          {np.count_nonzero(~np.isnan(inf)):n} people infected in the first sim')
+
+print(f'Memory saved: {(1-results.compact/results.default)*100:0.0f}%')
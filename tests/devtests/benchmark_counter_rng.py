@@ -0,0 +1,33 @@
+'''
+Benchmark the counter-based transmission kernel against the default and fused
+ones. Run with COVASIM_NUMBA_PARALLEL=safe to calculate the counter-based
+transmission in parallel; its results are the same for any number of threads.
+'''
+
+import sciris as sc
+import covasim as cv
+
+pars = dict(
+    pop_size = 200e3,
+    pop_type = 'hybrid',
+    n_days   = 60,
+    verbose  = 0,
+    variants = cv.variant('delta', days=10, n_imports=20),
+)
+repeats = 3
+
+print(f'Numba parallel: {cv.options.numba_parallel}')
+cv.Sim(pars, pop_size=1000).run() # Warm up
+
+results = sc.objdict()
+for label,opts in dict(default={}, fused=dict(fused_trans=True), counter=dict(counter_rng=True)).items():
+    with cv.options.context(timings=True, **opts):
+        elapsed = 0
+        for r in range(repeats):
+            sim = cv.Sim(pars)
+            sim.run()
+            elapsed += sum(arr.sum() for phase,arr in sim.timings.data.items() if phase.startswith('transmission'))
+    results[label] = elapsed/repeats
+    print(f'{label:>8s}: {results[label]:0.3f} s transmission per run ({sim.results["cum_infections"][-1]:n} infections)')
+
+print(f'Speedup vs. default: {results.default/results.counter:0.1f}x')
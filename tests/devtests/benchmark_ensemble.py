@@ -0,0 +1,37 @@
+'''
+Benchmark running replicates of a small sim as a single ensemble, vs. running
+them one after the other with multi_run().
+'''
+
+import sciris as sc
+import covasim as cv
+
+pop_size = 2e3
+n_days   = 120
+n_runs   = 20
+
+sim = cv.Sim(pop_size=pop_size, n_days=n_days, verbose=0, interventions=cv.test_prob(symp_prob=0.1))
+cv.EnsembleSim(sim, n_runs=2).run() # Warm up
+
+def run_serial():
+    return cv.MultiSim(cv.multi_run(sim, n_runs=n_runs, parallel=False))
+
+def run_ensemble():
+    ens = cv.EnsembleSim(sim, n_runs=n_runs)
+    ens.run()
+    return ens.to_multisim()
+
+results = sc.objdict()
+msims = sc.objdict()
+for label,func in [['serial', run_serial], ['ensemble', run_ensemble]]:
+    T = sc.timer()
+    msims[label] = func()
+    results[label] = T.tocout()
+
+for label,elapsed in results.items():
+    print(f'{label:>8s}: {elapsed:0.2f} s')
+print(f'Speedup: {results.serial/results.ensemble:0.1f}x')
+
+for label,msim in msims.items():
+    msim.mean()
+    print(f'{label:>8s}: {msim.results.cum_infections[-1]:n} infections (mean)')
@@ -0,0 +1,28 @@
+'''
+Benchmark the event queue for state transitions against checking everyone with
+a date defined, using the per-phase step timings.
+'''
+
+import sciris as sc
+import covasim as cv
+
+pop_size = 1e6
+pars = dict(
+    pop_size      = pop_size,
+    pop_type      = 'hybrid',
+    n_days        = 60,
+    verbose       = 0,
+    interventions = [cv.test_prob(symp_prob=0.1, test_delay=2), cv.contact_tracing(trace_probs=0.3)],
+)
+phases = ['update_states_pre', 'update_states_post']
+
+sims = sc.objdict()
+for event_queue in [False, True]:
+    label = 'queue' if event_queue else 'default'
+    with cv.options.context(event_queue=event_queue, timings=True):
+        sims[label] = cv.Sim(pars, label=label).run()
+    summary = sims[label].timings.summary().set_index('phase')
+    times = ', '.join([f'{phase}: {summary.per_step[phase]*1e3:0.1f} ms' for phase in phases])
+    print(f'{label:>8s}: {times} per step')
+
+assert not cv.diff_sims(sims.default, sims.queue, output=True)
@@ -0,0 +1,31 @@
+'''
+Benchmark contact lookups: the original scan of every edge with set lookups,
+the first lookup on a layer (a scan with an array lookup), building the adjacency
+index, and lookups using the index.
+'''
+
+import numpy as np
+import sciris as sc
+import covasim as cv
+import covasim.utils as cvu
+
+pop_size = 1e6
+n_inds   = 2000
+repeats  = 5
+
+sim = cv.Sim(pop_size=pop_size, pop_type='hybrid', verbose=0)
+sim.initialize()
+inds = np.sort(np.random.choice(int(pop_size), n_inds, replace=False)).astype(np.int64)
+
+for lkey,layer in sim.people.contacts.items():
+    print(f'Layer {lkey}: {len(layer):n} edges')
+    T = sc.timer()
+    for r in range(repeats):
+        cvu.find_contacts(layer['p1'], layer['p2'], inds)
+    print(f'  {"original scan":>15s}: {T.tocout()/repeats*1e3:0.1f} ms')
+    layer.reset_index()
+    steps = ['first lookup', 'build index', 'indexed lookup']
+    for step in steps:
+        T = sc.timer()
+        layer.find_contacts(inds)
+        print(f'  {step:>15s}: {T.tocout()*1e3:0.1f} ms')
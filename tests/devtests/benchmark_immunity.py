@@ -0,0 +1,41 @@
+'''
+Benchmark incremental vs. full immunity calculation for a large population with
+multiple variants.
+'''
+
+import numpy as np
+import sciris as sc
+import covasim as cv
+import covasim.immunity as cvi
+
+pop_size = 1e6
+n_days   = 40
+repeats  = 5
+
+# Create a sim with three variants and vaccination, and run it partway through so some people have NAbs
+pars = dict(
+    pop_size      = pop_size,
+    pop_type      = 'random',
+    n_days        = n_days,
+    verbose       = 0,
+    variants      = [cv.variant('alpha', days=10, n_imports=100), cv.variant('delta', days=20, n_imports=100)],
+    interventions = cv.vaccinate_prob('pfizer', days=np.arange(20, n_days), prob=0.001),
+)
+sim = cv.Sim(pars)
+sim.run(until=n_days-1)
+ppl = sim.people
+n_nabs = np.count_nonzero(ppl.nab)
+print(f'{n_nabs:n} of {len(ppl):n} people have NAbs ({n_nabs/len(ppl)*100:0.1f}%)')
+
+# Time both methods
+results = sc.objdict()
+for full in [True, False]:
+    cvi.check_immunity(ppl, full=full) # Warm up
+    T = sc.timer()
+    for r in range(repeats):
+        cvi.check_immunity(ppl, full=full)
+    label = 'full' if full else 'incremental'
+    results[label] = T.tocout()/repeats
+    print(f'{label:>12s}: {results[label]*1e3:0.1f} ms per call')
+
+print(f'Speedup: {results.full/results.incremental:0.1f}x')
@@ -0,0 +1,74 @@
+'''
+Benchmark the compiled NAb kinetics against the previous array calculation, for
+waning (every time step) and for NAb events from infection (every infection batch)
+in a large population.
+'''
+
+import numpy as np
+import sciris as sc
+import covasim as cv
+import covasim.immunity as cvi
+
+pop_size = 1e6
+n_infect = 1000
+repeats  = 20
+
+def update_peak_nab(people, inds, nab_pars, symp=None):
+    ''' The previous array calculation '''
+    pars = people.pars
+    has_nabs = people.nab[inds] > 0
+    no_prior_nab_inds = inds[~has_nabs]
+    prior_nab_inds = inds[has_nabs]
+    people.peak_nab[prior_nab_inds] *= nab_pars['nab_boost']
+    if len(no_prior_nab_inds):
+        no_prior_nab = 2 ** cv.utils.sample(**nab_pars['nab_init'], size=len(no_prior_nab_inds))
+        if symp is not None:
+            prior_symp = np.full(pars['pop_size'], np.nan)
+            prior_symp[symp['asymp']] = pars['rel_imm_symp']['asymp']
+            prior_symp[symp['mild']] = pars['rel_imm_symp']['mild']
+            prior_symp[symp['sev']] = pars['rel_imm_symp']['severe']
+            prior_symp[prior_nab_inds] = np.nan
+            prior_symp = prior_symp[~np.isnan(prior_symp)]
+            no_prior_nab = no_prior_nab * prior_symp * (1 + nab_pars['nab_eff']['alpha_inf_diff'])
+        people.peak_nab[no_prior_nab_inds] = no_prior_nab
+    people.t_nab_event[inds] = people.t
+    return
+
+def update_nab(people, inds):
+    ''' The previous array calculation '''
+    t_since_boost = people.t - people.t_nab_event[inds]
+    people.nab[inds] += people.pars['nab_kin'][t_since_boost]*people.peak_nab[inds]
+    people.nab[inds] = np.where(people.nab[inds]<0, 0, people.nab[inds])
+    people.nab[inds] = np.where([people.nab[inds] > people.peak_nab[inds]], people.peak_nab[inds], people.nab[inds])
+    return
+
+# Run a sim partway so that some people have NAbs
+pars = dict(pop_size=pop_size, pop_type='random', n_days=60, verbose=0,
+            interventions=cv.vaccinate_prob('pfizer', days=np.arange(10, 60), prob=0.005))
+sim = cv.Sim(pars)
+sim.run(until=40)
+ppl = sim.people
+has_nabs = cv.true(ppl.peak_nab)
+print(f'{len(has_nabs):n} of {len(ppl):n} people have NAbs')
+
+inds = np.random.choice(len(ppl), n_infect, replace=False)
+symp = dict(asymp=inds[:n_infect//3], mild=inds[n_infect//3:2*n_infect//3], sev=inds[2*n_infect//3:])
+cvi.update_peak_nab(sc.dcp(ppl), inds, nab_pars=ppl.pars, symp=symp) # Warm up
+cvi.update_nab(sc.dcp(ppl), has_nabs)
+
+results = sc.objdict()
+for label,funcs in dict(array=[update_peak_nab, update_nab], compiled=[cvi.update_peak_nab, cvi.update_nab]).items():
+    peak_func, nab_func = funcs
+    people = sc.dcp(ppl)
+    T = sc.timer()
+    for r in range(repeats):
+        peak_func(people, inds, nab_pars=people.pars, symp=symp)
+    peak_time = T.tocout()/repeats
+    T = sc.timer()
+    for r in range(repeats):
+        nab_func(people, has_nabs)
+    nab_time = T.tocout()/repeats
+    results[label] = [peak_time, nab_time]
+    print(f'{label:>9s}: update_peak_nab {peak_time*1e3:0.2f} ms, update_nab {nab_time*1e3:0.2f} ms')
+
+print(f'Speedup: update_peak_nab {results.array[0]/results.compiled[0]:0.1f}x, update_nab {results.array[1]/results.compiled[1]:0.1f}x')
@@ -0,0 +1,35 @@
+'''
+Benchmark loading a saved population as a gzipped pickle vs. as memory-mapped
+columns.
+'''
+
+import shutil
+import sciris as sc
+import covasim as cv
+
+pop_size = 1e6
+pplfile  = 'benchmark.ppl'
+colsdir  = 'benchmark-cols'
+
+sim = cv.Sim(pop_size=pop_size, pop_type='hybrid', verbose=0)
+sim.initialize()
+
+T = sc.timer()
+sim.people.save(pplfile)
+T.tt('Save as pickle')
+sim.people.save(colsdir, columnar=True)
+T.tt('Save as columns')
+
+T = sc.timer()
+cv.People.load(pplfile)
+T.tt('Load pickle')
+cv.People.load(colsdir)
+T.tt('Load columns')
+
+for popfile in [pplfile, colsdir]:
+    T = sc.timer()
+    cv.Sim(pop_size=pop_size, pop_type='hybrid', n_days=10, popfile=popfile, verbose=0).run()
+    T.toc(f'Load and run 10 days using {popfile}')
+
+sc.rmpath(pplfile)
+shutil.rmtree(colsdir)
@@ -0,0 +1,29 @@
+'''
+Benchmark population construction, including contact creation for each layer of
+a hybrid population.
+'''
+
+import sciris as sc
+import covasim as cv
+
+pop_sizes = [1e5, 1e6]
+contacts  = dict(h=4, s=20, w=20, c=20)
+
+for pop_size in pop_sizes:
+    pop_size = int(pop_size)
+    print(f'Population size: {pop_size:n}')
+    cv.set_seed(1)
+
+    # Time the individual contact functions
+    T = sc.timer()
+    h = cv.make_microstructured_contacts(pop_size, contacts['h'])
+    T.tt('  make_microstructured_contacts')
+    c = cv.make_random_contacts(pop_size, contacts['c'])
+    T.tt('  make_random_contacts')
+
+    # Time the whole population
+    pars = dict(pop_size=pop_size, pop_type='hybrid', location=None, contacts=contacts)
+    popdict = cv.make_randpop(pars, microstructure='hybrid')
+    T.tt('  make_randpop (hybrid)')
+    n_edges = sum(len(layer['p1']) for layer in popdict['contacts'].values())
+    print(f'  {n_edges:n} edges')
@@ -0,0 +1,35 @@
+'''
+Benchmark the compiled prognoses against the array calculation in People.infect(),
+for batches of infections of different sizes in a large population.
+'''
+
+import numpy as np
+import sciris as sc
+import covasim as cv
+
+pop_size    = 2e6
+batch_sizes = [100, 10e3, 100e3]
+repeats     = 10
+
+sim = cv.Sim(pop_size=pop_size, pop_type='random', pop_infected=0, verbose=0).init_people()
+sim.initialize()
+
+for compiled in [False, True]: # Warm up
+    with cv.options.context(compiled_prognoses=compiled):
+        sc.dcp(sim.people).infect(np.arange(10))
+
+for batch_size in batch_sizes:
+    batch_size = int(batch_size)
+    results = sc.objdict()
+    for compiled in [False, True]:
+        label = 'compiled' if compiled else 'array'
+        elapsed = 0
+        for r in range(repeats):
+            ppl = sc.dcp(sim.people)
+            inds = np.random.choice(len(ppl), batch_size, replace=False)
+            with cv.options.context(compiled_prognoses=compiled):
+                T = sc.timer()
+                ppl.infect(inds)
+                elapsed += T.tocout()
+        results[label] = elapsed/repeats
+    print(f'{batch_size:>7n} infections: array {results.array*1e3:0.2f} ms, compiled {results.compiled*1e3:0.2f} ms, speedup {results.array/results.compiled:0.1f}x')
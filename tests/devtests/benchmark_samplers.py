@@ -0,0 +1,24 @@
+'''
+Benchmark drawing durations with precomputed samplers against cv.sample(), for
+the small batches typical of People.infect().
+'''
+
+import sciris as sc
+import covasim as cv
+
+sizes   = [10, 1000]
+repeats = 100_000
+dist    = cv.make_pars()['dur']['exp2inf']
+sampler = cv.make_sampler(**dist)
+
+for n in sizes:
+    results = sc.objdict()
+    T = sc.timer()
+    for r in range(repeats):
+        cv.sample(**dist, size=n)
+    results.sample = T.tocout()/repeats
+    T = sc.timer()
+    for r in range(repeats):
+        sampler.draw(n)
+    results.sampler = T.tocout()/repeats
+    print(f'n={n:>5n}: sample() {results.sample*1e6:0.2f} μs, draw() {results.sampler*1e6:0.2f} μs; speedup {results.sample/results.sampler:0.1f}x')
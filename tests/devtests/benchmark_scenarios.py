@@ -0,0 +1,31 @@
+'''
+Benchmark running scenarios independently vs. branching them from a shared
+burn-in, for scenarios whose interventions all start on the same policy date.
+'''
+
+import sciris as sc
+import covasim as cv
+
+pop_size = 50e3
+n_days   = 120
+branch   = 80
+n_runs   = 4
+
+testing = cv.test_prob(symp_prob=0.1, asymp_prob=0.001)
+scenarios = {
+    'baseline': {'name':'Baseline', 'pars': {'interventions': testing}},
+    'distance': {'name':'Distancing', 'pars': {'interventions': [testing, cv.change_beta(days=branch, changes=0.5)]}},
+    'schools':  {'name':'School closures', 'pars': {'interventions': [testing, cv.clip_edges(days=branch, changes=0.0, layers='s')]}},
+    'tracing':  {'name':'Tracing', 'pars': {'interventions': [testing, cv.contact_tracing(trace_probs=0.5, start_day=branch)]}},
+}
+base_sim = cv.Sim(pop_size=pop_size, pop_type='hybrid', n_days=n_days, verbose=0)
+
+results = sc.objdict()
+for label,run_branch in [['independent', None], ['branched', branch]]:
+    scens = cv.Scenarios(sim=base_sim, metapars={'n_runs':n_runs}, scenarios=scenarios)
+    T = sc.timer()
+    scens.run(verbose=0, branch=run_branch)
+    results[label] = T.tocout()
+    print(f'{label:>12s}: {results[label]:0.1f} s')
+
+print(f'Speedup: {results.independent/results.branched:0.1f}x')
@@ -0,0 +1,23 @@
+'''
+Benchmark running multiple sims from a large base sim, with and without placing
+the population in shared memory.
+'''
+
+import sciris as sc
+import covasim as cv
+
+pop_size = 1e6
+n_runs   = 8
+n_days   = 30
+
+if __name__ == '__main__':
+
+    sim = cv.Sim(pop_size=pop_size, pop_type='hybrid', n_days=n_days, verbose=0)
+    T = sc.timer()
+    sim.initialize()
+    T.toc('Initialization')
+
+    for shared in [False, True]:
+        T = sc.timer()
+        sims = cv.multi_run(sim, n_runs=n_runs, shared=shared)
+        T.toc(f'Running with shared={shared}')
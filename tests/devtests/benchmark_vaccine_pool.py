@@ -0,0 +1,41 @@
+'''
+Benchmark first-dose selection in vaccinate_num() and vaccinate_prob() with and
+without the eligibility pool, in a large population with vaccination running
+for most of the sim.
+'''
+
+import numpy as np
+import sciris as sc
+import covasim as cv
+
+pop_size = 2e6
+n_days   = 60
+
+def make_interventions():
+    vx = cv.vaccinate_num('pfizer', num_doses=20e3, sequence='age')
+    vp = cv.vaccinate_prob('az', days=np.arange(5, n_days), prob=0.005)
+    return [vx, vp]
+
+sim = cv.Sim(pop_size=pop_size, pop_type='random', n_days=n_days, pop_infected=0, verbose=0, interventions=make_interventions())
+sim.initialize()
+
+results = sc.objdict()
+for pool in [False, True]:
+    label = 'pool' if pool else 'default'
+    with cv.options.context(vaccine_pool=pool):
+        s = sc.dcp(sim)
+        elapsed = np.zeros(2)
+        while s.t < s.npts:
+            for i,interv in enumerate(s['interventions']):
+                T = sc.timer()
+                inds = interv.select_people(s)
+                elapsed[i] += T.tocout()
+                if len(inds):
+                    interv.vaccinate(s, inds)
+            s.t += 1
+            s.people.t = s.t
+    results[label] = elapsed/n_days
+    print(f'{label:>8s}: vaccinate_num {results[label][0]*1e3:0.2f} ms/day, vaccinate_prob {results[label][1]*1e3:0.2f} ms/day ({s.people.vaccinated.sum():n} vaccinated)')
+
+speedup = results.default/results.pool
+print(f'Speedup: vaccinate_num {speedup[0]:0.1f}x, vaccinate_prob {speedup[1]:0.1f}x')
@@ -7,4 +7,7 @@ import covasim as cv
 sim = cv.Sim()
 
 multirun1 = cv.multi_run(sim, n_runs=50, keep_people=False) # Peak memory usage: ~100 MB
-multirun2 = cv.multi_run(sim, n_runs=50, keep_people=True) # Peak memory usage: ~3 GB
\ No newline at end of file
+multirun2 = cv.multi_run(sim, n_runs=50, keep_people=True) # Peak memory usage: ~3 GB
+
+with cv.options.context(compact_people=True):
+    multirun3 = cv.multi_run(sim, n_runs=50, keep_people=True) # People arrays stored in compact form; see benchmark_compact_people.py
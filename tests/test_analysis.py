@@ -63,6 +63,19 @@ def test_age_hist():
         plots = agehist.plot(windows=True, **fname('Age histogram'))
         assert len(plots) == len(day_list), "Number of plots generated should equal number of days"
 
+    # Check the counts against np.histogram(), including for ages on the edges of the bins
+    posthoc = sim.make_age_histogram()
+    hist = posthoc.get()
+    ppl = sim.people
+    for state in posthoc.states:
+        assert np.array_equal(hist[state], np.histogram(ppl.age[ppl.defined(f'date_{state}')], bins=posthoc.edges)[0])
+    edges = np.array([5, 20.5, 30, 65])
+    codes = ppl.age_bins(edges)
+    assert codes is ppl.age_bins(edges.tolist()) # Cached
+    ppl['age'] = np.concatenate([edges, [0, 100, np.nan], ppl.age[len(edges)+3:]])
+    codes = ppl.age_bins(edges)
+    assert np.array_equal(np.bincount(codes, minlength=len(edges))[:-1], np.histogram(ppl.age, bins=edges)[0])
+
     # Check daily age histogram
     daily_age = cv.daily_age_stats()
     sim = cv.Sim(pars, analyzers=daily_age)
@@ -76,6 +89,11 @@ def test_daily_age():
     sim = cv.Sim(pars, analyzers=cv.daily_age_stats())
     sim.run()
     daily_age = sim.get_analyzer()
+    ppl = sim.people
+    entry = daily_age.results.values()[-1]
+    for state in daily_age.states: # Check the counts against np.histogram() for the last day
+        inds = sc.findinds(ppl[f'date_{state}'], entry['day'])
+        assert np.array_equal(entry[state], np.histogram(ppl.age[inds], daily_age.edges)[0])
     if do_plot:
         daily_age.plot(**fname('Daily age 1'))
         daily_age.plot(total=True, **fname('Daily age 2'))
@@ -406,6 +406,195 @@ def test_historical():
     return sim1, sim2
 
 
+def test_incremental_immunity():
+    sc.heading('Testing incremental immunity calculation')
+
+    vx = cv.vaccinate_prob('pfizer', days=np.arange(20, 60), prob=0.01)
+    sim = cv.Sim(base_pars, n_days=60, variants=cv.variant('delta', days=10, n_imports=10), interventions=vx)
+    sim.run(until=40)
+    ppl = sim.people
+    keys = ppl.meta.imm_states
+
+    # Check that only the people whose NAbs changed are updated
+    cv.immunity.check_immunity(ppl)
+    assert ppl._nab_changed == []
+    inds = cv.true(ppl.sus_imm[0,:])[:10]
+    ppl.nab[inds] = 0
+    cv.immunity.check_immunity(ppl)
+    assert ppl.sus_imm[0,inds].all() # Not recalculated since the change wasn't recorded
+    cv.immunity.mark_nab_changed(ppl, inds)
+
+    # Compare against the full calculation
+    cv.immunity.check_immunity(ppl)
+    assert not ppl.sus_imm[0,inds].any()
+    incremental = {key:ppl[key].copy() for key in keys}
+    cv.immunity.check_immunity(ppl, full=True)
+    for key in keys:
+        assert np.array_equal(incremental[key], ppl[key])
+
+    # Check that the states recorded during the rest of the run match too
+    sim.run()
+    cv.immunity.check_immunity(ppl)
+    incremental = {key:ppl[key].copy() for key in keys}
+    cv.immunity.check_immunity(ppl, full=True)
+    for key in keys:
+        assert np.array_equal(incremental[key], ppl[key])
+
+    return sim
+
+
+def test_VE_table():
+    sc.heading('Testing lookup table for NAb efficacy')
+
+    # Check that the interpolated values are within the tolerance of the exact ones
+    nab_eff = cv.make_pars()['nab_eff']
+    tol = 1e-4
+    VE_table = cv.immunity.make_VE_table(nab_eff, tol)
+    nab = np.concatenate([[0, 1e-9, 1e9], np.logspace(-7, 7, 100_000)]) # Include values outside the table
+    approx = cv.immunity.calc_VE_table(nab, VE_table, nab_eff)
+    for i,ax in enumerate(['sus', 'symp', 'sev']):
+        exact = cv.immunity.calc_VE(nab, ax, nab_eff)
+        max_dev = np.abs(approx[i] - exact).max()
+        print(f'Maximum deviation for {ax}: {max_dev:0.2e}')
+        assert max_dev <= tol
+
+    with pytest.raises(ValueError):
+        cv.immunity.make_VE_table(nab_eff, tol=0)
+
+    # Check that the protection computed during a sim matches the exact calculation
+    vx = cv.vaccinate_prob('pfizer', days=np.arange(20, 60), prob=0.01)
+    sim = cv.Sim(base_pars, n_days=60, interventions=vx, nab_eff_tol=tol)
+    sim.initialize()
+    table = sim._nab_eff_table # Constructed by init_immunity()
+    assert table['tol'] == tol and sim.people._nab_eff_table is table
+    sim.run()
+    ppl = sim.people
+    assert 'nab_eff_table' not in sim.pars and cv.immunity.get_VE_table(ppl) is table
+    keys = ppl.meta.imm_states
+    cv.immunity.check_immunity(ppl, full=True)
+    approx = {key:ppl[key].copy() for key in keys}
+    sim['nab_eff_tol'] = None
+    cv.immunity.check_immunity(ppl, full=True)
+    for key in keys:
+        assert np.abs(approx[key] - ppl[key]).max() <= tol + 1e-6 # Allow for rounding to float32
+    sim['nab_eff_tol'] = tol/10 # The table is reconstructed if the tolerance or the efficacy parameters change
+    assert cv.immunity.get_VE_table(ppl)['tol'] == tol/10
+    sim['nab_eff'] = sc.mergedicts(sim['nab_eff'], {'beta_inf':1.5})
+    assert cv.immunity.get_VE_table(ppl)['nab_eff']['beta_inf'] == 1.5 and ppl._nab_eff_table['nab_eff']['beta_inf'] == 1.5
+
+    return sim
+
+
+def test_nab_kinetics():
+    sc.heading('Testing compiled NAb kinetics against the array calculation')
+
+    # Reference implementations, using array operations on the people
+    def update_peak_nab(people, inds, nab_pars, symp=None):
+        pars = people.pars
+        has_nabs = people.nab[inds] > 0
+        no_prior_nab_inds = inds[~has_nabs]
+        prior_nab_inds = inds[has_nabs]
+        people.peak_nab[prior_nab_inds] *= nab_pars['nab_boost']
+        if len(no_prior_nab_inds):
+            no_prior_nab = 2 ** cv.utils.sample(**nab_pars['nab_init'], size=len(no_prior_nab_inds))
+            if symp is not None:
+                prior_symp = np.full(pars['pop_size'], np.nan)
+                prior_symp[symp['asymp']] = pars['rel_imm_symp']['asymp']
+                prior_symp[symp['mild']] = pars['rel_imm_symp']['mild']
+                prior_symp[symp['sev']] = pars['rel_imm_symp']['severe']
+                prior_symp[prior_nab_inds] = np.nan
+                prior_symp = prior_symp[~np.isnan(prior_symp)]
+                no_prior_nab = no_prior_nab * prior_symp * (1 + nab_pars['nab_eff']['alpha_inf_diff'])
+            people.peak_nab[no_prior_nab_inds] = no_prior_nab
+        people.t_nab_event[inds] = people.t
+        return
+
+    def update_nab(people, inds):
+        t_since_boost = people.t - people.t_nab_event[inds]
+        people.nab[inds] += people.pars['nab_kin'][t_since_boost]*people.peak_nab[inds]
+        people.nab[inds] = np.where(people.nab[inds]<0, 0, people.nab[inds])
+        people.nab[inds] = np.where([people.nab[inds] > people.peak_nab[inds]], people.peak_nab[inds], people.nab[inds])
+        return
+
+    # Run a sim partway so that some people have NAbs
+    vx = cv.vaccinate_prob('pfizer', days=np.arange(20, 60), prob=0.01)
+    sim = cv.Sim(base_pars, n_days=60, variants=cv.variant('delta', days=10, n_imports=10), interventions=vx)
+    sim.run(until=40)
+    keys = ['nab', 'peak_nab', 't_nab_event']
+    def check(func, ref_func, *args, **kwargs):
+        ppl1 = sc.dcp(sim.people)
+        ppl2 = sc.dcp(sim.people)
+        cv.set_seed(1)
+        func(ppl1, *args, **kwargs)
+        cv.set_seed(1)
+        ref_func(ppl2, *args, **kwargs)
+        for key in keys:
+            assert np.array_equal(ppl1[key], ppl2[key])
+        return
+
+    # Infections, in an arbitrary order and including people with and without prior NAbs
+    ppl = sim.people
+    has_nabs = cv.true(ppl.peak_nab)
+    assert len(has_nabs) > 100
+    inds = np.random.default_rng(1).permutation(np.concatenate([has_nabs[:100], cv.false(ppl.peak_nab)[:500]]))
+    n = len(inds)//3
+    symp = dict(asymp=inds[:n], mild=inds[n:2*n], sev=inds[2*n:])
+    check(cv.immunity.update_peak_nab, update_peak_nab, inds, nab_pars=ppl.pars, symp=symp)
+
+    # Vaccinations and waning
+    check(cv.immunity.update_peak_nab, update_peak_nab, inds, nab_pars=sim['interventions'][0].p)
+    check(cv.immunity.update_nab, update_nab, has_nabs)
+
+    return sim
+
+
+def test_vaccine_pool():
+    sc.heading('Testing the vaccine eligibility pool')
+
+    # With a 0/1 subtarget, who gets vaccinate_num() doses doesn't depend on random numbers, so is identical with the pool
+    n_days = 60
+    num_doses = {i:20*(i%3 != 0) for i in np.arange(n_days)} # Include days without doses, so some second doses are deferred
+    n = int(base_pars.pop_size)
+    half = n//2
+    subtarget = dict(inds=np.arange(n), vals=np.arange(n) < half) # Only the first half are eligible
+    vx = cv.vaccinate_num(vaccine='pfizer', sequence='age', num_doses=num_doses, subtarget=subtarget)
+    n_checked = sc.objdict(first=0, deferred=0)
+    def check(sim):
+        selected = []
+        for pool in [False, True]: # Ends with the pool on, as for the sim
+            cv.set_seed(sim.t)
+            cv.options.set(vaccine_pool=pool)
+            interv = sc.dcp(sim['interventions'][1])
+            selected.append(interv.select_people(sim))
+        assert np.array_equal(*selected)
+        n_checked.first += (interv.doses[selected[1].astype(int)] == 0).sum()
+        n_checked.deferred += len(interv._scheduled_doses[sim.t+1])
+        return
+    with cv.options.context(vaccine_pool=True):
+        sim = cv.Sim(base_pars, n_days=n_days, rescale=False, use_waning=True, interventions=[check, vx])
+        sim.run()
+    vx = sim['interventions'][1]
+    assert n_checked.first > 100 and n_checked.deferred > 0
+    assert vx.doses[:half].sum() > 100 and not vx.doses[half:].any()
+
+    # vaccinate_prob() chooses the same number of people on average, and boosters only go to vaccinated people
+    prob = 0.02
+    days = np.arange(10, 50)
+    vp = cv.vaccinate_prob('az', days=days, prob=prob)
+    bp = cv.vaccinate_prob('pfizer', days=40, prob=0.5, booster=True, label='pfizer booster')
+    with cv.options.context(vaccine_pool=True):
+        sim = cv.Sim(base_pars, n_days=n_days, use_waning=True, interventions=[vp, bp])
+        sim.run()
+    vp, bp = sim['interventions']
+    expected = 1 - (1-prob)**len(days)
+    vaccinated = (vp.doses > 0).mean()
+    assert abs(vaccinated - expected) < 0.08, f'Coverage with the pool was {vaccinated:0.3f}, but expected {expected:0.3f}'
+    assert (bp.doses > 0).any() and not (bp.doses > vp.doses).any()
+    assert vp.doses.max() == vp.p.doses
+
+    return sim
+
+
 #%% Run as a script
 if __name__ == '__main__':
 
@@ -422,6 +611,10 @@ if __name__ == '__main__':
     sim6  = test_vaccine_target_eff()
     res   = test_decays(do_plot=do_plot)
     sims7 = test_historical()
+    sim8  = test_incremental_immunity()
+    sim9  = test_VE_table()
+    sim10 = test_nab_kinetics()
+    sim11 = test_vaccine_pool()
 
     sc.toc(T)
     print('Done.')
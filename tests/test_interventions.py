@@ -167,6 +167,58 @@ def test_data_interventions():
     return
 
 
+def test_quarantine_scheduling():
+    sc.heading('Testing quarantine scheduling against the sequential implementation')
+
+    def check_quar_loop(ppl, pending):
+        ''' The previous implementation of people.check_quar(), which handled each scheduled quarantine in turn '''
+        n_quarantined = 0
+        for ind,end_day in pending:
+            if ppl.quarantined[ind]:
+                ppl.date_end_quarantine[ind] = max(ppl.date_end_quarantine[ind], end_day)
+            elif not (ppl.dead[ind] or ppl.recovered[ind] or ppl.diagnosed[ind] or ppl.isolated[ind]):
+                ppl.quarantined[ind] = True
+                ppl.date_quarantined[ind] = ppl.t
+                ppl.date_end_quarantine[ind] = end_day
+                n_quarantined += 1
+        diag_inds = cv.true(ppl.quarantined & (ppl.date_diagnosed == ppl.t))
+        ppl.date_end_quarantine[diag_inds] = ppl.t
+        end_inds = ppl.check_inds(~ppl.quarantined, ppl.date_end_quarantine, filter_inds=None)
+        ppl.quarantined[end_inds] = False
+        return n_quarantined
+
+    # Run a sim with testing and tracing partway, so people are in a mix of states
+    pars = dict(pop_size=5000, n_days=60, verbose=0, interventions=[cv.test_prob(symp_prob=0.2, test_delay=2), cv.contact_tracing(trace_probs=0.5)])
+    sim = cv.Sim(pars)
+    sim.run(until=40)
+    ppl = sim.people
+    assert ppl.quarantined.any() and ppl.diagnosed.any()
+
+    # Schedule overlapping quarantines, including duplicates and people already in quarantine
+    np.random.seed(1)
+    t = ppl.t = sim.t
+    ppl._pending_quarantine.clear()
+    pending = []
+    for period in [3, 14, 7, 10]:
+        inds = np.random.randint(0, len(ppl), size=1000)
+        inds = np.concatenate([inds, cv.true(ppl.quarantined)[:50]])
+        ppl.schedule_quarantine(inds, start_date=t, period=period)
+        pending += [(ind, t+period) for ind in inds]
+    ppl.schedule_quarantine(list(range(20)), start_date=t+1) # Should be left for the next day
+
+    # Compare the two implementations
+    keys = ['quarantined', 'date_quarantined', 'date_end_quarantine']
+    ref = sc.dcp(ppl)
+    n_ref = check_quar_loop(ref, pending)
+    n_quar = ppl.check_quar()
+    assert n_quar == n_ref > 0
+    for key in keys:
+        assert np.array_equal(ppl[key], ref[key], equal_nan=True), key
+    assert t not in ppl._pending_quarantine and len(ppl._pending_quarantine[t+1]) == 1
+
+    return ppl
+
+
 #%% Run as a script
 if __name__ == '__main__':
 
@@ -176,6 +228,7 @@ if __name__ == '__main__':
 
     test_all_interventions(do_plot=do_plot)
     test_data_interventions()
+    test_quarantine_scheduling()
 
     sc.toc(T)
     print('Done.')
\ No newline at end of file
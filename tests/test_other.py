@@ -133,6 +133,21 @@ def test_basepeople():
     assert len(layer2) == n
     assert len(layer2.keys()) == 5
 
+    # Contact lookups: the first uses a scan of the edges, the rest the adjacency index, and all should match the brute-force answer
+    inds = np.array([0, 5, 17, 999])
+    expected = np.unique(np.concatenate([p2[np.isin(p1, inds)], p1[np.isin(p2, inds)]]))
+    for i in range(2):
+        assert np.array_equal(layer.find_contacts(inds), expected)
+    assert layer.find_contacts(inds, as_array=False) == set(expected.tolist())
+    neighbors, edges = layer.neighbors(inds)
+    sources = np.repeat(inds, layer.degree(inds))
+    assert np.array_equal(np.unique(neighbors), expected)
+    assert ((layer['p1'][edges] == sources) & (layer['p2'][edges] == neighbors) | (layer['p2'][edges] == sources) & (layer['p1'][edges] == neighbors)).all()
+    to_move = layer.pop_inds(np.flatnonzero(np.isin(p1, inds) | np.isin(p2, inds))) # Changing the layer discards the index
+    assert not len(layer.find_contacts(inds)) and not len(layer.neighbors(inds, return_edges=False))
+    layer.append(to_move)
+    assert np.array_equal(layer.find_contacts(inds), expected)
+
     # Test dynamic layers, plotting, and stories
     pars = dict(pop_size=100, n_days=10, verbose=verbose, pop_type='hybrid', beta=0.02)
     s1 = cv.Sim(pars, dynam_layer={'c':1})
@@ -146,6 +161,54 @@ def test_basepeople():
     s2.run()
     assert cv.diff_sims(s1, s2, output=True)
 
+    # Infection log methods
+    log = s1.people.infection_log
+    entries = log.to_list()
+    assert len(entries) == len(log) == s1.results['cum_infections'][-1]
+    assert entries[0] == log[0] and entries[-1] == log[-1]
+    assert all(e['source'] is None for e in entries if e['layer'] == 'seed_infection')
+    for t in [0, 5]:
+        rows = log.by_date(t)
+        assert [e for e in entries if e['date'] == t] == log[rows]
+    assert log.to_df().shape == (len(log), 5)
+    log2 = cv.InfectionLog.from_list(entries)
+    assert log2.to_list() == entries
+    assert log2 == log and log == entries
+    log3 = cv.InfectionLog(capacity=1)
+    log3.append([1, 2, 3], source=[0, 0, 1], date=2, layer='h', variant='wild')
+    log3.append([4], date=1, layer='seed_infection', variant='wild')
+    assert log3.capacity >= 4
+    assert log3.by_date(2).tolist() == [0, 1, 2] # Check unsorted dates
+    assert log3[3]['source'] is None and log3[3]['layer'] == 'seed_infection'
+    with pytest.raises(IndexError):
+        log3[4]
+    log4 = cv.InfectionLog()
+    log4.encode('layer', 'seed_infection')
+    log4.append([1, 2, 3], source=[0, 0, 1], date=2, layer='h', variant='wild')
+    assert log4 != log3
+    log4.append([4], date=1, layer='seed_infection', variant='wild')
+    assert log4 == log3 and log4.labels != log3.labels # Layers are compared by label, not code
+    assert log3 != s2.people.infection_log
+
+    # Compact storage: arrays are decoded on access, and are unchanged except for the immunity levels
+    ppl = sc.dcp(s1.people)
+    orig = {key:ppl[key].copy() for key in ppl.keys()}
+    ppl.compact()
+    assert ppl.is_compact and 'symptomatic' not in ppl.__dict__
+    for key,arr in orig.items():
+        assert ppl[key].dtype == arr.dtype and ppl[key].shape == arr.shape
+        if key not in ppl.meta.imm_states:
+            assert np.array_equal(getattr(ppl, key), arr, equal_nan=True), f'{key} differs'
+    assert np.array_equal(cv.true(ppl.symptomatic), cv.true(orig['symptomatic']))
+    assert np.array_equal(cv.defined(ppl.date_dead), cv.defined(orig['date_dead']))
+    ppl['exposed'] = orig['exposed'] # Setting an array replaces the compact one
+    ppl.expand()
+    assert not ppl.is_compact and ppl.exposed is orig['exposed']
+    with cv.options.context(compact_people=True):
+        s3 = cv.Sim(pars).run()
+    assert s3.people.is_compact
+    s3.people.plot()
+
     # Create a bare People object
     ppl = cv.People(100)
     with pytest.raises(sc.KeyNotFoundError): # Need additional parameters
@@ -283,6 +346,29 @@ def test_population():
         sim = cv.Sim(pop_type='not_an_option')
         sim.initialize()
 
+    # Contact creation
+    pop_size = 1000
+    cv.set_seed(1)
+    h = cv.make_microstructured_contacts(pop_size, 4)
+    layer = cv.Layer(**h)
+    layer.validate()
+    assert np.all(h['p1'] < h['p2']) # Each pair is only listed once
+    for cluster_size,h_test in [(4, h), (200, cv.make_microstructured_contacts(400, 200))]: # Each source's targets are listed in the same order as the Python set previously used, including when the set is resized
+        for source in np.unique(h_test['p1']):
+            targets = h_test['p2'][h_test['p1'] == source]
+            assert targets.tolist() == list(set(range(source+1, targets.max()+1)))
+    for i in [0, pop_size//2, pop_size-1]: # Everyone in a cluster is connected to everyone else in it
+        cluster = np.sort(np.append(layer.find_contacts(i), i))
+        assert np.array_equal(cluster, np.arange(cluster[0], cluster[-1]+1))
+        for j in cluster:
+            assert np.array_equal(np.sort(np.append(layer.find_contacts(j), j)), cluster)
+    r = cv.make_random_contacts(pop_size, 20, overshoot=0.5) # Check that too small an overshoot still works
+    assert r['p1'].dtype == r['p2'].dtype == cv.default_int
+    assert len(r['p1']) == len(r['p2'])
+    assert abs(len(r['p1'])/pop_size - 10) < 1
+    cv.set_seed(1)
+    assert np.array_equal(cv.make_microstructured_contacts(pop_size, 4)['p2'], h['p2']) # Check reproducibility
+
     # Save/load
     sim = cv.Sim(pop_size=100)
     sim.initialize()
@@ -294,6 +380,24 @@ def test_population():
 
     remove_files(pop_path)
 
+    # Save/load as columns
+    cols_path = 'pop_test_cols'
+    sim = cv.Sim(pop_size=100, pop_type='hybrid', n_days=20)
+    sim.initialize()
+    sim.people.save(cols_path, columnar=True)
+    people = cv.People.load(cols_path)
+    for key in sim.people.keys():
+        assert np.array_equal(people[key], sim.people[key], equal_nan=True)
+    assert people.age.base is not None # Check that it's memory-mapped
+    sim1 = cv.Sim(pop_size=100, pop_type='hybrid', n_days=20, popfile=cols_path).run()
+    sim2 = sim.run()
+    assert np.array_equal(sim1.results['cum_infections'].values, sim2.results['cum_infections'].values)
+    assert np.array_equal(cv.People.load(cols_path).susceptible, people.susceptible) # Check that running didn't change the files
+    with pytest.raises(ValueError):
+        cv.Sim(pop_size=101, popfile=cols_path).initialize()
+    del people, sim1 # Release the memory maps
+    sc.rmpath(cols_path)
+
     return
 
 
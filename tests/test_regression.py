@@ -8,6 +8,7 @@ not checked in) and running:
     tr.make_sim(do_save=True)
 '''
 
+import numpy as np
 import sciris as sc
 import covasim as cv
 import pytest
@@ -77,6 +78,28 @@ def test_migration():
     new_msim = cv.migrate(msim, die=True)
     new_scens = cv.migrate(scens, die=True)
 
+    # Sims saved before stocks could be registered can still be run
+    old_sim = cv.Sim(pop_size=pop_size, verbose=0)
+    old_sim.run(until=10)
+    del old_sim._stocks
+    old_sim = cv.migrate(old_sim, die=True)
+    old_sim.run()
+    assert old_sim.results['n_susceptible'][-1] > 0
+
+    # Pending quarantines stored as (ind, end_day) tuples are converted
+    tp = cv.test_prob(symp_prob=0.2)
+    ct = cv.contact_tracing(trace_probs=0.5, trace_time=2)
+    new_quar = cv.Sim(pop_size=pop_size, verbose=0, interventions=[tp, ct])
+    new_quar.run(until=30)
+    old_quar = new_quar.copy()
+    for t,pending in old_quar.people._pending_quarantine.items():
+        old_quar.people._pending_quarantine[t] = [(ind, end_day) for inds,end_days in pending for ind,end_day in zip(inds, end_days)]
+    assert any(len(pending) for pending in old_quar.people._pending_quarantine.values())
+    old_quar = cv.migrate(old_quar, die=True)
+    new_quar.run()
+    old_quar.run()
+    assert np.array_equal(new_quar.results['new_quarantined'].values, old_quar.results['new_quarantined'].values)
+
     # Try something un-migratable
     with pytest.raises(TypeError):
         cv.migrate('Strings are not migratable', die=True)
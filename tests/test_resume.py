@@ -69,6 +69,38 @@ def test_reset_seed():
     return s1
 
 
+def test_copy_resume():
+    sc.heading('Test that a partially run sim can be copied and resumed')
+
+    until = 30
+    s0 = cv.Sim(pars)
+    s1 = s0.copy()
+    s0.run()
+
+    s1.run(until=until)
+    state = cv.get_rng_state() # The random number stream is not part of the sim, so store it separately
+    s2 = s1.copy()
+    s1.run(reset_seed=False)
+    cv.set_rng_state(state)
+    s2.run(reset_seed=False)
+
+    assert np.all(s0.results['cum_infections'].values == s1.results['cum_infections'].values)
+    assert np.all(s0.results['cum_infections'].values == s2.results['cum_infections'].values) # The copy should continue identically
+
+    # Without the Numba internals, give a clear error rather than an AttributeError
+    helperlib = cv.utils.nb._helperlib
+    try:
+        cv.utils.nb._helperlib = None
+        with pytest.raises(NotImplementedError):
+            cv.get_rng_state()
+        with pytest.raises(NotImplementedError):
+            cv.set_rng_state(state)
+    finally:
+        cv.utils.nb._helperlib = helperlib
+
+    return s2
+
+
 def test_reproducibility():
     sc.heading('Test that sims are reproducible')
 
@@ -161,6 +193,7 @@ if __name__ == '__main__':
 
     sim1 = test_resuming()
     sim2 = test_reset_seed()
+    sim6 = test_copy_resume()
     sim3 = test_reproducibility()
     sim4 = test_step()
     sim5 = test_stopping()
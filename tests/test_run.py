@@ -4,7 +4,10 @@ Tests for run options (multisims and scenarios)
 
 #%% Imports and settings
 import os
+import gc
+import weakref
 import numpy as np
+import pytest
 import sciris as sc
 import covasim as cv
 
@@ -146,6 +149,114 @@ def test_multisim_advanced():
     return merged1, merged2
 
 
+def test_shared_multirun():
+    sc.heading('Multirun with shared memory')
+
+    # Check that running from shared memory gives the same results as copying the sim
+    sim = cv.Sim(pop_size=pop_size, pop_type='hybrid', n_days=30, dynam_layer={'c':1}, verbose=verbose)
+    sim.initialize()
+    sims1 = cv.multi_run(sim.copy(), n_runs=3)
+    sims2 = cv.multi_run(sim, n_runs=3, shared=True)
+    for s1,s2 in zip(sims1, sims2):
+        for key in s1.result_keys():
+            assert np.array_equal(s1.results[key].values, s2.results[key].values, equal_nan=True)
+
+    # Check that the people can be kept, and that the base sim is unchanged
+    sims3 = cv.multi_run(sim, n_runs=2, shared=True, keep_people=True)
+    assert len(sims3[0].people.contacts['h']) == len(sim.people.contacts['h'])
+    assert sim.people.t == 0
+
+    # Check that changes made by one sim, including to its contact layers, are not seen by the others
+    shared = cv.run.SharedPeople(sim.people)
+    try:
+        shells = [shared.make_shell(sim) for i in range(2)]
+        for shell in shells:
+            shared.attach(shell.people)
+        ppl1, ppl2 = [shell.people for shell in shells]
+        assert ppl1.contacts['h']['beta'].flags.writeable and ppl1.age.flags.writeable
+        ppl1.contacts['h']['beta'][:] = 0
+        ppl1.age[:] = -1
+        assert np.array_equal(ppl2.contacts['h']['beta'], sim.people.contacts['h']['beta'])
+        assert np.array_equal(ppl2.age, sim.people.age)
+        shared.attach(ppl1)
+        assert np.array_equal(ppl1.age, sim.people.age) # The files are unchanged
+        for ppl in [ppl1, ppl2]:
+            shared.detach(ppl)
+            assert ppl.age.flags.owndata
+    finally:
+        shared.unlink()
+
+    return sims2
+
+
+def test_streaming_reduce():
+    sc.heading('Streaming multisim reduction')
+
+    sim = cv.Sim(pop_size=pop_size, n_days=40, verbose=verbose)
+    msim = cv.MultiSim(sim, n_runs=30)
+    msim.run()
+
+    # The reducer is exact while the results are all stored...
+    reducer = cv.StreamingReducer(n_exact=30)
+    for s in msim.sims:
+        reducer.add(s)
+    for use_mean in [False, True]:
+        r1 = msim.reduce(use_mean=use_mean, output=True)
+        r2 = reducer.to_sim(use_mean=use_mean)
+        for key in r1.result_keys():
+            for attr in ['values', 'low', 'high']:
+                assert np.allclose(getattr(r1.results[key], attr), getattr(r2.results[key], attr), rtol=1e-12, atol=0, equal_nan=True)
+        msim.reset()
+
+    # ...and approximate after that
+    reducer = cv.StreamingReducer(n_exact=10)
+    for s in msim.sims:
+        reducer.add(s)
+    r1 = msim.reduce(output=True)
+    r2 = reducer.to_sim()
+    for key in ['cum_infections', 'n_infectious', 'n_susceptible']:
+        res1, res2 = r1.results[key], r2.results[key]
+        tol = 0.25*np.nanmax(res1.high - res1.low) # Loose, since the tail quantiles of so few runs are not well estimated
+        for attr in ['values', 'low', 'high']:
+            assert np.nanmax(np.abs(getattr(res1, attr) - getattr(res2, attr))) <= tol
+
+    # Check running without keeping the sims
+    msim2 = cv.MultiSim(sim, n_runs=4)
+    msim2.run(keep_sims=False, reduce=True)
+    assert len(msim2) == 0
+    assert msim2.base_sim.metadata['n_runs'] == 4
+    msim2.reset()
+    msim2.mean()
+    with pytest.raises(ValueError):
+        msim2.reduce(quantiles=[0.05, 0.95])
+
+    # Check the arguments to sc.parallelize() that are supported, and that others raise an exception
+    reducers = [cv.StreamingReducer(), cv.StreamingReducer()]
+    cv.multi_run(sim, n_runs=4, reducer=reducers[0])
+    cv.multi_run(sim, n_runs=4, reducer=reducers[1], par_args=dict(parallelizer='multiprocess', ncpus=2))
+    assert np.array_equal(*[r.to_sim().results['cum_infections'].values for r in reducers])
+    with pytest.raises(ValueError):
+        cv.multi_run(sim, n_runs=2, reducer=cv.StreamingReducer(), par_args=dict(maxmem=0.9))
+    with pytest.raises(ValueError):
+        cv.multi_run(sim, n_runs=2, reducer=cv.StreamingReducer(), combine=True)
+
+    # Check that results are not kept once they have been used
+    jobs = {i:dict(sim=sim, ind=i) for i in range(6)}
+    for parallelizer in ['concurrent.futures', 'multiprocess']:
+        for ordered in [True, False]:
+            prev = None
+            keys = []
+            for key,run_sim in cv.run._iter_parallel(cv.single_run, jobs, par_args=dict(parallelizer=parallelizer, ncpus=2), ordered=ordered):
+                gc.collect()
+                assert prev is None or prev() is None, 'The previous result should have been released'
+                prev = weakref.ref(run_sim)
+                keys.append(key)
+                del run_sim
+            assert sorted(keys) == list(jobs.keys())
+
+    return msim2
+
+
 def test_simple_scenarios(do_plot=do_plot):
     sc.heading('Simple scenarios test')
     basepars = {'pop_size':pop_size}
@@ -255,6 +366,141 @@ def test_complex_scenarios(do_plot=do_plot, do_save=False, fig_path=None):
     return scens
 
 
+def test_scenario_jobs():
+    sc.heading('Test that scenarios run as a single set of jobs match multi_run()')
+
+    scenarios = {
+        'baseline': {'name':'Baseline', 'pars': {}},
+        'larger':   {'name':'Larger', 'pars': {'pop_size': 2*pop_size}}, # Run first, since it's the largest
+    }
+    base_sim = cv.Sim(pop_size=pop_size, n_days=30, verbose=verbose)
+    scens = cv.Scenarios(sim=base_sim, metapars={'n_runs': 3, 'noise': 0.1}, scenarios=scenarios)
+    scens.run(verbose=verbose, n_cpus=2)
+    assert list(scens.sims.keys()) == list(scenarios.keys())
+
+    for scenkey,scen in scenarios.items():
+        sim = base_sim.copy()
+        sim.update_pars(scen['pars'])
+        sims = cv.multi_run(sim, n_runs=3, noise=0.1)
+        for sim1,sim2 in zip(scens.sims[scenkey], sims):
+            assert np.array_equal(sim1.results['cum_infections'].values, sim2.results['cum_infections'].values)
+        best = np.quantile([sim.results['new_infections'].values for sim in sims], q=0.5, axis=0)
+        assert np.array_equal(scens.results['new_infections'][scenkey]['best'], best)
+
+    # Arguments to sc.parallelize() are used, including ones that need each scenario to be run with multi_run()
+    for par_args in [dict(parallelizer='multiprocess'), dict(maxcpu=0.99)]:
+        scens2 = cv.Scenarios(sim=base_sim, metapars={'n_runs': 3, 'noise': 0.1}, scenarios=scenarios)
+        scens2.run(verbose=verbose, par_args=par_args)
+        assert np.array_equal(scens2.results['new_infections']['larger']['best'], scens.results['new_infections']['larger']['best'])
+
+    return scens
+
+
+def test_branched_scenarios():
+    sc.heading('Test that branched scenarios match independent runs')
+
+    testing = cv.test_prob(symp_prob=0.1, asymp_prob=0.001)
+    scenarios = {
+        'baseline': {'name':'Baseline', 'pars': {'interventions': testing}},
+        'distance': {'name':'Distancing', 'pars': {'interventions': [testing, cv.change_beta(days=20, changes=0.5)]}},
+        'tracing':  {'name':'Tracing', 'pars': {'interventions': [testing, cv.contact_tracing(trace_probs=0.5, start_day=20)]}},
+        'testing':  {'name':'More testing', 'pars': {'interventions': [testing, cv.test_prob(symp_prob=0.2, start_day=25)]}},
+    }
+    base_sim = cv.Sim(pop_size=pop_size, n_days=50, verbose=verbose)
+    metapars = {'n_runs': 2, 'noise': 0.1}
+
+    scens1 = cv.Scenarios(sim=base_sim, metapars=metapars, scenarios=scenarios).run(verbose=verbose)
+    scens2 = cv.Scenarios(sim=base_sim, metapars=metapars, scenarios=scenarios).run(verbose=verbose, branch=20)
+    for scenkey in scenarios.keys():
+        for sim1,sim2 in zip(scens1.sims[scenkey], scens2.sims[scenkey]):
+            for reskey in sim1.result_keys():
+                assert np.array_equal(sim1.results[reskey].values, sim2.results[reskey].values, equal_nan=True), f'{scenkey}: {reskey} differs'
+
+    # Scenarios can't change anything that would affect the burn-in
+    with pytest.raises(ValueError):
+        cv.Scenarios(sim=base_sim, scenarios={'beta': {'name':'Beta', 'pars': {'beta': 0.02}}}).run(verbose=verbose, branch=20)
+    with pytest.raises(ValueError):
+        cv.Scenarios(sim=base_sim, scenarios=scenarios).run(verbose=verbose, debug=True, branch=30) # Interventions start before the branch
+    with pytest.raises(ValueError):
+        early = {'baseline': scenarios['baseline'], 'testing': {'name':'Early testing', 'pars': {'interventions': [testing, cv.test_prob(symp_prob=0.2)]}}} # Starts on day 0
+        cv.Scenarios(sim=base_sim, scenarios=early).run(verbose=verbose, debug=True, branch=20)
+
+    # Without the Numba internals needed to restore the random number stream, the scenarios are run independently
+    helperlib = cv.utils.nb._helperlib
+    try:
+        cv.utils.nb._helperlib = None
+        with pytest.warns(RuntimeWarning):
+            scens3 = cv.Scenarios(sim=base_sim, metapars=metapars, scenarios=scenarios).run(verbose=verbose, branch=20)
+    finally:
+        cv.utils.nb._helperlib = helperlib
+    for scenkey in scenarios.keys():
+        for sim1,sim3 in zip(scens1.sims[scenkey], scens3.sims[scenkey]):
+            assert np.array_equal(sim1.results['cum_infections'].values, sim3.results['cum_infections'].values)
+
+    return scens2
+
+
+def test_ensemble():
+    sc.heading('Test that an ensemble of replicates runs as a single sim')
+
+    interventions = [cv.test_prob(symp_prob=0.1), cv.contact_tracing(trace_probs=0.3), cv.vaccinate_prob('pfizer', days=10, prob=0.1)]
+    sim = cv.Sim(pop_size=pop_size, n_days=30, verbose=verbose, interventions=interventions)
+
+    # A single replicate is identical to running the sim itself
+    ens1 = cv.EnsembleSim(sim, n_runs=1)
+    ens1.run()
+    sim1 = sim.copy()
+    sim1.run()
+    for reskey in sim1.result_keys():
+        assert np.array_equal(ens1.sims[0].results[reskey].values, sim1.results[reskey].values, equal_nan=True), f'{reskey} differs'
+
+    # Several replicates add up to the ensemble, and keep their own people
+    n_runs = 3
+    ens = cv.EnsembleSim(sim, n_runs=n_runs, keep_people=True)
+    ens.run()
+    for reskey in ['new_infections', 'new_tests', 'new_doses', 'new_quarantined', 'n_exposed']:
+        total = sum([s.results[reskey].values for s in ens.sims])
+        assert np.array_equal(total, ens.results[reskey].values), f'{reskey} differs'
+    for r,s in enumerate(ens.sims):
+        assert s['rand_seed'] == sim['rand_seed'] and s.ensemble_run == r # The seed of each replicate is the one used to run them all
+        assert len(s.people) == pop_size
+        assert len(s.people.infection_log) == s.people.n_infections.sum()
+        assert s.people.contacts['a']['p1'].max() < pop_size
+    msim = ens.to_multisim()
+    msim.mean()
+    assert len(msim.sims) == n_runs
+
+    # Replicates differ from each other, and match separate runs in distribution
+    n_runs = 8
+    ens = cv.EnsembleSim(sim, n_runs=n_runs)
+    ens.run()
+    msim2 = cv.MultiSim(sim, n_runs=n_runs)
+    msim2.run()
+    ens_infs = np.array([s.results['cum_infections'][-1] for s in ens.sims])
+    msim_infs = np.array([s.results['cum_infections'][-1] for s in msim2.sims])
+    assert len(np.unique(ens_infs)) > 1, 'Replicates should differ from each other'
+    stderr = np.sqrt((ens_infs.var(ddof=1) + msim_infs.var(ddof=1))/n_runs)
+    assert abs(ens_infs.mean() - msim_infs.mean()) < 4*stderr + 1, f'Ensemble mean {ens_infs.mean()} differs from multisim mean {msim_infs.mean()}'
+
+    # Subtargeting by indices applies to the same people in each replicate
+    subtarget = {'inds':np.arange(50), 'vals':1.0}
+    vx = cv.vaccinate_prob('pfizer', days=1, prob=0, subtarget=subtarget)
+    ens = cv.EnsembleSim(cv.Sim(pop_size=pop_size, n_days=5, verbose=verbose, interventions=vx), n_runs=3, keep_people=True)
+    ens.run()
+    for s in ens.sims:
+        vacc_inds = cv.true(s.people.vaccinated)
+        assert len(vacc_inds) == 50 and vacc_inds.max() < 50
+
+    # Interventions that count across the whole population are not supported, even in a sequence
+    with pytest.raises(ValueError):
+        cv.EnsembleSim(cv.Sim(pop_size=pop_size, verbose=verbose, interventions=cv.test_num(daily_tests=10)), n_runs=2).run()
+    seq = cv.sequence(days=[0, 10], interventions=[cv.test_prob(symp_prob=0.1), cv.test_num(daily_tests=10)])
+    with pytest.raises(ValueError):
+        cv.EnsembleSim(cv.Sim(pop_size=pop_size, verbose=verbose, interventions=seq), n_runs=2).run()
+
+    return msim
+
+
 #%% Run as a script
 if __name__ == '__main__':
 
@@ -267,8 +513,13 @@ if __name__ == '__main__':
     msim1  = test_multisim_reduce(do_plot=do_plot)
     msim2  = test_multisim_combine(do_plot=do_plot)
     m1,m2  = test_multisim_advanced()
+    sims3  = test_shared_multirun()
+    msim3  = test_streaming_reduce()
     scens1 = test_simple_scenarios(do_plot=do_plot)
     scens2 = test_complex_scenarios(do_plot=do_plot)
+    scens3 = test_scenario_jobs()
+    scens4 = test_branched_scenarios()
+    msim4  = test_ensemble()
 
     sc.toc(T)
     print('Done.')
@@ -5,8 +5,10 @@ Tests for single simulations
 #%% Imports and settings
 import os
 import pytest
+import numpy as np
 import sciris as sc
 import covasim as cv
+import covasim.utils as cvu
 
 do_plot = 1
 do_save = 0
@@ -134,6 +136,231 @@ def test_dynamic_resampling(do_plot=False): # If being run via pytest, turn off
     return sim
 
 
+def test_fused_trans():
+    sc.heading('Test fused transmission kernel')
+
+    pars = dict(
+        pop_size = 5000,
+        pop_type = 'hybrid',
+        n_days = 60,
+        verbose = 0,
+        interventions = [cv.test_prob(symp_prob=0.1), cv.contact_tracing(trace_probs=0.5)],
+        variants = cv.variant('delta', days=10, n_imports=20),
+    )
+
+    # Run with and without the fused kernel, and check that the results are identical
+    sims = []
+    for fused_trans in [False, True]:
+        with cv.options.context(fused_trans=fused_trans):
+            sims.append(cv.Sim(pars).run())
+    s1, s2 = sims
+    assert s1.results['cum_infections'][-1] > pars['pop_size']/10 # Make sure there was transmission
+    assert not cv.diff_sims(s1, s2, output=True)
+    assert s1.people.infection_log.to_list() == s2.people.infection_log.to_list()
+
+    return s2
+
+
+def test_counter_rng():
+    sc.heading('Test counter-based transmission random numbers')
+
+    # Check the generator against the known-answer values for Philox4x32-10
+    u = np.uint64
+    m = u(0xFFFFFFFF)
+    assert cvu.philox(u(0), u(0), u(0), u(0), u(0), u(0)) == (0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8)
+    assert cvu.philox(m, m, m, m, m, m) == (0x408f276d, 0x41c83b0e, 0xa20bc7c6, 0x6d5451fd)
+    assert cvu.philox(u(0x243f6a88), u(0x85a308d3), u(0x13198a2e), u(0x03707344), u(0xa4093822), u(0x299f31d0)) == (0xd16cfe09, 0x94fdcceb, 0x5001e420, 0x24126ea1)
+
+    # Check that the compiled kernel (which processes the edges in parallel if numba_parallel is set) gives the same infections as running it serially in Python
+    rng = np.random.default_rng(1)
+    n, n_edges, n_variants = 300, 2000, 2
+    fl, it = cv.defaults.default_float, cv.defaults.default_int
+    rand = lambda size: rng.random(size).astype(fl)
+    flag = lambda prob: rng.random(n) < prob
+    args = (u(12345), u(678), 7, np.array([2.0, 3.0], dtype=fl), rng.integers(n, size=n_edges).astype(it), rng.integers(n, size=n_edges).astype(it),
+            rand(n_edges), np.array([0, 1200, n_edges], dtype=np.int64), rand(2), rand(2), rand(2), rand(n), rand(n), flag(0.3),
+            rng.integers(n_variants, size=n).astype(fl), flag(0.6), rand(n), flag(0.5), flag(0.2), flag(0.2), fl(0.7), 0.1*rand((n_variants, n)))
+    compiled = cvu.compute_infections_counter(*args)
+    python = cvu.compute_infections_counter.py_func(*args)
+    assert len(compiled[0]) > 10
+    for a,b in zip(compiled, python):
+        assert np.array_equal(a, b)
+
+    pars = dict(
+        pop_size = 5000,
+        pop_type = 'hybrid',
+        n_days = 60,
+        verbose = 0,
+        interventions = [cv.test_prob(symp_prob=0.1), cv.contact_tracing(trace_probs=0.5)],
+        variants = cv.variant('delta', days=10, n_imports=20),
+    )
+
+    # Check that the results are reproducible, and depend on the seed
+    with cv.options.context(counter_rng=True):
+        s1 = cv.Sim(pars).run()
+        s2 = cv.Sim(pars).run()
+        s3 = cv.Sim(pars, rand_seed=2).run()
+    assert s1.results['cum_infections'][-1] > pars['pop_size']/10 # Make sure there was transmission
+    assert not cv.diff_sims(s1, s2, output=True)
+    assert s1.people.infection_log.to_list() == s2.people.infection_log.to_list()
+    assert s1.people.infection_log.to_list() != s3.people.infection_log.to_list()
+
+    return s1
+
+
+def test_compiled_prognoses():
+    sc.heading('Test compiled prognoses')
+
+    pars = dict(pop_size=5000, n_days=60, verbose=0, variants=cv.variant('delta', days=10, n_imports=20))
+
+    # Check that the results are reproducible for each seed, and depend on the seed
+    with cv.options.context(compiled_prognoses=True):
+        sims = {}
+        for seed in [1, 2]:
+            s1 = cv.Sim(pars, rand_seed=seed).run()
+            s2 = cv.Sim(pars, rand_seed=seed).run()
+            assert not cv.diff_sims(s1, s2, output=True)
+            assert s1.results['cum_severe'][-1] > 0
+            sims[seed] = s1
+        assert cv.diff_sims(sims[1], sims[2], output=True)
+
+    # Check that the outcomes have the same distribution as for the array calculation
+    sim = cv.Sim(pars, pop_size=100e3, pop_infected=0).init_people()
+    infect_pars = {k:sim[k] for k in ['rel_symp_prob', 'rel_severe_prob', 'rel_crit_prob', 'rel_death_prob']}
+    inds = np.arange(len(sim.people))
+    counts = []
+    for compiled in [False, True]:
+        ppl = sc.dcp(sim.people)
+        with cv.options.context(compiled_prognoses=compiled):
+            outcomes = ppl.compute_outcomes(inds, variant=0, infect_pars=infect_pars)
+        counts.append(np.array([len(o) for o in outcomes] + [cv.defined(ppl[key]).size for key in ['date_critical', 'date_dead']]))
+        assert np.array_equal(np.sort(np.concatenate(outcomes)), inds)
+        assert np.isclose(np.nanmean(ppl.dur_disease[inds]), 14, atol=0.5)
+    assert np.all(np.abs(counts[1] - counts[0]) < 5*np.sqrt(counts[0])) # Allow for sampling noise
+
+    # Check that distributions that can't be compiled use the array calculation
+    dur = sc.dcp(sim['dur'])
+    dur['exp2inf'] = dict(dist='neg_binomial', par1=4.5, par2=2)
+    sims = []
+    for compiled in [False, True]:
+        with cv.options.context(compiled_prognoses=compiled):
+            sims.append(cv.Sim(pars, dur=dur).run())
+    assert not cv.diff_sims(*sims, output=True)
+
+    # Check that the fused kernel still gives identical results, since compiled prognoses use the Numba random stream
+    sims = []
+    for fused_trans in [False, True]:
+        with cv.options.context(compiled_prognoses=True, fused_trans=fused_trans):
+            sims.append(cv.Sim(pars, n_days=40).run())
+    assert not cv.diff_sims(*sims, output=True)
+
+    return s1
+
+
+def test_sparse_viral_load():
+    sc.heading('Test sparse viral load calculation')
+
+    pars = dict(pop_size=5000, n_days=60, verbose=0, variants=cv.variant('delta', days=10, n_imports=20))
+    s1 = cv.Sim(pars).run()
+    with cv.options.context(sparse_viral_load=True):
+        s2 = cv.Sim(pars).run()
+    assert not cv.diff_sims(s1, s2, output=True)
+    assert len(s2.people._viral_load) == len(s2.people)
+
+    return s2
+
+
+def test_event_queue():
+    sc.heading('Test event queue for state transitions')
+
+    pars = dict(
+        pop_size = 5000,
+        pop_type = 'hybrid',
+        n_days = 90,
+        verbose = 0,
+        pop_scale = 4,
+        rescale = True,
+        interventions = [cv.test_prob(symp_prob=0.2, asymp_prob=0.01, test_delay=2), cv.contact_tracing(trace_probs=0.5)],
+        variants = cv.variant('delta', days=30, n_imports=20),
+    )
+
+    # Run with and without the event queue, and check that everything is identical
+    sims = []
+    for event_queue in [False, True]:
+        with cv.options.context(event_queue=event_queue):
+            sims.append(cv.Sim(pars).run())
+    s1, s2 = sims
+    assert s1.results['cum_diagnoses'][-1] > 0 and s1.results['n_quarantined'][:].max() > 0 # Make sure there were transitions to check
+    assert not cv.diff_sims(s1, s2, output=True)
+    for key in s1.people.keys():
+        assert np.array_equal(s1.people[key], s2.people[key], equal_nan=True), key
+
+    # Check the queue itself: stale and past entries are handled by the People object
+    queue = cv.EventQueue(['date_recovered'])
+    queue.push('date_recovered', inds=np.array([3,1,2,7]), dates=np.array([5.0, 2.0, np.nan, 4.2]))
+    assert queue.pop('date_recovered', t=4).tolist() == [1]
+    queue.push('date_recovered', inds=np.array([4]), dates=np.array([3.0]))
+    assert queue.pop('date_recovered', t=5).tolist() == [3,4,7]
+    assert len(queue) == 0
+
+    return s2
+
+
+def test_count_stocks():
+    sc.heading('Test counting stocks')
+
+    pars = dict(pop_size=5000, n_days=40, verbose=0, variants=cv.variant('delta', days=10, n_imports=20), interventions=cv.vaccinate_prob('pfizer', days=20, prob=0.2))
+    sim = cv.Sim(pars)
+    sim.initialize()
+
+    # Register a custom state, which is updated by an intervention
+    def update_state(sim):
+        sim.people.ever_symptomatic = sim.people.ever_symptomatic | sim.people.symptomatic
+    sim.people.ever_symptomatic = np.zeros(len(sim.people), dtype=bool)
+    sim.register_stock('ever_symptomatic', label='Number ever symptomatic')
+    sim['interventions'].append(update_state)
+    sim.run()
+
+    # Check the results against direct calculation on the last day
+    ppl = sim.people
+    res = sim.results
+    assert res['n_ever_symptomatic'][-1] == ppl.count('ever_symptomatic') > 0
+    assert (np.diff(res['n_ever_symptomatic'].values) >= 0).all()
+    for key in cv.defaults.result_stocks.keys():
+        assert res[f'n_{key}'][-1] == ppl.count(key)
+    for variant in range(sim['n_variants']):
+        assert res['variant']['n_infectious_by_variant'][variant,-1] == ppl.count_by_variant('infectious_by_variant', variant)
+    alive = ~ppl.dead
+    assert res['pop_nabs'][-1] == np.sum(ppl.nab[alive & (ppl.nab != 0)])/alive.sum() > 0
+    assert res['pop_protection'][-1] == np.nanmean(ppl.sus_imm)
+    assert res['pop_symp_protection'][-1] == np.nanmean(ppl.symp_imm)
+
+    return sim
+
+
+def test_timings():
+    sc.heading('Test per-phase step timings')
+
+    pars = dict(pop_size=2000, n_days=30, verbose=0, interventions=cv.test_prob(symp_prob=0.1, label='testing'), analyzers=cv.age_histogram())
+    s1 = cv.Sim(pars).run()
+    assert not len(s1.timings.data) # Nothing is recorded unless the option is set
+    with cv.options.context(timings=True):
+        s2 = cv.Sim(pars).run()
+    assert not cv.diff_sims(s1, s2, output=True) # Timing doesn't change the results
+
+    timings = s2.timings
+    for phase in ['rescale', 'update_states_pre', 'update_contacts', 'imports', 'intervention:testing', 'update_states_post', 'viral_load', 'transmission:a:wild', 'results', 'nab', 'analyzer:age_histogram']:
+        assert phase in timings.data
+    df = timings.to_df()
+    assert len(df) == s2.npts
+    summary = timings.summary()
+    assert np.isclose(summary.percent.sum(), 100)
+    assert np.isclose(summary.total.sum(), timings.total)
+    timings.disp()
+
+    return timings
+
+
 
 #%% Run as a script
 if __name__ == '__main__':
@@ -148,6 +375,13 @@ if __name__ == '__main__':
     json = test_fileio()
     sim2 = test_sim_data(do_plot=do_plot)
     sim3 = test_dynamic_resampling(do_plot=do_plot)
+    sim4 = test_fused_trans()
+    sim4b = test_counter_rng()
+    sim4c = test_compiled_prognoses()
+    sim5 = test_sparse_viral_load()
+    sim6 = test_event_queue()
+    sim7 = test_count_stocks()
+    timings = test_timings()
 
     sc.toc(T)
     print('Done.')
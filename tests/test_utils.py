@@ -149,6 +149,58 @@ def test_samples(do_plot=False, verbose=True):
 
 
 
+def test_samplers():
+    sc.heading('Samplers')
+
+    # Check that samplers give identical samples to cv.sample()
+    n = 1000
+    dists = [
+        dict(dist='uniform', par1=3, par2=9),
+        dict(dist='normal_int', par1=11, par2=7),
+        dict(dist='lognormal', par1=11, par2=7),
+        dict(dist='lognormal_int', par1=0, par2=7),
+        dict(dist='poisson', par1=11),
+        dict(dist='neg_binomial', par1=11, par2=1.2, step=0.1),
+    ]
+    for dist in dists:
+        cv.set_seed(1)
+        samples = cv.sample(**dist, size=n)
+        cv.set_seed(1)
+        sampler = cv.make_sampler(**dist)
+        assert np.array_equal(sampler.draw(n), samples)
+        assert sampler.matches(dist)
+        assert (sampler.compiled is None) == (dist['dist'] == 'neg_binomial')
+
+    # Register custom distributions, as a function and as a class
+    def gamma(par1, par2, size):
+        return np.random.gamma(shape=par1, scale=par2, size=size)
+
+    class Constant(cv.Sampler):
+        def sample(self, n=None):
+            return np.full(n, self.par1)
+
+    cv.register_sampler('gamma', gamma, overwrite=True) # In case the test has already been run
+    cv.register_sampler('fixed', Constant, overwrite=True)
+    with pytest.raises(ValueError):
+        cv.register_sampler('gamma', gamma)
+    with pytest.raises(TypeError):
+        cv.register_sampler('invalid', 'not_a_sampler', overwrite=True)
+    assert np.isclose(cv.sample(dist='gamma', par1=5, par2=2, size=10_000).mean(), 10, rtol=0.05)
+
+    # Check that custom distributions can be used for durations, including if they're changed after initialization
+    sim = cv.Sim(pop_size=2000, n_days=40, verbose=0)
+    sim['dur']['exp2inf'] = dict(dist='fixed', par1=3)
+    sim.initialize()
+    assert isinstance(sim.people.get_sampler('exp2inf'), Constant)
+    sim['dur']['inf2sym']['par1'] = 2 # Change the parameters in place
+    assert sim.people.get_sampler('inf2sym').par1 == 2
+    with cv.options.context(compiled_prognoses=True): # Custom distributions can't be compiled, so use the array calculation
+        sim.run()
+    assert np.all(sim.people.dur_exp2inf[cv.defined(sim.people.dur_exp2inf)] == 3)
+
+    return sim
+
+
 def test_choose():
     sc.heading('Choose people')
     x1 = cv.choose(10, 5)
@@ -180,6 +232,40 @@ def test_choose_w():
     return x1
 
 
+def test_choose_w_sparse():
+    sc.heading('Choose weighted people from sparse weights')
+    n = 1000
+    reps = 2000
+    inds = np.array([10, 20, 30, 40])
+    weights = np.array([100, 100, 0, 0])
+
+    # Check the sampled frequencies against the dense sampler
+    cv.set_seed(1)
+    dense = np.ones(n)
+    dense[inds] = weights
+    counts = np.zeros((2,n))
+    for r in range(reps):
+        x0 = cv.choose_w(dense, 10)
+        x1 = cv.choose_w_sparse(n, 10, inds=inds, weights=weights)
+        assert len(np.unique(x0)) == len(np.unique(x1)) == 10
+        counts[0,x0] += 1
+        counts[1,x1] += 1
+    freqs = counts/reps
+    assert np.all(freqs[:,30:50:10] == 0) # Zero weight is never chosen
+    assert np.allclose(freqs[:,10:30:10], freqs[:,10:30:10].mean(), atol=0.05) # Dense and sparse agree for heavily weighted people
+    assert np.isclose(freqs[0].sum() - freqs[0,10:30:10].sum(), freqs[1].sum() - freqs[1,10:30:10].sum(), atol=0.1) # And everyone else
+
+    # Edge cases
+    x2 = cv.choose_w_sparse(5, 2, inds=[0,1], weights=1.0, default=0) # Only the weighted people can be chosen
+    with pytest.raises(ValueError):
+        cv.choose_w_sparse(5, 3, inds=[0,1], weights=[1,1], default=0)
+    x3 = cv.choose_w_sparse(5, 5, inds=[], weights=[]) # Everyone
+    assert sorted(x2) == [0,1]
+    assert sorted(x3) == list(range(5))
+    print(f'Frequency of weighted people: {freqs[:,10:50:10]}')
+    return x1
+
+
 def test_indexing():
 
     # Definitions
@@ -240,8 +326,10 @@ if __name__ == '__main__':
 
     rnd1    = test_rand()
     samples = test_samples(do_plot=do_plot)
+    sim     = test_samplers()
     people1 = test_choose()
     people2 = test_choose_w()
+    people3 = test_choose_w_sparse()
     inds    = test_indexing()
     dt      = test_doubling_time()
 